@@ -25,8 +25,8 @@ import uuid
 import streamlit as st
 import json
 
-from test_generator import generate_neet_test_from_pdf
-from excel_export import generate_excel_for_result, read_excel_for_review, update_excel_with_comments, latex_to_unicode
+from job_queue import FINISHED_STATUSES, get_queue
+from excel_export import BatchWorkbook, read_excel_for_review, update_excel_with_comments, latex_to_unicode
 
 # Page config
 st.set_page_config(
@@ -383,21 +383,35 @@ if "slots" not in st.session_state:
 if "slot_order" not in st.session_state:
     st.session_state.slot_order = []  # [slot_id, ...]
 if "results" not in st.session_state:
-    st.session_state.results = {}  # {slot_id: {result, generation_time, excel_bytes, excel_filename}}
+    st.session_state.results = {}  # {slot_id: {job_id, result, generation_time, excel_bytes, excel_filename}}
 if "review_data" not in st.session_state:
     st.session_state.review_data = None  # {filename, questions, question_type, excel_bytes}
 if "generating" not in st.session_state:
     st.session_state.generating = False  # True while generation loop is active
-if "gen_slot_idx" not in st.session_state:
-    st.session_state.gen_slot_idx = 0  # Index of next slot to process
+if "gen_batch_id" not in st.session_state:
+    # Batch of queued jobs this page follows; kept in the URL so a refresh reattaches to it
+    st.session_state.gen_batch_id = st.query_params.get("batch")
+    st.session_state.generating = bool(st.session_state.gen_batch_id)
 if "gen_subject" not in st.session_state:
     st.session_state.gen_subject = "chemistry"  # Subject captured at generation start
 if "gen_errors" not in st.session_state:
     st.session_state.gen_errors = {}  # {slot_id: error_message}
+if "gen_force_regenerate" not in st.session_state:
+    st.session_state.gen_force_regenerate = False  # Bypass result cache, captured at generation start
+if "gen_content_mode" not in st.session_state:
+    st.session_state.gen_content_mode = "file"  # How PDFs are sent to the model, captured at generation start
+if "gen_upload_files" not in st.session_state:
+    st.session_state.gen_upload_files = False  # Send PDFs via the Files API, captured at generation start
+if "batch_workbook" not in st.session_state:
+    # (batch_id, BatchWorkbook) — all finished slots in one Excel file, written into a
+    # write-only workbook as they finish; replaced when the followed batch changes
+    st.session_state.batch_workbook = None
 # Load API key from environment variable
 api_key = os.getenv("OPENAI_API_KEY")
 model = "gpt-5-mini"
 max_completion_tokens = 127000  # gpt-5-mini max output tokens
+POLL_INTERVAL_SECONDS = 1.0  # how often the page refreshes while a batch runs
+CONTENT_MODE_LABELS = {"file": "PDF", "text": "Text layer"}
 
 
 # ============================================================
@@ -415,21 +429,138 @@ def _count_pdf_pages(pdf_bytes: bytes) -> int:
         return 0
 
 
-def _make_excel_filename(metadata: dict, page_count: int) -> str:
-    """Generate filename: {pages}page_{difficulty}_{type}_{count}questions.xlsx"""
-    pages = page_count or metadata.get("page_count", 0)
-    difficulty = metadata.get("difficulty", "medium")
-    qtype = metadata.get("question_type", "mcq")
-    total = metadata.get("total_questions", 0)
+def _submit_generation_batch() -> str:
+    """Put every slot on the persistent job queue. Returns the batch id."""
+    queue = get_queue()
+    batch_id = uuid.uuid4().hex[:12]
+    for slot_id in st.session_state.slot_order:
+        slot = st.session_state.slots[slot_id]
+        # Drop the previous run's result so the slot shows as pending until its new job finishes
+        st.session_state.results.pop(slot_id, None)
+        pdf_info = st.session_state.pdf_files[slot["filename"]]
+        queue.enqueue(
+            batch_id,
+            pdf_info["pdf_bytes"],
+            {
+                "subject": st.session_state.gen_subject,
+                "difficulty": slot["difficulty"],
+                "question_count": slot["question_count"],
+                "question_type": slot["question_type"],
+                "model": model,
+                "max_completion_tokens": max_completion_tokens,
+                "force_regenerate": st.session_state.gen_force_regenerate,
+                "content_mode": st.session_state.gen_content_mode,
+                "upload_files": st.session_state.gen_upload_files,
+            },
+            label=f"{slot['filename']} [{slot['difficulty']}/{slot['question_type']}]",
+            slot_id=slot_id,
+        )
+    st.query_params["batch"] = batch_id
+    return batch_id
+
+
+def render_generation_batch():
+    """Progress, downloads and errors for the followed batch; polls the queue while it runs."""
+    batch_id = st.session_state.gen_batch_id
+    queue = get_queue()
+    jobs = queue.get_batch(batch_id) if batch_id else []
+
+    # Only a batch of several slots gets the combined workbook
+    if len(jobs) < 2:
+        st.session_state.batch_workbook = None
+    elif st.session_state.batch_workbook is None or st.session_state.batch_workbook[0] != batch_id:
+        st.session_state.batch_workbook = (batch_id, BatchWorkbook())
+    batch_workbook = st.session_state.batch_workbook[1] if st.session_state.batch_workbook else None
+
+    # Collect finished jobs (results and Excel files are on disk, written by worker.py)
+    for job in jobs:
+        key = job["slot_id"] or job["id"]
+        # A slot regenerated in a later batch keeps its slot id, so match on the job id
+        stored = st.session_state.results.get(key)
+        is_new = stored is None or stored.get("job_id") != job["id"]
+        needs_workbook = batch_workbook is not None and job["id"] not in batch_workbook
+        if job["status"] == "done" and (is_new or needs_workbook):
+            result = queue.load_result(job)
+            if is_new:
+                st.session_state.results[key] = {
+                    "job_id": job["id"],
+                    "result": result,
+                    "generation_time": (job["finished_at"] or 0) - (job["started_at"] or job["created_at"]),
+                    "excel_bytes": queue.load_excel(job),
+                    "excel_filename": job["excel_filename"],
+                }
+            # Each slot goes into the combined workbook once, as it finishes
+            if needs_workbook:
+                batch_workbook.add_slot(job["id"], job["label"] or job["excel_filename"], result)
+        elif job["status"] == "error" and key not in st.session_state.gen_errors:
+            st.session_state.gen_errors[key] = f"{job['label']}: {job['error']}"
+
+    running = [job for job in jobs if job["status"] not in FINISHED_STATUSES]
+    if st.session_state.generating:
+        done = len(jobs) - len(running)
+        elapsed = time.time() - min((job["created_at"] for job in jobs), default=time.time())
+        st.progress(done / max(len(jobs), 1), text=f"{done} of {len(jobs)} slots finished — {elapsed:.0f}s elapsed")
+        if st.button("Stop Generation", type="secondary", use_container_width=True):
+            queue.request_cancel(batch_id)
+            st.session_state.generating = False
+            st.rerun()
 
-    type_names = {
-        "mcq": "mcq",
-        "assertion_reason": "ar",
-        "match_the_column": "mtc",
-        "combination": "mixed",
-    }
-    type_str = type_names.get(qtype, qtype)
-    return f"{pages}page_{difficulty}_{type_str}_{total}questions.xlsx"
+    # --- Results: Download Buttons ---
+    completed = [sid for sid in st.session_state.slot_order if sid in st.session_state.results]
+    # Slots restored from the URL after a refresh have no slot config any more
+    completed += [sid for sid in st.session_state.results if sid not in st.session_state.slot_order]
+    if completed:
+        st.markdown("---")
+        st.markdown(f"### Downloads ({len(completed)} completed)")
+        if not running and batch_workbook is not None and len(batch_workbook) > 1:
+            st.download_button(
+                label=f"All {len(batch_workbook)} slots in one workbook (with batch summary)",
+                data=batch_workbook.to_bytes(),
+                file_name=f"batch_{batch_id}_{len(batch_workbook)}slots.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                key=f"dl_batch_{batch_id}",
+                type="primary",
+                use_container_width=True,
+            )
+        for slot_id in completed:
+            res_data = st.session_state.results[slot_id]
+            excel_bytes = res_data["excel_bytes"]
+            excel_filename = res_data["excel_filename"]
+            num_q = len(res_data["result"].get("questions", []))
+
+            st.download_button(
+                label=f"{excel_filename} — {num_q}q, {res_data['generation_time']:.0f}s",
+                data=excel_bytes,
+                file_name=excel_filename,
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                key=f"dl_{slot_id}",
+                use_container_width=True,
+            )
+
+    # --- Show errors if any ---
+    if st.session_state.gen_errors:
+        with st.expander(f"Errors ({len(st.session_state.gen_errors)})", expanded=False):
+            for err in st.session_state.gen_errors.values():
+                st.error(err)
+
+    # --- Poll the queue while jobs are still running ---
+    if st.session_state.generating:
+        for n, job in enumerate(running, 1):
+            if job["status"] == "queued":
+                state_text = "Queued — waiting for worker.py"
+            else:
+                state_text = f"{job['questions_received']}/{job['question_count']} questions received"
+            with st.status(f"[{n}/{len(running)}] {job['label']} — {state_text}", expanded=False):
+                # Questions the worker has streamed in so far
+                for idx, q in enumerate(queue.load_partial(job)):
+                    render_question(q, idx)
+
+        if not running:
+            logger.info(f"Batch {batch_id} finished: {len(jobs)} slot(s)")
+            st.session_state.generating = False
+        else:
+            time.sleep(POLL_INTERVAL_SECONDS)
+        st.rerun()
 
 
 def render_match_the_column(text: str):
@@ -565,6 +696,69 @@ def render_latex_text(text: str):
             st.markdown(f"**{formatted}**")
 
 
+def render_question(q: dict, idx: int):
+    """Render one question card with its options."""
+    q_id = q.get('question_id', idx + 1)
+    q_type = q.get('question_type', 'MCQ')
+    q_text = latex_to_unicode(q.get('question_text', ''))
+
+    type_labels = {
+        'MCQ': 'MCQ',
+        'ASSERTION_REASON': 'Assertion-Reason',
+        'MATCH_THE_COLUMN': 'Match the Column'
+    }
+    type_label = type_labels.get(q_type, q_type.replace('_', ' '))
+
+    # Open question card
+    st.markdown(f"""
+    <div class="question-card">
+        <div class="q-header">
+            <span class="q-number">Q{q_id}</span>
+            <span class="q-type-badge">{type_label}</span>
+        </div>
+    </div>
+    """, unsafe_allow_html=True)
+
+    # Pre-process line breaks for Statement I/II and numbered statements (1)(2)(3)(4)
+    q_text = re.sub(r'\s*(Statement\s+(?:I{1,3}|IV|[1-4])\s*:)', r'  \n\1', q_text).strip()
+    q_text = re.sub(r'\s*(\([1-9]\))', r'  \n\1', q_text).strip()
+
+    # Question text
+    if q_type == 'MATCH_THE_COLUMN':
+        render_match_the_column(q_text)
+    else:
+        formatted = q_text.replace('\\n\\n', '\n\n').replace('\\n', '\n')
+        if '\n' in formatted:
+            lines = []
+            for line in formatted.split('\n'):
+                stripped = line.strip()
+                if stripped:
+                    lines.append(f"**{stripped}**")
+                else:
+                    lines.append('')
+            st.markdown('\n\n'.join(lines))
+        else:
+            st.markdown(f"**{formatted}**")
+
+    st.write("")
+
+    # Options
+    if "options" in q:
+        options = q["options"]
+        for key in ['a', 'b', 'c', 'd']:
+            if key in options:
+                val = latex_to_unicode(options[key])
+                label = key.upper()
+
+                letter_col, text_col = st.columns([0.055, 0.945])
+                with letter_col:
+                    st.markdown(f'<span class="option-letter option-letter-default">{label}</span>', unsafe_allow_html=True)
+                with text_col:
+                    st.markdown(val)
+
+    st.markdown("")
+
+
 def render_test_view(result: dict, generation_time: float = None):
     """Render questions in a polished test paper view."""
 
@@ -630,7 +824,10 @@ def render_test_view(result: dict, generation_time: float = None):
                 with tok_cols[0]:
                     st.markdown("**Tokens**")
                     if gen_tok:
+                        st.markdown(f"- Sent as: **{CONTENT_MODE_LABELS.get(meta.get('content_mode', 'file'), 'PDF')}**")
                         st.markdown(f"- Input: **{gen_tok.get('input_tokens', 0):,}**")
+                        if gen_tok.get('cached_input_tokens'):
+                            st.markdown(f"- Cached input: **{gen_tok['cached_input_tokens']:,}**")
                         st.markdown(f"- Output: **{gen_tok.get('output_tokens', 0):,}**")
                         st.markdown(f"- Total: **{gen_tok.get('total_tokens', 0):,}**")
                     else:
@@ -639,6 +836,8 @@ def render_test_view(result: dict, generation_time: float = None):
                     st.markdown("**Pricing (GPT-5 mini)**")
                     if cost:
                         st.markdown(f"- Input: **Rs.{cost.get('input_cost', 0):.2f}** ({cost.get('input_rate', '')})")
+                        if cost.get('cache_savings'):
+                            st.markdown(f"- Prompt cache saved: **Rs.{cost['cache_savings']:.2f}** (cached input {cost.get('cached_input_rate', '')})")
                         st.markdown(f"- Output: **Rs.{cost.get('output_cost', 0):.2f}** ({cost.get('output_rate', '')})")
                         st.markdown(f"- **Total: Rs.{total_cost:.2f}**")
                     else:
@@ -665,65 +864,7 @@ def render_test_view(result: dict, generation_time: float = None):
         questions = result["questions"]
 
         for idx, q in enumerate(questions):
-            q_id = q.get('question_id', idx + 1)
-            q_type = q.get('question_type', 'MCQ')
-            q_text = latex_to_unicode(q.get('question_text', ''))
-
-            type_labels = {
-                'MCQ': 'MCQ',
-                'ASSERTION_REASON': 'Assertion-Reason',
-                'MATCH_THE_COLUMN': 'Match the Column'
-            }
-            type_label = type_labels.get(q_type, q_type.replace('_', ' '))
-
-            # Open question card
-            st.markdown(f"""
-            <div class="question-card">
-                <div class="q-header">
-                    <span class="q-number">Q{q_id}</span>
-                    <span class="q-type-badge">{type_label}</span>
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
-
-            # Pre-process line breaks for Statement I/II and numbered statements (1)(2)(3)(4)
-            q_text = re.sub(r'\s*(Statement\s+(?:I{1,3}|IV|[1-4])\s*:)', r'  \n\1', q_text).strip()
-            q_text = re.sub(r'\s*(\([1-9]\))', r'  \n\1', q_text).strip()
-
-            # Question text
-            if q_type == 'MATCH_THE_COLUMN':
-                render_match_the_column(q_text)
-            else:
-                formatted = q_text.replace('\\n\\n', '\n\n').replace('\\n', '\n')
-                if '\n' in formatted:
-                    lines = []
-                    for line in formatted.split('\n'):
-                        stripped = line.strip()
-                        if stripped:
-                            lines.append(f"**{stripped}**")
-                        else:
-                            lines.append('')
-                    st.markdown('\n\n'.join(lines))
-                else:
-                    st.markdown(f"**{formatted}**")
-
-            st.write("")
-
-            # Options
-            if "options" in q:
-                options = q["options"]
-                for key in ['a', 'b', 'c', 'd']:
-                    if key in options:
-                        val = latex_to_unicode(options[key])
-                        label = key.upper()
-
-                        letter_col, text_col = st.columns([0.055, 0.945])
-                        with letter_col:
-                            st.markdown(f'<span class="option-letter option-letter-default">{label}</span>', unsafe_allow_html=True)
-                        with text_col:
-                            st.markdown(val)
-
-            st.markdown("")
+            render_question(q, idx)
     else:
         st.warning("No questions were generated. Try again or check the PDF content.")
 
@@ -788,6 +929,28 @@ with st.sidebar:
 
     subject = "chemistry"
 
+    force_regenerate = st.checkbox(
+        "Force regenerate",
+        value=False,
+        help="Ignore cached results and call the API again for every slot",
+    )
+
+    content_mode = st.radio(
+        "Send PDFs as",
+        options=list(CONTENT_MODE_LABELS),
+        format_func=CONTENT_MODE_LABELS.get,
+        help="Text layer sends the extracted page text and keeps only figure/table pages as PDF — "
+             "far fewer input tokens on text-heavy chapters. Compare tokens and time per subject "
+             "under Token Usage & Pricing.",
+    )
+
+    upload_files = st.checkbox(
+        "Upload PDFs to OpenAI once per file",
+        value=False,
+        help="Send each PDF through the Files API once and reference it from every request, instead of "
+             "inlining it each time. The uploaded files are stored by OpenAI for up to 24 hours.",
+    )
+
 
 # ============================================================
 # MAIN CONTENT — TABS
@@ -886,15 +1049,8 @@ with tab_generate:
 
         st.markdown("")
 
-        # --- Generate / Stop Buttons ---
-        if st.session_state.generating:
-            total_slots = len(st.session_state.slot_order)
-            done = st.session_state.gen_slot_idx
-            st.progress(done / total_slots, text=f"Processing slot {done + 1} of {total_slots}...")
-            if st.button("Stop Generation", type="secondary", use_container_width=True):
-                st.session_state.generating = False
-                st.rerun()
-        else:
+        # --- Generate Button ---
+        if not st.session_state.generating:
             generate_btn = st.button(
                 f"Generate Tests for {len(st.session_state.slot_order)} Slot(s)",
                 type="primary",
@@ -906,103 +1062,16 @@ with tab_generate:
                     st.error("Please set your OPENAI_API_KEY environment variable in .env or Streamlit secrets.")
                 else:
                     st.session_state.generating = True
-                    st.session_state.gen_slot_idx = 0
                     st.session_state.gen_subject = subject
+                    st.session_state.gen_force_regenerate = force_regenerate
+                    st.session_state.gen_content_mode = content_mode
+                    st.session_state.gen_upload_files = upload_files
                     st.session_state.gen_errors = {}
+                    st.session_state.gen_batch_id = _submit_generation_batch()
                     st.rerun()
 
-        # --- Results: Download Buttons FIRST (render before blocking API call) ---
-        completed = [(sid, st.session_state.slots[sid]) for sid in st.session_state.slot_order if sid in st.session_state.results]
-        if completed:
-            st.markdown("---")
-            st.markdown(f"### Downloads ({len(completed)} completed)")
-            for slot_id, slot in completed:
-                res_data = st.session_state.results[slot_id]
-                excel_bytes = res_data["excel_bytes"]
-                excel_filename = res_data["excel_filename"]
-                fname = slot["filename"]
-                num_q = len(res_data["result"].get("questions", []))
-
-                st.download_button(
-                    label=f"{excel_filename} — {num_q}q, {res_data['generation_time']:.0f}s",
-                    data=excel_bytes,
-                    file_name=excel_filename,
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    key=f"dl_{slot_id}",
-                    use_container_width=True,
-                )
-
-        # --- Show errors if any ---
-        if st.session_state.gen_errors:
-            with st.expander(f"Errors ({len(st.session_state.gen_errors)})", expanded=False):
-                for sid, err in st.session_state.gen_errors.items():
-                    slot = st.session_state.slots.get(sid, {})
-                    st.error(f"{slot.get('filename', '?')} [{slot.get('difficulty', '?')}/{slot.get('question_type', '?')}]: {err}")
-
-        # --- Process ONE slot per rerun cycle (survives Streamlit re-renders) ---
-        if st.session_state.generating:
-            total_slots = len(st.session_state.slot_order)
-            idx = st.session_state.gen_slot_idx
-
-            if idx < total_slots:
-                slot_id = st.session_state.slot_order[idx]
-                slot = st.session_state.slots[slot_id]
-                fname = slot["filename"]
-                pdf_info = st.session_state.pdf_files[fname]
-                label = f"{fname} [{slot['difficulty']}/{slot['question_type']}]"
-
-                with st.status(f"[{idx + 1}/{total_slots}] Generating {slot['question_count']} questions from {label}...", expanded=True) as status:
-                    st.write(f"Subject: {st.session_state.gen_subject.title()} | Difficulty: {slot['difficulty'].title()} | Type: {slot['question_type'].replace('_', ' ').title()}")
-                    start_time = time.time()
-                    try:
-                        result = generate_neet_test_from_pdf(
-                            pdf_bytes=pdf_info["pdf_bytes"],
-                            subject=st.session_state.gen_subject,
-                            difficulty=slot["difficulty"],
-                            question_count=slot["question_count"],
-                            question_type=slot["question_type"],
-                            model=model,
-                            max_completion_tokens=max_completion_tokens,
-                            api_key=api_key,
-                        )
-
-                        elapsed = time.time() - start_time
-
-                        if result and "parse_error" not in result:
-                            excel_bytes = generate_excel_for_result(result)
-                            meta = result.get("test_metadata", {})
-                            excel_filename = _make_excel_filename(meta, pdf_info["page_count"])
-
-                            st.session_state.results[slot_id] = {
-                                "result": result,
-                                "generation_time": elapsed,
-                                "excel_bytes": excel_bytes,
-                                "excel_filename": excel_filename,
-                            }
-
-                            num_q = len(result.get("questions", []))
-                            status.update(label=f"[{idx + 1}/{total_slots}] {label} — {num_q} questions in {elapsed:.1f}s", state="complete")
-                        else:
-                            error_msg = result.get("parse_error", "No result returned") if result else "No result returned"
-                            st.session_state.gen_errors[slot_id] = error_msg
-                            status.update(label=f"[{idx + 1}/{total_slots}] {label} — {error_msg}", state="error")
-
-                    except Exception as e:
-                        import traceback
-                        elapsed = time.time() - start_time
-                        logger.error(f"Generation failed for {label} after {elapsed:.1f}s: {type(e).__name__}: {e}")
-                        logger.error(traceback.format_exc())
-                        st.session_state.gen_errors[slot_id] = str(e)
-                        status.update(label=f"[{idx + 1}/{total_slots}] {label} — Error: {e}", state="error")
-
-                # Move to next slot and rerun
-                st.session_state.gen_slot_idx = idx + 1
-                if idx + 1 < total_slots:
-                    st.rerun()
-                else:
-                    # All done
-                    st.session_state.generating = False
-                    st.rerun()
+    # Generation runs in worker.py; this page only follows the queued batch
+    render_generation_batch()
 
 
 # ============================================================
@@ -0,0 +1,285 @@
+"""
+NEET Test Generator - Headless Batch Mode
+Generates tests for every job in a manifest (or every PDF in a directory)
+without the Streamlit UI, writing one Excel workbook per job and a
+summary.json with timings, tokens and cost.
+
+Manifest columns (CSV header or YAML list of mappings):
+    pdf, difficulty, question_type, question_count[, subject][, content_mode][, name]
+Relative pdf paths are resolved against the manifest's directory.
+
+content_mode is "file" (send the PDF), "text" (send the extracted text layer,
+figure/table pages as PDF) or "both", which runs the job once per mode and
+adds a per-subject comparison of input tokens and latency to summary.json.
+
+Usage:
+    python batch_cli.py manifest.csv --out-dir out/ --workers 8
+    python batch_cli.py --pdf-dir chapters/ --difficulty hard --question-count 20 --out-dir out/
+    python batch_cli.py manifest.csv --content-mode both --force-regenerate
+    python batch_cli.py manifest.csv --upload-files   # PDFs via the Files API (kept by OpenAI up to 24h)
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    stream=sys.stderr
+)
+logger = logging.getLogger(__name__)
+
+import client_registry
+from excel_export import generate_excel_for_result, make_excel_filename
+from pdf_utils import ParsedPdf
+from test_generator import CONTENT_MODES, DEFAULT_CONTENT_MODE, MAX_CONCURRENCY_CAP, agenerate_neet_test_from_pdf
+
+
+DEFAULT_WORKERS = 4
+JOB_DEFAULTS = {
+    "subject": "chemistry",
+    "difficulty": "medium",
+    "question_type": "mcq",
+    "question_count": 10,
+    "content_mode": DEFAULT_CONTENT_MODE,
+}
+
+
+# ============================================================
+# MANIFEST LOADING
+# ============================================================
+
+def _load_manifest(path: str) -> list:
+    """Read job rows from a .csv or .yaml/.yml manifest."""
+    if path.lower().endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            sys.exit("YAML manifests need PyYAML (pip install pyyaml), or use a CSV manifest")
+        with open(path, encoding="utf-8") as f:
+            rows = yaml.safe_load(f) or []
+        if isinstance(rows, dict):
+            rows = rows.get("jobs", [])
+    else:
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = [{k.strip(): (v or "").strip() for k, v in row.items() if k} for row in csv.DictReader(f)]
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    for row in rows:
+        if not row.get("pdf"):
+            sys.exit(f"Manifest row without a pdf path: {row}")
+        row["pdf"] = os.path.join(base_dir, row["pdf"])
+    return rows
+
+
+def _jobs_from_dir(pdf_dir: str) -> list:
+    """One job per PDF in `pdf_dir` (settings come from the command-line defaults)."""
+    names = sorted(n for n in os.listdir(pdf_dir) if n.lower().endswith(".pdf"))
+    return [{"pdf": os.path.join(pdf_dir, n)} for n in names]
+
+
+def _normalize_jobs(row: dict, defaults: dict, index: int) -> list:
+    """Jobs for one manifest row: one, or one per content mode for content_mode "both"."""
+    job = {key: row.get(key) or default for key, default in defaults.items()}
+    job["question_count"] = int(job["question_count"])
+    job["pdf"] = row["pdf"]
+    job["name"] = row.get("name") or f"{index:03d}_{os.path.splitext(os.path.basename(row['pdf']))[0]}"
+    if job["content_mode"] == "both":
+        return [{**job, "content_mode": mode, "name": f"{job['name']}_{mode}"} for mode in CONTENT_MODES]
+    if job["content_mode"] not in CONTENT_MODES:
+        sys.exit(f"Unknown content_mode {job['content_mode']!r} for {row['pdf']} (use {', '.join(CONTENT_MODES)} or both)")
+    return [job]
+
+
+# ============================================================
+# BATCH RUN
+# ============================================================
+
+def _parse_pdf_file(path: str) -> ParsedPdf:
+    with open(path, "rb") as f:
+        return ParsedPdf(f.read())
+
+
+async def _run_job(job: dict, parsed_pdfs: dict, client, api_semaphore, job_semaphore,
+                   out_dir: str, model: str, force_regenerate: bool, upload_files: bool) -> dict:
+    """Generate one job and write its workbook. Returns its summary entry."""
+    entry = {
+        "name": job["name"],
+        "pdf": job["pdf"],
+        "subject": job["subject"],
+        "difficulty": job["difficulty"],
+        "question_type": job["question_type"],
+        "question_count": job["question_count"],
+        "content_mode": job["content_mode"],
+    }
+    async with job_semaphore:
+        start = time.time()
+        try:
+            if job["pdf"] not in parsed_pdfs:
+                parsed_pdfs[job["pdf"]] = asyncio.ensure_future(asyncio.to_thread(_parse_pdf_file, job["pdf"]))
+            parsed_pdf = await parsed_pdfs[job["pdf"]]
+            result = await agenerate_neet_test_from_pdf(
+                parsed_pdf.pdf_bytes,
+                subject=job["subject"],
+                difficulty=job["difficulty"],
+                question_count=job["question_count"],
+                question_type=job["question_type"],
+                model=model,
+                client=client,
+                semaphore=api_semaphore,
+                parsed_pdf=parsed_pdf,
+                force_regenerate=force_regenerate,
+                content_mode=job["content_mode"],
+                upload_files=upload_files,
+            )
+            if "parse_error" in result:
+                raise RuntimeError(result["parse_error"])
+
+            meta = result.get("test_metadata", {})
+            excel_path = os.path.join(out_dir, f"{job['name']}_{make_excel_filename(meta)}")
+            excel_bytes = await asyncio.to_thread(generate_excel_for_result, result)
+            with open(excel_path, "wb") as f:
+                f.write(excel_bytes)
+
+            token_usage = meta.get("token_usage", {})
+            entry.update({
+                "status": "done",
+                "questions": len(result.get("questions", [])),
+                "from_cache": bool(meta.get("from_cache")),
+                "generation_time": meta.get("generation_time"),
+                "tokens": token_usage.get("generation", {}),
+                "cost": token_usage.get("cost", {}),
+                "excel": excel_path,
+            })
+            logger.info(f"[BATCH] {job['name']}: {entry['questions']} questions -> {excel_path}")
+        except Exception as e:
+            logger.error(f"[BATCH] {job['name']} failed: {type(e).__name__}: {e}")
+            entry.update({"status": "error", "error": f"{type(e).__name__}: {e}"})
+        entry["wall_time"] = round(time.time() - start, 1)
+    return entry
+
+
+def _compare_content_modes(entries: list) -> dict:
+    """Input tokens, cost and generation time per subject and content mode (fresh results only)."""
+    comparison = {}
+    for entry in entries:
+        if entry["status"] != "done" or entry["from_cache"]:
+            continue
+        stats = comparison.setdefault(entry["subject"], {}).setdefault(entry["content_mode"], {
+            "jobs": 0, "input_tokens": 0, "output_tokens": 0, "cost_inr": 0.0, "generation_time": 0.0,
+        })
+        stats["jobs"] += 1
+        stats["input_tokens"] += entry["tokens"].get("input_tokens", 0)
+        stats["output_tokens"] += entry["tokens"].get("output_tokens", 0)
+        stats["cost_inr"] += entry["cost"].get("total_cost", 0)
+        stats["generation_time"] += entry["generation_time"] or 0
+    for modes in comparison.values():
+        for stats in modes.values():
+            jobs = stats["jobs"]
+            stats["avg_input_tokens"] = round(stats["input_tokens"] / jobs)
+            stats["avg_generation_time"] = round(stats["generation_time"] / jobs, 1)
+            stats["cost_inr"] = round(stats["cost_inr"], 4)
+            stats["generation_time"] = round(stats["generation_time"], 1)
+    return comparison
+
+
+async def run_batch(jobs: list, out_dir: str, api_key: str, workers: int = DEFAULT_WORKERS,
+                    max_concurrency: int = MAX_CONCURRENCY_CAP, model: str = "gpt-5-mini",
+                    force_regenerate: bool = False, upload_files: bool = False) -> dict:
+    """Run every job concurrently (at most `workers` at a time) and return the summary."""
+    os.makedirs(out_dir, exist_ok=True)
+    job_semaphore = asyncio.Semaphore(workers)
+    api_semaphore = asyncio.Semaphore(max_concurrency)
+    parsed_pdfs = {}   # pdf path -> task parsing it, so each file is read once
+    batch_start = time.time()
+
+    client = client_registry.get_async_client(api_key)
+    entries = await asyncio.gather(*(
+        _run_job(job, parsed_pdfs, client, api_semaphore, job_semaphore, out_dir, model, force_regenerate,
+                 upload_files)
+        for job in jobs
+    ))
+
+    done = [e for e in entries if e["status"] == "done"]
+    totals = {"input_tokens": 0, "cached_input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+    total_cost = 0.0
+    for entry in done:
+        if entry["from_cache"]:
+            continue   # paid for by an earlier run
+        for key in totals:
+            totals[key] += entry["tokens"].get(key, 0)
+        total_cost += entry["cost"].get("total_cost", 0)
+    return {
+        "jobs": len(entries),
+        "succeeded": len(done),
+        "failed": len(entries) - len(done),
+        "wall_time": round(time.time() - batch_start, 1),
+        "tokens": totals,
+        "total_cost_inr": round(total_cost, 4),
+        "by_content_mode": _compare_content_modes(entries),
+        "results": entries,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate NEET tests for a batch of PDFs without the UI.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("manifest", nargs="?", help="CSV or YAML manifest of jobs")
+    source.add_argument("--pdf-dir", help="generate one test per PDF in this directory")
+    parser.add_argument("--out-dir", default="batch_output", help="where workbooks and summary.json go")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help=f"jobs run at once (default {DEFAULT_WORKERS})")
+    parser.add_argument("--max-concurrency", type=int, default=MAX_CONCURRENCY_CAP,
+                        help=f"API calls in flight across all jobs (default {MAX_CONCURRENCY_CAP})")
+    parser.add_argument("--model", default="gpt-5-mini")
+    parser.add_argument("--force-regenerate", action="store_true", help="ignore cached results")
+    parser.add_argument("--upload-files", action="store_true",
+                        help="upload each PDF once through the Files API (OpenAI keeps it up to 24h) instead of inlining it")
+    for key, default in JOB_DEFAULTS.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", default=default, type=type(default),
+                            help=f"default when the manifest leaves it out (default {default})")
+    args = parser.parse_args()
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        sys.exit("OPENAI_API_KEY is not set (add it to .env)")
+
+    rows = _load_manifest(args.manifest) if args.manifest else _jobs_from_dir(args.pdf_dir)
+    defaults = {key: getattr(args, key) for key in JOB_DEFAULTS}
+    jobs = [job for i, row in enumerate(rows, 1) for job in _normalize_jobs(row, defaults, i)]
+    if not jobs:
+        sys.exit("No jobs to run")
+    logger.info(f"[BATCH] {len(jobs)} job(s), {args.workers} worker(s), output in {args.out_dir}")
+
+    summary = client_registry.run_closing_clients(run_batch(
+        jobs, args.out_dir, api_key,
+        workers=args.workers,
+        max_concurrency=args.max_concurrency,
+        model=args.model,
+        force_regenerate=args.force_regenerate,
+        upload_files=args.upload_files,
+    ))
+    summary_path = os.path.join(args.out_dir, "summary.json")
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+
+    for subject, modes in summary["by_content_mode"].items():
+        for mode, stats in modes.items():
+            logger.info(f"[BATCH] {subject} / {mode}: {stats['jobs']} job(s) | avg input {stats['avg_input_tokens']:,} tokens | "
+                        f"avg {stats['avg_generation_time']}s | ₹{stats['cost_inr']:.2f}")
+    logger.info(f"[BATCH] {summary['succeeded']}/{summary['jobs']} succeeded in {summary['wall_time']}s | "
+                f"Tokens: {summary['tokens']['total_tokens']:,} | Cost: ₹{summary['total_cost_inr']:.2f} | {summary_path}")
+    sys.exit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
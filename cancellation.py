@@ -0,0 +1,79 @@
+"""
+NEET Test Generator - Cancellation
+A thread-safe stop signal for one generation. The Stop button (via the job
+queue and worker) fires it from another thread; the generator awaits its
+API calls through guard(), so open requests are aborted at once instead
+of running (and billing) to completion.
+"""
+
+import asyncio
+import contextlib
+import threading
+
+
+class GenerationCancelled(Exception):
+    """Raised inside a generation whose CancellationToken was cancelled."""
+
+
+def _fire(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class CancellationToken:
+    """Stop signal shared by every chunk and request of one generation.
+
+    cancel() may be called from any thread; coroutines on any event loop
+    observe it through guard() or raise_if_cancelled().
+    """
+
+    def __init__(self):
+        self.reason = None
+        self._event = threading.Event()
+        self._waiters = set()   # (loop, future) pairs of guard() calls in progress
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "Generation cancelled"):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            waiters = list(self._waiters)
+        for loop, future in waiters:
+            with contextlib.suppress(RuntimeError):   # loop already closed
+                loop.call_soon_threadsafe(_fire, future)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise GenerationCancelled(self.reason)
+
+    async def guard(self, coro):
+        """Await `coro`; if the token fires first, cancel it and raise GenerationCancelled."""
+        loop = asyncio.get_running_loop()
+        fired = loop.create_future()
+        waiter = (loop, fired)
+        with self._lock:
+            if self._event.is_set():
+                coro.close()
+                raise GenerationCancelled(self.reason)
+            self._waiters.add(waiter)
+        task = asyncio.ensure_future(coro)
+        try:
+            await asyncio.wait({task, fired}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+            fired.cancel()
+            if not task.done():
+                # Token fired, or we were cancelled ourselves: abort the work and its HTTP requests
+                task.cancel()
+                with contextlib.suppress(BaseException):
+                    await task
+        if task.cancelled() and self._event.is_set():
+            raise GenerationCancelled(self.reason)
+        return task.result()
@@ -0,0 +1,57 @@
+"""
+NEET Test Generator - Client Pool Benchmark
+Median latency of a cheap request (models.list, costs no tokens) on a
+fresh AsyncOpenAI per call, as every slot used to create, vs. the pooled
+client from client_registry.
+
+Usage:
+    python checks/bench_client_pool.py [--requests 10] [--base-url URL]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import client_registry  # noqa: E402
+
+
+async def _timed(client) -> float:
+    start = time.perf_counter()
+    await client.models.list()
+    return time.perf_counter() - start
+
+
+async def benchmark(requests: int, base_url: str = None) -> dict:
+    fresh = []
+    for _ in range(requests):
+        # What every slot used to do: a new client, pool and TLS handshake per generation
+        async with AsyncOpenAI(base_url=base_url, max_retries=0) as client:
+            fresh.append(await _timed(client))
+
+    pooled_client = client_registry.get_async_client(base_url=base_url)
+    await _timed(pooled_client)   # the one handshake the pool pays
+    pooled = [await _timed(pooled_client) for _ in range(requests)]
+    return {
+        "fresh_client_median_ms": round(statistics.median(fresh) * 1000, 1),
+        "pooled_client_median_ms": round(statistics.median(pooled) * 1000, 1),
+        "saved_per_slot_ms": round((statistics.median(fresh) - statistics.median(pooled)) * 1000, 1),
+        "http2": client_registry.HTTP2_AVAILABLE,
+    }
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Measure connection setup saved by the pooled OpenAI client.")
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--base-url", default=None)
+    args = parser.parse_args()
+    summary = client_registry.run_closing_clients(benchmark(args.requests, args.base_url))
+    print(json.dumps(summary, indent=2))
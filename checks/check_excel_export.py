@@ -0,0 +1,239 @@
+"""
+NEET Test Generator - Excel Export Check
+Builds the same results with excel_export and with the in-memory
+exporter it replaced (frozen below; it shares excel_export's text
+helpers, which did not change) and fails unless both workbooks have
+identical values, styles and column widths and read back identically for
+review. Then times both, with peak memory, on a 10,000-question result.
+
+Usage:
+    python checks/check_excel_export.py [--rows 10000] [--seed 11]
+"""
+
+import argparse
+import gc
+import io
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from openpyxl import Workbook, load_workbook  # noqa: E402
+
+import excel_export  # noqa: E402
+from excel_export import (  # noqa: E402
+    AR_HEADERS, MCQ_HEADERS, MTC_HEADERS, _CELL_ALIGN, _HEADER_ALIGN, _HEADER_FILL, _HEADER_FONT, _THIN_BORDER,
+    _clean, _format_time, _parse_ar, _parse_mtc, _source_info,
+)
+
+
+# ============================================================
+# BASELINE (in-memory workbook, cell by cell)
+# ============================================================
+
+_AR_DEFAULT_OPTIONS = {
+    "a": "Both Assertion and Reason are true and Reason is the correct explanation of Assertion",
+    "b": "Both Assertion and Reason are true but Reason is NOT the correct explanation of Assertion",
+    "c": "Assertion is true but Reason is false",
+    "d": "Assertion is false but Reason is true",
+}
+
+
+def _baseline_meta(metadata: dict) -> list:
+    token_usage = metadata.get("token_usage", {})
+    gen = token_usage.get("generation", {}) or {}
+    cost = token_usage.get("cost", {}) or {}
+    return [_format_time(metadata.get("generation_time", "")), gen.get("input_tokens", ""),
+            gen.get("output_tokens", ""), cost.get("input_cost", ""), cost.get("output_cost", "")]
+
+
+def _baseline_mcq_row(q: dict, idx: int) -> list:
+    opts = q.get("options", {})
+    return [q.get("question_id", idx + 1), _clean(q.get("question_text", "")),
+            *(_clean(opts.get(k, "")) for k in "abcd"), (q.get("correct_answer") or "").upper(), *_source_info(q)]
+
+
+def _baseline_ar_row(q: dict, idx: int) -> list:
+    opts = q.get("options") or _AR_DEFAULT_OPTIONS
+    return [q.get("question_id", idx + 1), *_parse_ar(q.get("question_text", "")),
+            *(_clean(opts.get(k, _AR_DEFAULT_OPTIONS[k])) for k in "abcd"),
+            (q.get("correct_answer") or "").upper(), *_source_info(q)]
+
+
+def _baseline_mtc_row(q: dict, idx: int) -> list:
+    opts = q.get("options", {})
+    return [q.get("question_id", idx + 1), *_parse_mtc(q.get("question_text", "")),
+            *(_clean(opts.get(k, "")) for k in "abcd"), (q.get("correct_answer") or "").upper(), *_source_info(q)]
+
+
+def _baseline_build_sheet(ws, headers: list, row_fn, questions: list, metadata: dict):
+    """The old _build_*_sheet: cells one by one, then header styles, alignment and auto width."""
+    for col, h in enumerate(headers, 1):
+        ws.cell(row=1, column=col, value=h)
+    for col in range(1, len(headers) + 1):
+        cell = ws.cell(row=1, column=col)
+        cell.font = _HEADER_FONT
+        cell.fill = _HEADER_FILL
+        cell.alignment = _HEADER_ALIGN
+        cell.border = _THIN_BORDER
+    for idx, q in enumerate(questions):
+        row = idx + 2
+        # Accuracy and Comment left blank, then time, tokens and cost on every row
+        values = [*row_fn(q, idx), None, None, *_baseline_meta(metadata)]
+        for col, value in enumerate(values, 1):
+            ws.cell(row=row, column=col).value = value
+        for c in range(1, len(headers) + 1):
+            ws.cell(row=row, column=c).alignment = _CELL_ALIGN
+    for col in ws.columns:
+        max_len = 0
+        for cell in col:
+            if cell.value:
+                max_len = max(max_len, max(len(line) for line in str(cell.value).split('\n')))
+        ws.column_dimensions[col[0].column_letter].width = min(max(max_len + 2, 10), 60)
+
+
+_BASELINE_SHEETS = {
+    "mcq": ("MCQ", MCQ_HEADERS, _baseline_mcq_row),
+    "ar": ("Assertion-Reason", AR_HEADERS, _baseline_ar_row),
+    "mtc": ("Match the Column", MTC_HEADERS, _baseline_mtc_row),
+}
+
+
+def baseline_generate_excel_for_result(result: dict) -> bytes:
+    """generate_excel_for_result before the write-only workbook."""
+    metadata = result.get("test_metadata", {})
+    questions = result.get("questions", [])
+    question_type = metadata.get("question_type", "mcq")
+
+    if question_type == "combination":
+        groups = [
+            ("mcq", [q for q in questions if q.get("question_type", "").upper() == "MCQ"]),
+            ("ar", [q for q in questions if q.get("question_type", "").upper() in ("ASSERTION_REASON", "ASSERTION-REASON", "AR")]),
+            ("mtc", [q for q in questions if q.get("question_type", "").upper() in ("MATCH_THE_COLUMN", "MTC")]),
+        ]
+        groups = [(kind, qs) for kind, qs in groups if qs] or [("mcq", questions)]
+    elif question_type == "assertion_reason":
+        groups = [("ar", questions)]
+    elif question_type == "match_the_column":
+        groups = [("mtc", questions)]
+    else:
+        groups = [("mcq", questions)]
+
+    wb = Workbook()
+    for n, (kind, qs) in enumerate(groups):
+        title, headers, row_fn = _BASELINE_SHEETS[kind]
+        ws = wb.active if n == 0 else wb.create_sheet(title)
+        ws.title = title
+        _baseline_build_sheet(ws, headers, row_fn, qs, metadata)
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+# ============================================================
+# RESULTS
+# ============================================================
+
+_TYPES = {
+    "combination": ["MCQ", "ASSERTION_REASON", "MATCH_THE_COLUMN", "mcq", "OTHER"],
+    "mcq": ["MCQ"],
+    "assertion_reason": ["ASSERTION_REASON"],
+    "match_the_column": ["MATCH_THE_COLUMN"],
+}
+
+
+def _question(rng: random.Random, i: int, qtype: str) -> dict:
+    q = {
+        "question_id": i,
+        "question_type": qtype,
+        "correct_answer": rng.choice("abcd"),
+        "options": {k: f"$Fe^{{{i % 7}+}}$ option {k} {rng.random():.6f}" for k in "abcd"},
+        "source_info": {"page_or_section": f"p{i % 40}", "key_concepts": ["redox", f"c{i}"]},
+    }
+    if qtype == "ASSERTION_REASON":
+        q["question_text"] = f"Assertion (A): $\\Delta G^\\circ$ < 0 {i}. Reason (R): $E^\\circ_{{cell}}$ > 0 {rng.random()}"
+        if i % 3 == 0:
+            q["options"] = {}
+    elif qtype == "MATCH_THE_COLUMN":
+        pairs = "\n".join(f"{left}. item{left}{i} | {right}. $H_2O$ {i}" for left, right in zip("ABCD", ["I", "II", "III", "IV"]))
+        q["question_text"] = (f"Match List I with List II\n\nList I | List II\n{pairs}\n\n"
+                              "Choose the correct answer from the options given below:")
+    else:
+        q["question_text"] = f"Q{i}: Which is true for $K_{{eq}}$ at {rng.random():.5f}?\\nStatement 1. x\\n(2) y " * rng.randint(1, 3)
+    return q
+
+
+def make_result(rng: random.Random, count: int, question_type: str) -> dict:
+    return {
+        "questions": [_question(rng, i, rng.choice(_TYPES[question_type])) for i in range(1, count + 1)],
+        "test_metadata": {
+            "question_type": question_type,
+            "generation_time": 75.3,
+            "token_usage": {"generation": {"input_tokens": 1200, "output_tokens": 900}, "cost": {"input_cost": 0.1}},
+        },
+    }
+
+
+def _snapshot(excel_bytes: bytes) -> list:
+    """Every sheet's cells (value and style) and column widths."""
+    sheets = []
+    for ws in load_workbook(io.BytesIO(excel_bytes)).worksheets:
+        cells = []
+        for row in ws.iter_rows():
+            for c in row:
+                color = c.font.color.rgb if c.font.color and isinstance(c.font.color.rgb, str) else None
+                cells.append((c.coordinate, c.value, c.font.b, color, c.font.name, c.font.sz, c.fill.fgColor.rgb,
+                              c.alignment.wrap_text, c.alignment.vertical, c.alignment.horizontal,
+                              c.border.left.style if c.border.left else None))
+        widths = {k: v.width for k, v in ws.column_dimensions.items()}
+        sheets.append((ws.title, ws.max_row, ws.max_column, cells, widths))
+    return sheets
+
+
+def check_equivalence(seed: int) -> int:
+    rng = random.Random(seed)
+    failures = 0
+    for question_type in _TYPES:
+        for count in (0, 1, 40):
+            result = make_result(rng, count, question_type)
+            old, new = baseline_generate_excel_for_result(result), excel_export.generate_excel_for_result(result)
+            if _snapshot(old) != _snapshot(new):
+                failures += 1
+                print(f"MISMATCH: {question_type} with {count} question(s): workbooks differ")
+            elif excel_export.read_excel_for_review(old) != excel_export.read_excel_for_review(new):
+                failures += 1
+                print(f"MISMATCH: {question_type} with {count} question(s): review read-back differs")
+    print(f"{len(_TYPES) * 3} workbooks compared: {failures} mismatch(es)")
+    return failures
+
+
+def benchmark(rows: int, seed: int):
+    result = make_result(random.Random(seed), rows, "mcq")
+    for name, generate in (("in-memory workbook", baseline_generate_excel_for_result),
+                           ("write-only workbook", excel_export.generate_excel_for_result)):
+        excel_export._convert_latex.cache_clear()
+        gc.collect()
+        start = time.perf_counter()
+        data = generate(result)
+        elapsed = time.perf_counter() - start
+        excel_export._convert_latex.cache_clear()
+        gc.collect()
+        tracemalloc.start()
+        generate(result)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{name}: {rows:,} rows in {elapsed:.2f}s, peak {peak / 1e6:.0f}MB, {len(data) / 1e6:.1f}MB xlsx")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the write-only Excel export with the in-memory one.")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+    failed = check_equivalence(args.seed)
+    benchmark(args.rows, args.seed)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,153 @@
+"""
+NEET Test Generator - JSON Repair Check
+Replays truncated model responses through json_stream.repair_truncated_json
+and the original rfind/suffix loop it replaced, and fails if the one-pass
+repair recovers fewer questions or different ones. Also times both on a
+long response cut inside a brace-heavy explanation.
+
+The built-in corpus is synthetic: responses shaped like the model's output
+(LaTeX, braces and quotes inside strings, optional test_metadata), built
+from a seed. No recorded gpt-5-mini responses ship with the repo; pass a
+directory of saved raw responses (one response per *.txt / *.json file)
+with --responses to replay those as well.
+
+Usage:
+    python checks/check_json_repair.py [--cuts 400] [--seed 7] [--responses DIR]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_stream import fix_latex_json, repair_truncated_json  # noqa: E402
+
+
+def baseline_repair(repair_text: str):
+    """The repair loop from test_generator._parse_json_response before the one-pass scan."""
+    pos = len(repair_text)
+    while pos > 0:
+        pos = repair_text.rfind("}", 0, pos)
+        if pos == -1:
+            break
+        truncated = repair_text[:pos + 1]
+        for suffix in ["", "}", "]}", "]}}", "]}}}", "]}]}"]:
+            try:
+                result = json.loads(truncated + suffix)
+                if "questions" in result and len(result["questions"]) > 0:
+                    return result
+            except json.JSONDecodeError:
+                continue
+    return None
+
+
+# ============================================================
+# RESPONSES
+# ============================================================
+
+_FRAGMENTS = ["$Fe^{2+}$", "$E^\\circ_{cell}$", "{braces} in text", "a \"quoted\" word", "[1] ref",
+              "$\\Delta H = -286$ kJ", "}{", "1. First\\n2. Second", "$K_{eq}$", "plain words"]
+
+
+def _question(rng: random.Random, qid: int) -> dict:
+    def text(n):
+        return " ".join(rng.choice(_FRAGMENTS) for _ in range(n))
+    return {
+        "question_id": qid,
+        "question_type": rng.choice(["MCQ", "ASSERTION_REASON", "MATCH_THE_COLUMN"]),
+        "question_text": text(rng.randint(3, 12)),
+        "options": {k: text(2) for k in "abcd"},
+        "correct_answer": rng.choice("abcd"),
+        "explanation": {k: text(rng.randint(1, 6)) for k in "abcd"},
+        "source_info": {"page_or_section": f"Page {qid}", "key_concepts": [text(1), text(1)]},
+    }
+
+
+def make_response(rng: random.Random, count: int) -> str:
+    """A model-style response: optional preamble/metadata, then the questions array."""
+    body = {"questions": [_question(rng, i) for i in range(1, count + 1)]}
+    if rng.random() < 0.5:
+        body = {"test_metadata": {"subject": "chemistry", "notes": "{x}"}, **body}
+    # The model writes LaTeX with single backslashes; fix_latex_json runs before repair
+    return json.dumps(body, indent=rng.choice([None, 2])).replace("\\\\", "\\")
+
+
+def _recovered(result) -> list:
+    return result["questions"] if result else []
+
+
+def _compare(cut: str) -> tuple:
+    """(recovered anything, problem message or None) for one truncated response."""
+    old, new = _recovered(baseline_repair(cut)), _recovered(repair_truncated_json(cut))
+    # The old loop could also return a half-written last question; the new one never does
+    if new != old and new != old[:-1]:
+        return bool(new), f"MISMATCH at cut {len(cut)}: old {len(old)} question(s), new {len(new)}"
+    if old and not new:
+        return False, f"LOST at cut {len(cut)}: old recovered {len(old)}, new none"
+    return bool(new), None
+
+
+def check_truncations(texts, cuts_per_text: int, seed: int, name: str) -> int:
+    """Cut each response at `cuts_per_text` random points and compare both repairs."""
+    rng = random.Random(seed)
+    failures = recovered = total = 0
+    for text in texts:
+        text = fix_latex_json(text)
+        for n in range(cuts_per_text):
+            cut = text[:rng.randint(1, len(text))]
+            if total % 10 == 0:
+                # A malformed question before the cut: recovery must fall back past it
+                bad = cut.rfind('"correct_answer"', 0, len(cut) // 2)
+                if bad != -1:
+                    cut = cut[:bad] + "@" + cut[bad:]
+            total += 1
+            ok, problem = _compare(cut)
+            recovered += ok
+            if problem:
+                failures += 1
+                print(problem)
+    print(f"{total} truncated {name} responses: {recovered} recovered, {failures} mismatch(es)")
+    return failures
+
+
+def synthetic_responses(count: int, seed: int):
+    rng = random.Random(seed)
+    return (make_response(rng, rng.randint(1, 8)) for _ in range(count))
+
+
+def recorded_responses(directory: str) -> list:
+    texts = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith((".txt", ".json")):
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                texts.append(f.read())
+    return texts
+
+
+def benchmark(seed: int):
+    rng = random.Random(seed)
+    text = fix_latex_json(make_response(rng, 200))
+    # Cut inside an explanation full of '}' (the old loop tries each one)
+    cut = text.rfind('"explanation": {') + len('"explanation": {')
+    text = text[:cut] + '"a": "' + "x} " * 400
+    for name, fn in (("rfind/suffix loop", baseline_repair), ("one-pass repair", repair_truncated_json)):
+        start = time.perf_counter()
+        result = fn(text)
+        print(f"{name}: {len(_recovered(result))} questions from {len(text):,} chars in {time.perf_counter() - start:.3f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare truncated-JSON repair against the original loop.")
+    parser.add_argument("--cuts", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--responses", help="directory of recorded raw model responses to replay too")
+    args = parser.parse_args()
+    failed = check_truncations(synthetic_responses(args.cuts, args.seed), 1, args.seed, "synthetic")
+    if args.responses:
+        failed += check_truncations(recorded_responses(args.responses), 50, args.seed, "recorded")
+    benchmark(args.seed)
+    sys.exit(1 if failed else 0)
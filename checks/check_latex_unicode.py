@@ -0,0 +1,156 @@
+"""
+NEET Test Generator - LaTeX to Unicode Check
+Compares excel_export.latex_to_unicode with the sequential re.sub/replace
+version it replaced (frozen below) and fails on any difference in:
+- a golden table of nested scripts (_{a_2}, ^{a_{2}}, e^{-E_{a}/RT}, ...)
+  with the output both versions must give,
+- every string in the prompt modules plus random mixes of NEET formulas.
+Random ^ _ { } \\ fragments are also compared; differences there are
+reported but do not fail the check: they need a converted _{..} group to
+form a new token with the text around it, like \\_{}p or _{x_}p. Then
+times both on a 100-question test.
+
+Usage:
+    python checks/check_latex_unicode.py [--random 20000] [--seed 5]
+"""
+
+import argparse
+import ast
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import excel_export  # noqa: E402
+from excel_export import _GREEK, _to_subscript, _to_superscript, latex_to_unicode  # noqa: E402
+
+
+def baseline_latex_to_unicode(text: str) -> str:
+    """latex_to_unicode before the tokenizer: one pass per command, then ^{}, ^X, _{}, _X."""
+    if not text:
+        return ""
+    text = str(text)
+    text = re.sub(r'\$([^$]+)\$', r'\1', text)
+    text = re.sub(r'\\(?:text|mathrm|textrm)\{([^}]*)\}', r'\1', text)
+    for name, char in _GREEK.items():
+        text = text.replace(f'\\{name}', char)
+    text = text.replace('\\cdot', '\u00b7')
+    text = re.sub(r'\^\\circ', '\u00b0', text)
+    text = text.replace('\\circ', '\u00b0')
+    text = text.replace('\\rightleftharpoons', '\u21cc')
+    text = text.replace('\\rightarrow', '\u2192')
+    text = text.replace('\\leftarrow', '\u2190')
+    text = text.replace('\\to', '\u2192')
+    text = text.replace('\\times', '\u00d7')
+    text = re.sub(r'\\[;,:\!]', ' ', text)
+    text = text.replace('\\quad', ' ')
+    text = text.replace('\\qquad', '  ')
+    text = text.replace(';', ' ')
+    text = re.sub(r'\^{([^}]*)}', lambda m: _to_superscript(m.group(1)), text)
+    text = re.sub(r'\^([0-9+\-n])', lambda m: _to_superscript(m.group(1)), text)
+    text = re.sub(r'_{([^}]*)}', lambda m: _to_subscript(m.group(1)), text)
+    text = re.sub(r'_([0-9aehklmnopstx])', lambda m: _to_subscript(m.group(1)), text)
+    text = re.sub(r'\\([a-zA-Z]+)', r'\1', text)
+    return text
+
+
+# ============================================================
+# CORPUS
+# ============================================================
+
+# Scripts inside scripts: the inner one is mapped as-is, except that
+# subscripts are converted after superscripts (so _{a^2} gives ₐ²)
+NESTED_GOLDEN = {
+    "$_{a_2}$": "\u2090_\u2082",
+    "$^{a^2}$": "a^\u00b2",
+    "$_{a^2}$": "\u2090\u00b2",
+    "$^{a_2}$": "a_\u00b2",
+    "$_{a^{2}}$": "\u2090\u00b2",
+    "$^{a_{2}}$": "a\u00b2",
+    "$K_{p_{1}}$": "K\u209a_{\u2081}",
+    "$x_{\\alpha_2}$": "x\u03b1_\u2082",
+    "$e^{-E_{a}/RT}$": "e\u207bE\u2090/RT",
+    "$t_{1/2}^{2}$": "t\u2081/\u2082\u00b2",
+    "$E^{\\circ}_{Fe^{3+}/Fe^{2+}}$": "E\u00b0F\u2091\u00b3\u207a/F\u2091\u00b2\u207a",
+    "$[Co(NH_3)_6]^{3+}$": "[Co(NH\u2083)\u2086]\u00b3\u207a",
+}
+
+_FORMULAS = ["$Fe^{2+}$", "$E^\\circ_{cell}$", "$E^{\\circ}$", "$\\Delta H$", "$K_{eq}$", "$K_{\\text{eq}}$",
+             "$\\mathrm{H_2O}$", "$2H_2 + O_2 \\rightarrow 2H_2O$", "$N_2 + 3H_2 \\rightleftharpoons 2NH_3$",
+             "$1s^2 2s^2 2p^6$", "d^{10};ns^2", "$\\alpha$-particle", "$6.02 \\times 10^{23}$",
+             "$\\Delta G^\\circ = -nFE^\\circ$", "$K_p = K_c(RT)^{\\Delta n}$", " and ", "$SO_4^{2-}$",
+             "$x \\cdot y$", "$a\\,b$", "$\\frac{1}{2}$", "$C_6H_{12}O_6$", "$k = 0.693/t_{1/2}$",
+             "$\\textrm{mol}^{-1}$", "$\\quad$", "$OH^-$", "$A \\to B$", "$x_a$", "$T_{\\text{b}}$"]
+_FRAGMENTS = ["^", "_", "{", "}", "$", "\\", "a", "2", "n", "circ", "text{", "alpha", ";", "\\;", "to", "p",
+              "\\nu", "-"]
+
+
+def golden_corpus(random_count: int, seed: int) -> list:
+    """Every string literal (and quoted JSON value) in the prompt modules, plus random formula mixes."""
+    corpus = []
+    for module in ("prompts_chemistry", "prompts_biology"):
+        with open(os.path.join(ROOT, f"{module}.py"), encoding="utf-8") as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str):
+                corpus.append(node.value)
+                corpus.extend(re.findall(r'"((?:[^"\\]|\\.)*)"', node.value))
+    rng = random.Random(seed)
+    for _ in range(random_count):
+        corpus.append("".join(rng.choice(_FORMULAS) for _ in range(rng.randint(1, 12))))
+    return corpus
+
+
+def fragment_fuzz(count: int, seed: int) -> list:
+    rng = random.Random(seed + 1)
+    return ["".join(rng.choice(_FRAGMENTS) for _ in range(rng.randint(1, 15))) for _ in range(count)]
+
+
+def _show(strings):
+    for s in strings[:5]:
+        print(f"  {s!r}\n    baseline: {baseline_latex_to_unicode(s)!r}\n    current:  {latex_to_unicode(s)!r}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check latex_to_unicode against the sequential version.")
+    parser.add_argument("--random", type=int, default=20000, help="random formula mixes added to the corpus")
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args()
+
+    failed = 0
+    for text, expected in NESTED_GOLDEN.items():
+        old, new = baseline_latex_to_unicode(text), latex_to_unicode(text)
+        if old != expected or new != expected:
+            failed += 1
+            print(f"NESTED {text!r}: expected {expected!r}, baseline {old!r}, current {new!r}")
+    print(f"{len(NESTED_GOLDEN)} nested-script strings: {failed} mismatch(es)")
+
+    corpus = golden_corpus(args.random, args.seed)
+    mismatches = [s for s in corpus if baseline_latex_to_unicode(s) != latex_to_unicode(s)]
+    print(f"{len(corpus)} strings: {len(mismatches)} mismatch(es)")
+    _show(mismatches)
+    failed += len(mismatches)
+
+    fuzz = fragment_fuzz(args.random, args.seed)
+    differ = [s for s in fuzz if baseline_latex_to_unicode(s) != latex_to_unicode(s)]
+    print(f"{len(fuzz)} random fragment strings: {len(differ)} differ (not counted)")
+    _show(differ)
+
+    # A 100-question test is ~1,200 strings, rendered again on every Streamlit rerun
+    rng = random.Random(args.seed)
+    test = [rng.choice(corpus[-args.random:] or corpus) for _ in range(1200)]
+    start = time.perf_counter()
+    for s in test:
+        baseline_latex_to_unicode(s)
+    print(f"sequential passes: {(time.perf_counter() - start) * 1000:.1f}ms for 1200 strings")
+    excel_export._convert_latex.cache_clear()
+    for label in ("tokenizer, first render", "tokenizer, re-render"):
+        start = time.perf_counter()
+        for s in test:
+            latex_to_unicode(s)
+        print(f"{label}: {(time.perf_counter() - start) * 1000:.1f}ms")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,107 @@
+"""
+NEET Test Generator - LaTeX Wrapping Check
+Compares postprocess.fix_unwrapped_latex with the per-match version it
+replaced (frozen below) on every string in the prompt modules plus random
+formula fragments, and fails on any difference. Then times both on a
+500-question batch of long, formula-heavy questions.
+
+Usage:
+    python checks/check_latex_wrapping.py [--random 20000] [--seed 3]
+"""
+
+import argparse
+import ast
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from postprocess import fix_unwrapped_latex  # noqa: E402
+
+
+def baseline_fix_unwrapped_latex(text: str) -> str:
+    """_fix_unwrapped_latex as it was in test_generator: counts '$' before every match."""
+    if not text:
+        return text
+    if '^' not in text and '_' not in text and '\\' not in text:
+        return text
+
+    def wrap_match(m):
+        if text[:m.start()].count('$') % 2 == 1:
+            return m.group(0)
+        return f'${m.group(0)}$'
+
+    text = re.sub(
+        r'(?<!\$)([A-Za-z][A-Za-z0-9]*(?:[_^]\{[^}]+\}|[_^][0-9])[A-Za-z0-9_^{}+\-]*(?:/[A-Za-z][A-Za-z0-9_^{}+\-]*)*)(?!\}|\$)',
+        wrap_match,
+        text
+    )
+    return text.replace('$$', '$ $')
+
+
+# ============================================================
+# CORPUS
+# ============================================================
+
+_FRAGMENTS = ["Fe^{2+}", "H_2O", "SO_4^{2-}", "M^{2+}/M", "$E^\\circ$", "$", "x^{a$b}", "C_6H_{12}O_6", "\\Delta",
+              " and ", "K_c", "}", "{", "_", "^", "2", "/", "Cr_2O_7^{2-}$", "$$"]
+
+
+def golden_corpus(random_count: int, seed: int) -> list:
+    """Every string literal (and quoted JSON value) in the prompt modules, plus random fragments."""
+    corpus = []
+    for module in ("prompts_chemistry", "prompts_biology"):
+        with open(os.path.join(ROOT, f"{module}.py"), encoding="utf-8") as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str):
+                corpus.append(node.value)
+                corpus.extend(re.findall(r'"((?:[^"\\]|\\.)*)"', node.value))
+    rng = random.Random(seed)
+    for _ in range(random_count):
+        corpus.append("".join(rng.choice(_FRAGMENTS) for _ in range(rng.randint(1, 25))))
+    return corpus
+
+
+def batch_strings(seed: int, questions: int = 500) -> list:
+    """Question text, options and explanation of a long hard-MCQ batch full of formulas."""
+    rng = random.Random(seed)
+    phrases = ["Fe^{2+} is oxidised to Fe^{3+}", "$E^\\circ_{cell}$ = 1.10 V", "H_2SO_4", "the ratio K_p/K_c",
+               "1. The statement holds.", "$\\Delta G = -nFE$"]
+
+    def text(n):
+        return " ".join(rng.choice(phrases) for _ in range(n))
+
+    strings = []
+    for _ in range(questions):
+        strings.append(text(60))
+        strings.extend(text(6) for _ in range(4))
+        strings.append(text(200))
+    return strings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check fix_unwrapped_latex against the per-match version.")
+    parser.add_argument("--random", type=int, default=20000, help="random fragment strings added to the corpus")
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = golden_corpus(args.random, args.seed)
+    mismatches = [s for s in corpus if baseline_fix_unwrapped_latex(s) != fix_unwrapped_latex(s)]
+    changed = sum(baseline_fix_unwrapped_latex(s) != s for s in corpus)
+    print(f"{len(corpus)} strings ({changed} rewritten): {len(mismatches)} mismatch(es)")
+    for s in mismatches[:5]:
+        print(f"  {s!r}\n    baseline: {baseline_fix_unwrapped_latex(s)!r}\n    current:  {fix_unwrapped_latex(s)!r}")
+
+    strings = batch_strings(args.seed)
+    for name, fn in (("per-match count", baseline_fix_unwrapped_latex), ("incremental count", fix_unwrapped_latex)):
+        start = time.perf_counter()
+        for s in strings:
+            fn(s)
+        print(f"{name}: {(time.perf_counter() - start) * 1000:.0f}ms for 500 questions "
+              f"({sum(map(len, strings)) // 1000}k chars)")
+    sys.exit(1 if mismatches else 0)
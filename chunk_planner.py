@@ -0,0 +1,210 @@
+"""
+NEET Test Generator - Chunk Planner
+Plans the parallel chunks for a large PDF from its content instead of
+fixed 15-page slices: every page is scored (text length, headings,
+figures), chunks are sized to an input-token budget with boundaries at
+section headings, and questions are allocated by content density, so
+chunks finish at similar times.
+"""
+
+import functools
+import logging
+import math
+import re
+
+from pdf_utils import ParsedPdf
+
+logger = logging.getLogger(__name__)
+
+
+# Rough input-token cost of one PDF page (text layer + page image)
+ESTIMATED_TOKENS_PER_PDF_PAGE = 1500
+
+# Input tokens per chunk (the old fixed chunks were 15 PDF pages)
+CHUNK_TOKEN_BUDGET = 15 * ESTIMATED_TOKENS_PER_PDF_PAGE
+# A boundary may move this far (share of the ideal chunk size) to land on a heading
+BOUNDARY_SLACK = 0.3
+# Context pages sent on each side of a chunk (no questions come from them)
+CONTEXT_OVERLAP_PAGES = 1
+
+# Content-density weights: how much a page should contribute to the question count
+MAX_PAGE_TEXT_WEIGHT = 4000   # chars; beyond this a page is not "denser"
+FIGURE_WEIGHT = 600           # chars-equivalent for each figure on the page
+MIN_CONTENT_CHARS = 80        # pages with less text and no figures are blank
+
+# File mode does not extract every page's text (it is never sent): text length
+# is estimated from the page's content stream size instead. Rough; text-heavy
+# textbook pages usually draw 1-4 bytes of operators per character of text.
+CONTENT_BYTES_PER_TEXT_CHAR = 2
+# ...and only the opening / closing pages, where contents, index and answer
+# pages sit, have their text read to spot them
+INDEX_SCAN_PAGES = 8
+
+# "7.3 Electrochemical Cells", "Unit 4", "SUMMARY" ...
+_HEADING_RE = re.compile(
+    r"^\s*(?:\d{1,2}(?:\.\d{1,2}){1,2}\s+[A-Z]|(?:unit|chapter)\s+\d+\b|"
+    r"(?:summary|exercises|questions)\s*$)",
+    re.IGNORECASE,
+)
+_INDEX_PAGE_RE = re.compile(r"^\s*(?:contents|index|bibliography|answers|appendix)\b", re.IGNORECASE)
+_LEADER_LINE_RE = re.compile(r"(?:\.{3,}|\s{2,})\s*\d{1,4}\s*$")
+
+
+# ============================================================
+# PAGE PROFILES
+# ============================================================
+
+_UNKNOWN = object()
+
+
+class PageProfile:
+    """What the planner knows about one page.
+
+    `page_text()` returns the page's text; it is only called the first time
+    `heading` is read, so file mode extracts text just for the pages a chunk
+    boundary might land on.
+    """
+
+    __slots__ = ("index", "text_chars", "figures", "skippable", "tokens", "weight", "_page_text", "_heading")
+
+    def __init__(self, index: int, text_chars: int, figures: int, skippable: bool, tokens: int, page_text):
+        self.index = index
+        self.text_chars = text_chars
+        self.figures = figures
+        self.skippable = skippable
+        self.tokens = tokens
+        # Blank, contents and index pages get no share of the questions
+        self.weight = 0 if skippable else min(text_chars, MAX_PAGE_TEXT_WEIGHT) + figures * FIGURE_WEIGHT
+        self._page_text = page_text
+        self._heading = _UNKNOWN
+
+    @property
+    def heading(self):
+        if self._heading is _UNKNOWN:
+            self._heading = _find_heading(self._page_text())
+        return self._heading
+
+
+def _find_heading(text: str):
+    """First section heading among the page's opening lines, or None."""
+    for line in text.splitlines()[:6]:
+        line = line.strip()
+        if line and len(line) < 80 and _HEADING_RE.match(line):
+            return line
+    return None
+
+
+def _is_index_page(text: str) -> bool:
+    """Contents / index / answer-key pages: a title line, or mostly 'topic .... page' lines."""
+    lines = [line for line in text.splitlines() if line.strip()]
+    if not lines:
+        return False
+    if _INDEX_PAGE_RE.match(lines[0]):
+        return True
+    leaders = sum(1 for line in lines if _LEADER_LINE_RE.search(line))
+    return len(lines) >= 8 and leaders / len(lines) > 0.5
+
+
+def profile_pages(parsed_pdf: ParsedPdf, content_mode: str = "file") -> list:
+    """Score every page of `parsed_pdf`. Token estimates follow how the page will be sent.
+
+    Text mode extracts every page's text (the chunks need it anyway). File
+    mode estimates text length from the content stream size, and reads text
+    only for headings near chunk boundaries and for contents / index pages
+    among the first and last INDEX_SCAN_PAGES.
+    """
+    profiles = []
+    for i in range(parsed_pdf.page_count):
+        figures = parsed_pdf.figure_count(i)
+        page_text = functools.partial(parsed_pdf.page_text, i)
+        if content_mode == "text":
+            text = page_text()
+            text_chars = len(text)
+            tokens = ESTIMATED_TOKENS_PER_PDF_PAGE if parsed_pdf.is_visual_page(i) else len(text) // 4
+            is_index = _is_index_page(text)
+        else:
+            text_chars = parsed_pdf.content_length(i) // CONTENT_BYTES_PER_TEXT_CHAR
+            tokens = ESTIMATED_TOKENS_PER_PDF_PAGE
+            near_edge = i < INDEX_SCAN_PAGES or i >= parsed_pdf.page_count - INDEX_SCAN_PAGES
+            is_index = near_edge and text_chars >= MIN_CONTENT_CHARS and _is_index_page(page_text())
+        skippable = (text_chars < MIN_CONTENT_CHARS and not figures) or is_index
+        profiles.append(PageProfile(i, text_chars, figures, skippable, max(tokens, 1), page_text))
+    return profiles
+
+
+# ============================================================
+# PLANNING
+# ============================================================
+
+def _place_boundaries(profiles: list, chunk_count: int) -> list:
+    """Start page of each chunk after the first, preferring pages that open a section."""
+    cumulative = [0]
+    for p in profiles:
+        cumulative.append(cumulative[-1] + p.tokens)
+    target = cumulative[-1] / chunk_count
+
+    starts = []
+    previous = 0
+    for k in range(1, chunk_count):
+        ideal = k * target
+        # Candidate start pages keep at least one page in every chunk
+        candidates = range(previous + 1, len(profiles) - (chunk_count - k) + 1)
+        by_distance = sorted(candidates, key=lambda i: abs(cumulative[i] - ideal))
+        # Walk outwards from the ideal boundary: a page's heading (and in file
+        # mode its text) is only read until the nearest section start is found
+        start = next((i for i in by_distance
+                      if abs(cumulative[i] - ideal) <= BOUNDARY_SLACK * target and profiles[i].heading),
+                     by_distance[0])
+        starts.append(start)
+        previous = start
+    return starts
+
+
+def _allocate_questions(weights: list, question_count: int) -> list:
+    """Split question_count in proportion to `weights` (largest remainder), at least 1 each."""
+    total = sum(weights)
+    if total <= 0:
+        weights, total = [1] * len(weights), len(weights)
+    shares = [question_count * w / total for w in weights]
+    counts = [max(1, math.floor(s)) for s in shares]
+    remainders = sorted(range(len(shares)), key=lambda i: shares[i] - math.floor(shares[i]), reverse=True)
+    i = 0
+    while sum(counts) < question_count:
+        counts[remainders[i % len(counts)]] += 1
+        i += 1
+    while sum(counts) > question_count:
+        # The max(1, ...) floor overshot: take back from the largest allocations
+        largest = max(range(len(counts)), key=lambda j: counts[j])
+        counts[largest] -= 1
+    return counts
+
+
+def plan_chunks(parsed_pdf: ParsedPdf, question_count: int, content_mode: str = "file",
+                token_budget: int = CHUNK_TOKEN_BUDGET, overlap: int = CONTEXT_OVERLAP_PAGES) -> list:
+    """Split a PDF into chunks by content and distribute questions by density.
+
+    Returns list of (core_start, core_end, pdf_start, pdf_end, num_questions) tuples (0-indexed).
+    - core_start/core_end: pages to generate questions from
+    - pdf_start/pdf_end: pages to send to API (includes overlap for context)
+    """
+    profiles = profile_pages(parsed_pdf, content_mode)
+    total_pages = len(profiles)
+    total_tokens = sum(p.tokens for p in profiles)
+    chunk_count = max(1, min(math.ceil(total_tokens / token_budget), question_count, total_pages))
+
+    starts = [0] + _place_boundaries(profiles, chunk_count)
+    ends = [s - 1 for s in starts[1:]] + [total_pages - 1]
+    weights = [sum(p.weight for p in profiles[s:e + 1]) for s, e in zip(starts, ends)]
+    counts = _allocate_questions(weights, question_count)
+
+    chunks = []
+    for start, end, chunk_q in zip(starts, ends, counts):
+        pdf_start = max(0, start - overlap)
+        pdf_end = min(total_pages - 1, end + overlap)
+        chunks.append((start, end, pdf_start, pdf_end, chunk_q))
+
+    skipped = [p.index + 1 for p in profiles if p.skippable]
+    logger.info(f"[PLAN] {total_pages} pages, ~{total_tokens:,} input tokens -> {chunk_count} chunks "
+                f"(budget {token_budget:,}) | section starts: {[s + 1 for s in starts if profiles[s].heading]} | "
+                f"no-question pages: {skipped}")
+    return chunks
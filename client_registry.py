@@ -0,0 +1,113 @@
+"""
+NEET Test Generator - Shared OpenAI Clients
+Process-level registry of OpenAI clients keyed by API key and base URL,
+each on a tuned connection pool (long keep-alive, sized to our
+concurrency, HTTP/2 when the h2 package is installed), so slots reuse
+warm TLS connections instead of opening new ones for every generation.
+
+Async clients are also keyed by event loop: an httpx pool cannot be
+shared between loops. Long-lived loops (job executor, worker) keep one
+warm client per key for their whole life; short-lived ones go through
+run_closing_clients(), which closes their clients before the loop ends.
+"""
+
+import asyncio
+import importlib.util
+import logging
+import os
+import threading
+import weakref
+
+import openai
+from openai import AsyncOpenAI, OpenAI
+
+try:
+    import httpx
+except ImportError:   # newer SDK releases are built on httpx2
+    import httpx2 as httpx
+
+logger = logging.getLogger(__name__)
+
+
+# Room for MAX_CONCURRENCY_CAP (32) streams plus uploads and hedged duplicates
+POOL_MAX_CONNECTIONS = 64
+# Idle connections stay open this long; the httpx default (5s) drops them between slots
+KEEPALIVE_EXPIRY_SECONDS = 120
+# HTTP/2 multiplexes all requests over one connection, but needs the optional h2 package
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def _pool_limits():
+    return httpx.Limits(
+        max_connections=POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=POOL_MAX_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS,
+    )
+
+
+def _client_key(api_key, base_url):
+    return (api_key or os.getenv("OPENAI_API_KEY"), base_url or os.getenv("OPENAI_BASE_URL"))
+
+
+_ASYNC_CLIENTS = weakref.WeakKeyDictionary()   # event loop -> {(api_key, base_url): AsyncOpenAI}
+_SYNC_CLIENTS = {}                             # (api_key, base_url) -> OpenAI
+_LOCK = threading.Lock()
+
+
+def get_async_client(api_key: str = None, base_url: str = None) -> AsyncOpenAI:
+    """Return the pooled AsyncOpenAI for (api_key, base_url) on the running event loop.
+
+    SDK retries are disabled: test_generator coordinates retries through the
+    rate limiter. The client stays open until aclose_loop_clients() runs on
+    this loop.
+    """
+    loop = asyncio.get_running_loop()
+    key = _client_key(api_key, base_url)
+    with _LOCK:
+        clients = _ASYNC_CLIENTS.setdefault(loop, {})
+        if key not in clients:
+            clients[key] = AsyncOpenAI(
+                api_key=key[0],
+                base_url=key[1],
+                max_retries=0,
+                http_client=openai.DefaultAsyncHttpxClient(limits=_pool_limits(), http2=HTTP2_AVAILABLE),
+            )
+            logger.info(f"[CLIENT] New pooled async client ({len(clients)} on this loop, http2={HTTP2_AVAILABLE})")
+        return clients[key]
+
+
+def get_client(api_key: str = None, base_url: str = None) -> OpenAI:
+    """Return the pooled (thread-safe) sync OpenAI client for (api_key, base_url)."""
+    key = _client_key(api_key, base_url)
+    with _LOCK:
+        if key not in _SYNC_CLIENTS:
+            _SYNC_CLIENTS[key] = OpenAI(
+                api_key=key[0],
+                base_url=key[1],
+                http_client=openai.DefaultHttpxClient(limits=_pool_limits(), http2=HTTP2_AVAILABLE),
+            )
+        return _SYNC_CLIENTS[key]
+
+
+async def aclose_loop_clients():
+    """Close and forget the async clients opened on the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _LOCK:
+        clients = _ASYNC_CLIENTS.pop(loop, {})
+    for client in clients.values():
+        await client.close()
+
+
+def run_closing_clients(coro):
+    """asyncio.run(coro) for a short-lived loop, closing its pooled clients before the loop ends.
+
+    Otherwise their connections are only dropped at garbage collection,
+    after the loop is closed ("Event loop is closed" warnings).
+    """
+    async def _run():
+        try:
+            return await coro
+        finally:
+            await aclose_loop_clients()
+
+    return asyncio.run(_run())
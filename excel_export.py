@@ -4,10 +4,14 @@ Handles generation of type-specific Excel files (MCQ, AR, MTC)
 and reading/updating Excel files for the review workflow.
 """
 
+import functools
 import io
 import re
 from openpyxl import Workbook, load_workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
+from openpyxl.styles.fonts import DEFAULT_FONT
+from openpyxl.utils import get_column_letter
 
 
 # ============================================================
@@ -40,71 +44,99 @@ def _to_subscript(s: str) -> str:
     return ''.join(_SUB.get(c, c) for c in s)
 
 
+# Commands replaced by a fixed string (matched as a prefix, like \to in \top)
+_COMMANDS = {
+    **_GREEK,
+    'cdot': '\u00b7',
+    'circ': '\u00b0',
+    'rightleftharpoons': '\u21cc',   # ⇌ equilibrium
+    'rightarrow': '\u2192',
+    'leftarrow': '\u2190',
+    'to': '\u2192',
+    'times': '\u00d7',
+    # Spacing commands → space: \; \, \: \! \quad \qquad
+    ';': ' ', ',': ' ', ':': ' ', '!': ' ',
+    'quad': ' ',
+    'qquad': '  ',
+}
+
+_MATH_DELIMITERS_RE = re.compile(r'\$([^$]+)\$')
+_TEXT_WRAPPER_RE = re.compile(r'\\(?:text|mathrm|textrm)\{([^}]*)\}')
+_COMMAND_PATTERN = (
+    r'\^\\circ'               # ^\circ → ° (degree, often after E)
+    r'|\\(?P<cmd>' + '|'.join(re.escape(c) for c in sorted(_COMMANDS, key=len, reverse=True)) + ')'
+    r'|;'                     # separator in configs like d¹⁰;ns² → d¹⁰ ns²
+)
+_COMMAND_RE = re.compile(_COMMAND_PATTERN)
+# Two scans in the order the scripts were always converted: commands and
+# superscripts first, then subscripts over that result. _{a^2} therefore gives
+# ₐ², while a script nested in braces is mapped as-is (_{a_2} → ₐ_₂).
+# Order matters where two alternatives can start at the same character.
+_SUPERSCRIPT_RE = re.compile(
+    _COMMAND_PATTERN + r'|\^\{(?P<sup>[^}]*)\}|\^(?P<sup1>[0-9+\-n])'
+)
+_SUBSCRIPT_RE = re.compile(
+    r'_\{(?P<sub>[^}]*)\}|_(?P<sub1>[0-9aehklmnopstx])'
+    r'|\\(?=[a-zA-Z])'        # leftover backslash of unknown commands
+)
+_LEFTOVER_BACKSLASH_RE = re.compile(r'\\(?=[a-zA-Z])')
+
+# Distinct strings converted and kept (a 100-question test has ~1,000)
+LATEX_CACHE_SIZE = 8192
+
+
+def _replace_token(m) -> str:
+    kind = m.lastgroup
+    if kind == 'cmd':
+        return _COMMANDS[m.group('cmd')]
+    if kind == 'sup':
+        # Commands inside the braces are converted before the script mapping
+        return _to_superscript(_COMMAND_RE.sub(_replace_token, m.group('sup')))
+    if kind == 'sup1':
+        return _to_superscript(m.group('sup1'))
+    if kind == 'sub':
+        inner = _to_subscript(m.group('sub'))
+        return _LEFTOVER_BACKSLASH_RE.sub('', inner) if '\\' in inner else inner
+    if kind == 'sub1':
+        return _to_subscript(m.group('sub1'))
+    token = m.group(0)
+    if token == ';':
+        return ' '
+    if token == '\\':
+        return ''
+    return '\u00b0'   # ^\circ
+
+
+@functools.lru_cache(maxsize=LATEX_CACHE_SIZE)
+def _convert_latex(text: str) -> str:
+    if '$' in text:
+        text = _MATH_DELIMITERS_RE.sub(r'\1', text)
+    if '\\' in text:
+        text = _TEXT_WRAPPER_RE.sub(r'\1', text)
+    text = _SUPERSCRIPT_RE.sub(_replace_token, text)
+    return _SUBSCRIPT_RE.sub(_replace_token, text)
+
+
 def latex_to_unicode(text: str) -> str:
     """Convert LaTeX math notation to clean Unicode text.
     Handles: $...$, ^{}, _{}, \\alpha, \\Delta H, \\cdot, \\text{}, etc.
+
+    After stripping $ delimiters and \\text{} wrappers, two tokenizer passes
+    (commands and superscripts, then subscripts) do the rest. Results are
+    memoized (LRU), so re-rendering the same test converts nothing.
     """
     if not text:
         return ""
-    text = str(text)
-
-    # Strip $ delimiters
-    text = re.sub(r'\$([^$]+)\$', r'\1', text)
-
-    # Remove \text{} and \mathrm{} wrappers
-    text = re.sub(r'\\(?:text|mathrm|textrm)\{([^}]*)\}', r'\1', text)
-
-    # Greek letters: \alpha → α
-    for name, char in _GREEK.items():
-        text = text.replace(f'\\{name}', char)
-
-    # \cdot → ·
-    text = text.replace('\\cdot', '\u00b7')
-
-    # ^\circ → ° (degree, often after E)
-    text = re.sub(r'\^\\circ', '\u00b0', text)
-    # standalone \circ → °
-    text = text.replace('\\circ', '\u00b0')
-
-    # Arrows
-    text = text.replace('\\rightleftharpoons', '\u21cc')  # ⇌ equilibrium
-    text = text.replace('\\rightarrow', '\u2192')          # →
-    text = text.replace('\\leftarrow', '\u2190')           # ←
-    text = text.replace('\\to', '\u2192')                  # →
-
-    # \times → ×
-    text = text.replace('\\times', '\u00d7')
-
-    # LaTeX spacing commands → space: \; \, \: \! \quad \qquad
-    text = re.sub(r'\\[;,:\!]', ' ', text)
-    text = text.replace('\\quad', ' ')
-    text = text.replace('\\qquad', '  ')
-
-    # Semicolons used as separator in configs like d¹⁰;ns² → d¹⁰ ns²
-    text = text.replace(';', ' ')
-
-    # ^{...} → superscript
-    text = re.sub(r'\^{([^}]*)}', lambda m: _to_superscript(m.group(1)), text)
-
-    # ^X (single char) → superscript
-    text = re.sub(r'\^([0-9+\-n])', lambda m: _to_superscript(m.group(1)), text)
-
-    # _{...} → subscript
-    text = re.sub(r'_{([^}]*)}', lambda m: _to_subscript(m.group(1)), text)
-
-    # _X (single char) → subscript (digits and common letters)
-    text = re.sub(r'_([0-9aehklmnopstx])', lambda m: _to_subscript(m.group(1)), text)
-
-    # Clean leftover backslashes from unknown commands
-    text = re.sub(r'\\([a-zA-Z]+)', r'\1', text)
-
-    return text
+    return _convert_latex(str(text))
 
 
 # ============================================================
 # UTILITIES
 # ============================================================
 
+_ILLEGAL_XML_RE = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
 def _clean(text: str) -> str:
     """Clean text for Excel: convert LaTeX to Unicode, normalize whitespace,
     and strip illegal XML characters that openpyxl cannot write."""
@@ -112,7 +144,7 @@ def _clean(text: str) -> str:
     text = text.replace('\\n\\n', '\n').replace('\\n', '\n')
     # Strip characters illegal in XML (openpyxl raises IllegalCharacterError)
     # Allowed: \t (0x09), \n (0x0A), \r (0x0D), and everything >= 0x20
-    text = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f]', '', text)
+    text = _ILLEGAL_XML_RE.sub('', text)
     return text.strip()
 
 
@@ -143,26 +175,79 @@ _THIN_BORDER = Border(
 )
 
 
-def _style_headers(ws, num_cols: int):
-    """Apply header styling to row 1."""
-    for col in range(1, num_cols + 1):
-        cell = ws.cell(row=1, column=col)
-        cell.font = _HEADER_FONT
-        cell.fill = _HEADER_FILL
-        cell.alignment = _HEADER_ALIGN
-        cell.border = _THIN_BORDER
+# Registered in a workbook by the first cell that uses it; every cell then refers
+# to the one shared style
+_HEADER_STYLE = NamedStyle(name="NEET Header", font=_HEADER_FONT, fill=_HEADER_FILL,
+                           alignment=_HEADER_ALIGN, border=_THIN_BORDER)
+_CELL_STYLE = NamedStyle(name="NEET Cell", font=DEFAULT_FONT, alignment=_CELL_ALIGN)
+
 
+def _text_width(value) -> int:
+    """Length of the longest line of a cell value."""
+    text = str(value)
+    if '\n' not in text:
+        return len(text)
+    return max(len(line) for line in text.split('\n'))
 
-def _auto_width(ws):
-    """Set reasonable column widths."""
-    for col in ws.columns:
-        letter = col[0].column_letter
-        max_len = 0
-        for cell in col:
-            if cell.value:
-                lines = str(cell.value).split('\n')
-                max_len = max(max_len, max(len(line) for line in lines))
-        ws.column_dimensions[letter].width = min(max(max_len + 2, 10), 60)
+
+class _SheetRows:
+    """Rows of one sheet for a write-only workbook.
+
+    Column widths are kept up to date as rows are added. A write-only sheet
+    needs its widths before the first row is written, so rows are held as
+    plain values (no Cell objects) until write().
+    """
+
+    def __init__(self, title: str, headers: list):
+        self.title = title
+        self.headers = headers
+        self.rows = []
+        self.widths = [len(h) for h in headers]
+
+    def add(self, values: list):
+        for i, value in enumerate(values):
+            if value:
+                width = _text_width(value)
+                if width > self.widths[i]:
+                    self.widths[i] = width
+        self.rows.append(values)
+
+    def write(self, wb):
+        """Stream the sheet into write-only workbook `wb`."""
+        widths = [min(max(width + 2, 10), 60) for width in self.widths]
+        sheet = _SheetWriter(wb, self.title, self.headers, widths)
+        for values in self.rows:
+            sheet.append(values)
+        return sheet.ws
+
+
+class _SheetWriter:
+    """A sheet of a write-only workbook: widths and styled header row up front,
+    then data rows appended one at a time with the named styles.
+
+    A write-only sheet serializes each row as it is appended, so one row of
+    styled cells is reused for every data row with only the values changed;
+    styling every cell through the NamedStyle lookup would cost more than the
+    rest of the export.
+    """
+
+    def __init__(self, wb, title: str, headers: list, widths: list):
+        self.ws = wb.create_sheet(title)
+        for col, width in enumerate(widths, 1):
+            self.ws.column_dimensions[get_column_letter(col)].width = width
+        self.ws.append([_styled_cell(self.ws, h, _HEADER_STYLE) for h in headers])
+        self._cells = [_styled_cell(self.ws, None, _CELL_STYLE) for _ in headers]
+
+    def append(self, values: list):
+        for cell, value in zip(self._cells, values):
+            cell.value = value
+        self.ws.append(self._cells)
+
+
+def _styled_cell(ws, value, style: NamedStyle) -> WriteOnlyCell:
+    cell = WriteOnlyCell(ws, value)
+    cell.style = style
+    return cell
 
 
 def _source_info(q: dict) -> tuple:
@@ -175,17 +260,18 @@ def _source_info(q: dict) -> tuple:
     return _clean(str(page)), _clean(str(concepts))
 
 
-def _add_meta_row(ws, row: int, col_start: int, metadata: dict):
-    """Add Time, token, and cost columns. Populated on EVERY row."""
+def _meta_values(metadata: dict) -> list:
+    """Time, token, and cost columns. Populated on EVERY row."""
     token_usage = metadata.get("token_usage", {})
     gen = token_usage.get("generation", {}) or {}
     cost = token_usage.get("cost", {}) or {}
-
-    ws.cell(row=row, column=col_start).value = _format_time(metadata.get("generation_time", ""))
-    ws.cell(row=row, column=col_start + 1).value = gen.get("input_tokens", "")
-    ws.cell(row=row, column=col_start + 2).value = gen.get("output_tokens", "")
-    ws.cell(row=row, column=col_start + 3).value = cost.get("input_cost", "")
-    ws.cell(row=row, column=col_start + 4).value = cost.get("output_cost", "")
+    return [
+        _format_time(metadata.get("generation_time", "")),
+        gen.get("input_tokens", ""),
+        gen.get("output_tokens", ""),
+        cost.get("input_cost", ""),
+        cost.get("output_cost", ""),
+    ]
 
 
 # ============================================================
@@ -279,153 +365,261 @@ MTC_HEADERS = [
 ]
 
 
-def _build_mcq_sheet(ws, questions: list, metadata: dict):
-    for col, h in enumerate(MCQ_HEADERS, 1):
-        ws.cell(row=1, column=col, value=h)
-    _style_headers(ws, len(MCQ_HEADERS))
-
-    for idx, q in enumerate(questions):
-        row = idx + 2
-        opts = q.get("options", {})
-        ws.cell(row=row, column=1).value = q.get("question_id", idx + 1)
-        ws.cell(row=row, column=2).value = _clean(q.get("question_text", ""))
-        ws.cell(row=row, column=3).value = _clean(opts.get("a", ""))
-        ws.cell(row=row, column=4).value = _clean(opts.get("b", ""))
-        ws.cell(row=row, column=5).value = _clean(opts.get("c", ""))
-        ws.cell(row=row, column=6).value = _clean(opts.get("d", ""))
-        ws.cell(row=row, column=7).value = (q.get("correct_answer") or "").upper()
-        concepts, page = _source_info(q)
-        ws.cell(row=row, column=8).value = concepts
-        ws.cell(row=row, column=9).value = page
-        # 10=Accuracy, 11=Comment left blank
-        _add_meta_row(ws, row, 12, metadata)
-
-        for c in range(1, len(MCQ_HEADERS) + 1):
-            ws.cell(row=row, column=c).alignment = _CELL_ALIGN
-
-    _auto_width(ws)
-
-
-def _build_ar_sheet(ws, questions: list, metadata: dict):
-    for col, h in enumerate(AR_HEADERS, 1):
-        ws.cell(row=1, column=col, value=h)
-    _style_headers(ws, len(AR_HEADERS))
-
-    # Standard AR options fallback
-    _AR_DEFAULT_OPTIONS = {
-        "a": "Both Assertion and Reason are true and Reason is the correct explanation of Assertion",
-        "b": "Both Assertion and Reason are true but Reason is NOT the correct explanation of Assertion",
-        "c": "Assertion is true but Reason is false",
-        "d": "Assertion is false but Reason is true",
-    }
+# Standard AR options fallback
+_AR_DEFAULT_OPTIONS = {
+    "a": "Both Assertion and Reason are true and Reason is the correct explanation of Assertion",
+    "b": "Both Assertion and Reason are true but Reason is NOT the correct explanation of Assertion",
+    "c": "Assertion is true but Reason is false",
+    "d": "Assertion is false but Reason is true",
+}
 
-    for idx, q in enumerate(questions):
-        row = idx + 2
-        assertion, reason = _parse_ar(q.get("question_text", ""))
-        opts = q.get("options") or _AR_DEFAULT_OPTIONS
-        ws.cell(row=row, column=1).value = q.get("question_id", idx + 1)
-        ws.cell(row=row, column=2).value = assertion
-        ws.cell(row=row, column=3).value = reason
-        ws.cell(row=row, column=4).value = _clean(opts.get("a", _AR_DEFAULT_OPTIONS["a"]))
-        ws.cell(row=row, column=5).value = _clean(opts.get("b", _AR_DEFAULT_OPTIONS["b"]))
-        ws.cell(row=row, column=6).value = _clean(opts.get("c", _AR_DEFAULT_OPTIONS["c"]))
-        ws.cell(row=row, column=7).value = _clean(opts.get("d", _AR_DEFAULT_OPTIONS["d"]))
-        ws.cell(row=row, column=8).value = (q.get("correct_answer") or "").upper()
-        concepts, page = _source_info(q)
-        ws.cell(row=row, column=9).value = concepts
-        ws.cell(row=row, column=10).value = page
-        # 11=Accuracy, 12=Comment left blank
-        _add_meta_row(ws, row, 13, metadata)
-
-        for c in range(1, len(AR_HEADERS) + 1):
-            ws.cell(row=row, column=c).alignment = _CELL_ALIGN
-
-    _auto_width(ws)
-
-
-def _build_mtc_sheet(ws, questions: list, metadata: dict):
-    for col, h in enumerate(MTC_HEADERS, 1):
-        ws.cell(row=1, column=col, value=h)
-    _style_headers(ws, len(MTC_HEADERS))
-
-    for idx, q in enumerate(questions):
-        row = idx + 2
-        list_i, list_ii = _parse_mtc(q.get("question_text", ""))
-        opts = q.get("options", {})
-        ws.cell(row=row, column=1).value = q.get("question_id", idx + 1)
-        ws.cell(row=row, column=2).value = list_i
-        ws.cell(row=row, column=3).value = list_ii
-        ws.cell(row=row, column=4).value = _clean(opts.get("a", ""))
-        ws.cell(row=row, column=5).value = _clean(opts.get("b", ""))
-        ws.cell(row=row, column=6).value = _clean(opts.get("c", ""))
-        ws.cell(row=row, column=7).value = _clean(opts.get("d", ""))
-        ws.cell(row=row, column=8).value = (q.get("correct_answer") or "").upper()
-        concepts, page = _source_info(q)
-        ws.cell(row=row, column=9).value = concepts
-        ws.cell(row=row, column=10).value = page
-        # 11=Accuracy, 12=Comment left blank
-        _add_meta_row(ws, row, 13, metadata)
-
-        for c in range(1, len(MTC_HEADERS) + 1):
-            ws.cell(row=row, column=c).alignment = _CELL_ALIGN
-
-    _auto_width(ws)
+
+def _mcq_row(q: dict, idx: int, meta: list) -> list:
+    opts = q.get("options", {})
+    concepts, page = _source_info(q)
+    return [
+        q.get("question_id", idx + 1),
+        _clean(q.get("question_text", "")),
+        _clean(opts.get("a", "")),
+        _clean(opts.get("b", "")),
+        _clean(opts.get("c", "")),
+        _clean(opts.get("d", "")),
+        (q.get("correct_answer") or "").upper(),
+        concepts,
+        page,
+        None, None,   # Accuracy, Comment left blank
+        *meta,
+    ]
+
+
+def _ar_row(q: dict, idx: int, meta: list) -> list:
+    assertion, reason = _parse_ar(q.get("question_text", ""))
+    opts = q.get("options") or _AR_DEFAULT_OPTIONS
+    concepts, page = _source_info(q)
+    return [
+        q.get("question_id", idx + 1),
+        assertion,
+        reason,
+        _clean(opts.get("a", _AR_DEFAULT_OPTIONS["a"])),
+        _clean(opts.get("b", _AR_DEFAULT_OPTIONS["b"])),
+        _clean(opts.get("c", _AR_DEFAULT_OPTIONS["c"])),
+        _clean(opts.get("d", _AR_DEFAULT_OPTIONS["d"])),
+        (q.get("correct_answer") or "").upper(),
+        concepts,
+        page,
+        None, None,   # Accuracy, Comment left blank
+        *meta,
+    ]
+
+
+def _mtc_row(q: dict, idx: int, meta: list) -> list:
+    list_i, list_ii = _parse_mtc(q.get("question_text", ""))
+    opts = q.get("options", {})
+    concepts, page = _source_info(q)
+    return [
+        q.get("question_id", idx + 1),
+        list_i,
+        list_ii,
+        _clean(opts.get("a", "")),
+        _clean(opts.get("b", "")),
+        _clean(opts.get("c", "")),
+        _clean(opts.get("d", "")),
+        (q.get("correct_answer") or "").upper(),
+        concepts,
+        page,
+        None, None,   # Accuracy, Comment left blank
+        *meta,
+    ]
+
+
+# Sheet kind -> (sheet title, headers, row builder)
+_SHEET_KINDS = {
+    "mcq": ("MCQ", MCQ_HEADERS, _mcq_row),
+    "ar": ("Assertion-Reason", AR_HEADERS, _ar_row),
+    "mtc": ("Match the Column", MTC_HEADERS, _mtc_row),
+}
+
+
+def _sheet_groups(questions: list, question_type: str) -> list:
+    """[(sheet kind, questions)] in sheet order for one result."""
+    if question_type == "combination":
+        mcq_qs = [q for q in questions if q.get("question_type", "").upper() == "MCQ"]
+        ar_qs = [q for q in questions if q.get("question_type", "").upper() in ("ASSERTION_REASON", "ASSERTION-REASON", "AR")]
+        mtc_qs = [q for q in questions if q.get("question_type", "").upper() in ("MATCH_THE_COLUMN", "MTC")]
+        groups = [(kind, qs) for kind, qs in (("mcq", mcq_qs), ("ar", ar_qs), ("mtc", mtc_qs)) if qs]
+        return groups or [("mcq", questions)]
+    if question_type == "assertion_reason":
+        return [("ar", questions)]
+    if question_type == "match_the_column":
+        return [("mtc", questions)]
+    return [("mcq", questions)]
 
 
 # ============================================================
 # PUBLIC API — GENERATE
 # ============================================================
 
+def make_excel_filename(metadata: dict, page_count: int = 0) -> str:
+    """Generate filename: {pages}page_{difficulty}_{type}_{count}questions.xlsx"""
+    pages = page_count or metadata.get("page_count", 0)
+    difficulty = metadata.get("difficulty", "medium")
+    qtype = metadata.get("question_type", "mcq")
+    total = metadata.get("total_questions", 0)
+
+    type_names = {
+        "mcq": "mcq",
+        "assertion_reason": "ar",
+        "match_the_column": "mtc",
+        "combination": "mixed",
+    }
+    type_str = type_names.get(qtype, qtype)
+    return f"{pages}page_{difficulty}_{type_str}_{total}questions.xlsx"
+
+
 def generate_excel_for_result(result: dict) -> bytes:
-    """Generate an Excel file from a generation result dict. Returns bytes."""
+    """Generate an Excel file from a generation result dict. Returns bytes.
+
+    Built as a write-only (streaming) workbook: rows go out as plain values
+    with shared named styles, so large exports stay fast and small in memory.
+    """
     metadata = result.get("test_metadata", {})
     questions = result.get("questions", [])
-    question_type = metadata.get("question_type", "mcq")
+    meta = _meta_values(metadata)
 
-    wb = Workbook()
-    ws = wb.active
-
-    if question_type == "combination":
-        mcq_qs = [q for q in questions if q.get("question_type", "").upper() == "MCQ"]
-        ar_qs = [q for q in questions if q.get("question_type", "").upper() in ("ASSERTION_REASON", "ASSERTION-REASON", "AR")]
-        mtc_qs = [q for q in questions if q.get("question_type", "").upper() in ("MATCH_THE_COLUMN", "MTC")]
-
-        sheets_created = False
-        if mcq_qs:
-            ws.title = "MCQ"
-            _build_mcq_sheet(ws, mcq_qs, metadata)
-            sheets_created = True
-        if ar_qs:
-            ar_ws = wb.create_sheet("Assertion-Reason") if sheets_created else ws
-            if not sheets_created:
-                ar_ws.title = "Assertion-Reason"
-                sheets_created = True
-            _build_ar_sheet(ar_ws, ar_qs, metadata)
-        if mtc_qs:
-            mtc_ws = wb.create_sheet("Match the Column") if sheets_created else ws
-            if not sheets_created:
-                mtc_ws.title = "Match the Column"
-                sheets_created = True
-            _build_mtc_sheet(mtc_ws, mtc_qs, metadata)
-
-        if not sheets_created:
-            ws.title = "MCQ"
-            _build_mcq_sheet(ws, questions, metadata)
-    elif question_type in ("assertion_reason",):
-        ws.title = "Assertion-Reason"
-        _build_ar_sheet(ws, questions, metadata)
-    elif question_type in ("match_the_column",):
-        ws.title = "Match the Column"
-        _build_mtc_sheet(ws, questions, metadata)
-    else:
-        ws.title = "MCQ"
-        _build_mcq_sheet(ws, questions, metadata)
+    wb = Workbook(write_only=True)
+    for kind, qs in _sheet_groups(questions, metadata.get("question_type", "mcq")):
+        title, headers, row_fn = _SHEET_KINDS[kind]
+        sheet = _SheetRows(title, headers)
+        for idx, q in enumerate(qs):
+            sheet.add(row_fn(q, idx, meta))
+        sheet.write(wb)
 
     buf = io.BytesIO()
     wb.save(buf)
     return buf.getvalue()
 
 
+# ============================================================
+# PUBLIC API — BATCH WORKBOOK
+# ============================================================
+
+SUMMARY_SHEET = "Batch Summary"
+
+SUMMARY_HEADERS = [
+    "Slot", "Question Type", "Difficulty", "Questions", "Time to Run",
+    "Input Tokens", "Cached Input Tokens", "Output Tokens",
+    "Input Cost (Rs)", "Output Cost (Rs)", "Total Cost (Rs)"
+]
+# Columns of SUMMARY_HEADERS added up in the closing Total row
+_SUMMARY_TOTALS = ("Questions", "Time to Run", "Input Tokens", "Cached Input Tokens", "Output Tokens",
+                   "Input Cost (Rs)", "Output Cost (Rs)", "Total Cost (Rs)")
+# Batch sheets are written as slots finish, before the longest value is known:
+# long text columns get a fixed width, the others fit their header
+_BATCH_COLUMN_WIDTHS = {
+    "Slot": 45, "Question": 60, "Assertion (A)": 60, "Reason (R)": 60, "List I": 45, "List II": 45,
+    "Option A": 30, "Option B": 30, "Option C": 30, "Option D": 30, "Key Concepts": 30,
+}
+
+
+def _batch_widths(headers: list) -> list:
+    return [_BATCH_COLUMN_WIDTHS.get(h, max(len(h) + 2, 10)) for h in headers]
+
+
+class BatchWorkbook:
+    """One workbook for a whole batch of slots.
+
+    add_slot() writes a finished slot's questions straight into the shared
+    MCQ / Assertion-Reason / Match the Column sheets of a write-only workbook
+    (with a leading Slot column) and its tokens, cost and time into the Batch
+    Summary sheet, so the work happens as slots finish and to_bytes() only
+    adds the Total row and saves. Column widths are fixed per header
+    (_BATCH_COLUMN_WIDTHS), since a write-only sheet needs them before its
+    first row. After to_bytes() no more slots can be added.
+    """
+
+    def __init__(self):
+        self._wb = Workbook(write_only=True)
+        # Created first so it stays the first sheet; question sheets follow in order of first use
+        self._summary = _SheetWriter(self._wb, SUMMARY_SHEET, SUMMARY_HEADERS, _batch_widths(SUMMARY_HEADERS))
+        self._sheets = {}    # sheet kind -> _SheetWriter
+        self._slots = {}     # slot id -> label in the workbook
+        self._totals = dict.fromkeys(_SUMMARY_TOTALS, 0)
+        self._bytes = None
+
+    def __contains__(self, slot_id) -> bool:
+        return slot_id in self._slots
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def add_slot(self, slot_id, label: str, result: dict):
+        """Add one finished slot (a generation result dict) under `label`."""
+        if self._bytes is not None:
+            raise RuntimeError("Batch workbook already saved")
+        if slot_id in self._slots:
+            return
+        # Several slots can share a label (same PDF and settings)
+        taken = set(self._slots.values())
+        unique, n = label, 1
+        while unique in taken:
+            n += 1
+            unique = f"{label} #{n}"
+        self._slots[slot_id] = unique
+
+        metadata = result.get("test_metadata", {})
+        questions = result.get("questions", [])
+        meta = _meta_values(metadata)
+        for kind, qs in _sheet_groups(questions, metadata.get("question_type", "mcq")):
+            title, headers, row_fn = _SHEET_KINDS[kind]
+            if kind not in self._sheets:
+                headers = ["Slot", *headers]
+                self._sheets[kind] = _SheetWriter(self._wb, title, headers, _batch_widths(headers))
+            for idx, q in enumerate(qs):
+                self._sheets[kind].append([unique, *row_fn(q, idx, meta)])
+        self._add_summary_row(unique, metadata, len(questions))
+
+    def _add_summary_row(self, label: str, metadata: dict, question_count: int):
+        token_usage = metadata.get("token_usage", {})
+        gen = token_usage.get("generation", {}) or {}
+        cost = token_usage.get("cost", {}) or {}
+        values = {
+            "Questions": question_count,
+            "Time to Run": metadata.get("generation_time") or 0,
+            "Input Tokens": gen.get("input_tokens", 0),
+            "Cached Input Tokens": gen.get("cached_input_tokens", 0),
+            "Output Tokens": gen.get("output_tokens", 0),
+            "Input Cost (Rs)": cost.get("input_cost", 0),
+            "Output Cost (Rs)": cost.get("output_cost", 0),
+            "Total Cost (Rs)": cost.get("total_cost", 0),
+        }
+        for key in _SUMMARY_TOTALS:
+            self._totals[key] += values[key] or 0
+        self._append_summary([
+            label, metadata.get("question_type", ""), metadata.get("difficulty", ""),
+            *(values[key] for key in SUMMARY_HEADERS[3:]),
+        ])
+
+    def _append_summary(self, values: list):
+        values[4] = _format_time(values[4])
+        self._summary.append(values)
+
+    def to_bytes(self) -> bytes:
+        """Add the Total row, save the workbook and return the .xlsx bytes.
+
+        The bytes are kept and the workbook dropped, so later calls are free.
+        """
+        if self._bytes is None:
+            totals = {key: round(value, 4) if isinstance(value, float) else value
+                      for key, value in self._totals.items()}
+            self._append_summary([f"Total ({len(self._slots)} slots)", "", "",
+                                  *(totals[key] for key in SUMMARY_HEADERS[3:])])
+            buf = io.BytesIO()
+            self._wb.save(buf)
+            self._bytes = buf.getvalue()
+            self._wb, self._summary, self._sheets = None, None, {}
+        return self._bytes
+
+
 # ============================================================
 # PUBLIC API — REVIEW
 # ============================================================
@@ -433,12 +627,15 @@ def generate_excel_for_result(result: dict) -> bytes:
 def read_excel_for_review(excel_bytes: bytes) -> tuple:
     """Read an exported Excel file for review.
     Returns (list_of_question_dicts, question_type_str).
-    Handles multi-sheet (combination) workbooks.
+    Handles multi-sheet (combination) workbooks and batch workbooks
+    (Slot column; the Batch Summary sheet is skipped).
     """
     wb = load_workbook(io.BytesIO(excel_bytes))
     all_questions = []
 
     for sheet_name in wb.sheetnames:
+        if sheet_name == SUMMARY_SHEET:
+            continue
         ws = wb[sheet_name]
         headers = [cell.value for cell in ws[1] if cell.value]
         if not headers:
@@ -500,6 +697,8 @@ def read_excel_for_review(excel_bytes: bytes) -> tuple:
                     }
                 q["correct_answer"] = _val("Correct Answer")
 
+            if "Slot" in header_map:   # batch workbook
+                q["slot"] = _val("Slot")
             q["key_concepts"] = _val("Key Concepts")
             q["page_section"] = _val("Page/Section")
             q["accuracy"] = _val("Accuracy")
@@ -527,6 +726,8 @@ def update_excel_with_comments(excel_bytes: bytes, comments: dict, accuracies: d
     # Build a mapping: question_index -> (sheet, excel_row)
     q_idx = 0
     for sheet_name in wb.sheetnames:
+        if sheet_name == SUMMARY_SHEET:
+            continue
         ws = wb[sheet_name]
         headers = [cell.value for cell in ws[1] if cell.value]
         if not headers:
@@ -0,0 +1,84 @@
+"""
+NEET Test Generator - Uploaded PDF Store
+Uploads each PDF (or chunk) once through the OpenAI Files API and reuses the
+file_id for every request on the same bytes, instead of base64-inlining the
+PDF into each request body. The content-hash -> file_id map lives in the
+on-disk result cache, so it is shared across sessions and processes.
+"""
+
+import asyncio
+import logging
+
+import result_cache
+
+logger = logging.getLogger(__name__)
+
+
+FILE_PURPOSE = "user_data"
+# OpenAI deletes uploads this long after creation...
+FILE_EXPIRY_SECONDS = 24 * 3600
+# ...so ids stop being reused this much earlier, leaving room for in-flight requests
+EXPIRY_MARGIN_SECONDS = 3600
+
+
+class FileStore:
+    """content hash -> file_id map with expiry, plus de-duplication of concurrent uploads."""
+
+    def __init__(self, expiry_seconds: int = FILE_EXPIRY_SECONDS):
+        self.expiry_seconds = expiry_seconds
+        self._map = result_cache.ResultCache("files", ttl_seconds=expiry_seconds - EXPIRY_MARGIN_SECONDS)
+        self._inflight = {}   # (event loop, key) -> upload task, so parallel slots share one upload
+
+    @staticmethod
+    def _key(client, pdf_sha256: str) -> str:
+        # file ids belong to the account behind the key, so the key is part of the address
+        return result_cache.make_key(
+            pdf_sha256=pdf_sha256,
+            account=result_cache.sha256_hex(client.api_key or "")[:16],
+            base_url=str(client.base_url),
+        )
+
+    async def get_file_id(self, client, pdf_bytes: bytes, filename: str = "textbook.pdf") -> str:
+        """Return a file_id for `pdf_bytes`, uploading only if no live upload exists."""
+        pdf_sha256 = result_cache.sha256_hex(pdf_bytes)
+        key = self._key(client, pdf_sha256)
+        entry = await asyncio.to_thread(self._map.get, key)
+        if entry:
+            return entry["file_id"]
+
+        inflight_key = (asyncio.get_running_loop(), key)
+        task = self._inflight.get(inflight_key)
+        if task is None:
+            task = asyncio.ensure_future(self._upload(client, key, pdf_bytes, filename))
+            self._inflight[inflight_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(inflight_key, None))
+        return await asyncio.shield(task)
+
+    async def _upload(self, client, key: str, pdf_bytes: bytes, filename: str) -> str:
+        size_mb = len(pdf_bytes) / (1024 * 1024)
+        uploaded = await client.files.create(
+            file=(filename, pdf_bytes, "application/pdf"),
+            purpose=FILE_PURPOSE,
+            expires_after={"anchor": "created_at", "seconds": self.expiry_seconds},
+        )
+        await asyncio.to_thread(self._map.put, key, {"file_id": uploaded.id})
+        logger.info(f"[FILES] Uploaded {filename} ({size_mb:.1f}MB) as {uploaded.id}")
+        return uploaded.id
+
+    async def forget(self, client, pdf_bytes: bytes):
+        """Delete the upload for `pdf_bytes` (remote file and local entry), if any."""
+        key = self._key(client, result_cache.sha256_hex(pdf_bytes))
+        entry = await asyncio.to_thread(self._map.get, key)
+        await asyncio.to_thread(self._map.delete, key)
+        if entry:
+            try:
+                await client.files.delete(entry["file_id"])
+            except Exception as e:
+                logger.warning(f"[FILES] Could not delete {entry['file_id']}: {type(e).__name__}: {e}")
+
+
+_FILE_STORE = FileStore()
+
+
+def get_file_store() -> FileStore:
+    return _FILE_STORE
@@ -0,0 +1,158 @@
+"""
+NEET Test Generator - Hedged Chunk Requests
+Straggler mitigation for parallel chunks: when a chunk runs past a deadline
+taken from recent chunk latencies, a duplicate request is fired and the
+first one to finish wins (the other is cancelled). Hedges are capped per
+generation so the extra spend stays bounded.
+"""
+
+import asyncio
+import collections
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# Latencies kept per model (seconds per requested question)
+LATENCY_WINDOW = 50
+# Chunks completed before any hedging: the deadline needs a real distribution
+MIN_LATENCY_SAMPLES = 5
+# A chunk is hedged once it runs longer than this percentile of recent chunks
+HEDGE_PERCENTILE = 0.9
+# Never hedge a chunk before it has run this long
+MIN_HEDGE_DEADLINE_SECONDS = 20.0
+# Extra requests allowed per generation, as a share of its chunks (at least 1)
+MAX_HEDGE_FRACTION = 0.25
+
+
+class LatencyTracker:
+    """Recent chunk latencies for one model, normalized per requested question.
+
+    Thread-safe: shared by every event loop in the process, like the rate limiter.
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, question_count: int):
+        with self._lock:
+            self._samples.append(seconds / max(question_count, 1))
+
+    def deadline(self, question_count: int):
+        """Seconds after which a chunk of `question_count` questions is a straggler, or None."""
+        with self._lock:
+            if len(self._samples) < MIN_LATENCY_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        per_question = ordered[min(len(ordered) - 1, math.ceil(HEDGE_PERCENTILE * len(ordered)) - 1)]
+        return max(MIN_HEDGE_DEADLINE_SECONDS, per_question * max(question_count, 1))
+
+
+class HedgeBudget:
+    """How many hedges one generation may still fire.
+
+    The cap is a request count: each hedge repeats one chunk, so the extra
+    spend is at most `limit` chunks' worth of tokens, less whatever the
+    cancelled loser's unused completion budget returns to the rate limiter.
+    """
+
+    def __init__(self, chunk_count: int, fraction: float = MAX_HEDGE_FRACTION):
+        self.limit = max(1, math.floor(chunk_count * fraction)) if chunk_count > 1 else 0
+        self.fired = 0
+        self.won = 0
+
+    def try_spend(self) -> bool:
+        if self.fired >= self.limit:
+            return False
+        self.fired += 1
+        return True
+
+    def as_dict(self) -> dict:
+        return {"fired": self.fired, "won": self.won, "limit": self.limit}
+
+
+_TRACKERS = {}
+_TRACKERS_LOCK = threading.Lock()
+
+
+def get_tracker(model: str) -> LatencyTracker:
+    """Return the process-wide latency tracker for `model`."""
+    with _TRACKERS_LOCK:
+        if model not in _TRACKERS:
+            _TRACKERS[model] = LatencyTracker()
+        return _TRACKERS[model]
+
+
+class _Attempt:
+    """One request of a hedged chunk, timed from when its API call was admitted."""
+
+    def __init__(self, attempt):
+        self.started = asyncio.Event()
+        self.started_at = None
+        self.task = asyncio.ensure_future(attempt(self._mark_started))
+
+    def _mark_started(self):
+        self.started_at = time.monotonic()
+        self.started.set()
+
+    async def wait_started(self):
+        waiter = asyncio.ensure_future(self.started.wait())
+        await asyncio.wait({waiter, self.task}, return_when=asyncio.FIRST_COMPLETED)
+        waiter.cancel()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at if self.started_at else 0.0
+
+
+async def run_hedged(attempt, model: str, question_count: int, budget: HedgeBudget, label: str = ""):
+    """Run attempt(on_started) and hedge it if it straggles. Returns (result, hedge_outcome).
+
+    `attempt(on_started)` returns a coroutine for one request and calls
+    on_started() once its API call is admitted, so time spent queued behind
+    the semaphore does not count towards the deadline. hedge_outcome is None
+    (not hedged), "primary" or "hedge". If one request fails while the other
+    is still running, the other one's result is used.
+    """
+    tracker = get_tracker(model)
+    primary = _Attempt(attempt)
+    attempts = {primary.task: primary}
+    hedge = None
+    pending = {primary.task}
+    try:
+        deadline = tracker.deadline(question_count)
+        if deadline is not None and budget.limit:
+            await primary.wait_started()
+            done, _ = await asyncio.wait(pending, timeout=deadline)
+            if not done and budget.try_spend():
+                logger.warning(f"[HEDGE {label}] No response after {deadline:.1f}s (p{HEDGE_PERCENTILE * 100:.0f} of recent chunks) "
+                               f"— firing a duplicate request ({budget.fired}/{budget.limit} this generation)")
+                hedge = _Attempt(attempt)
+                attempts[hedge.task] = hedge
+                pending.add(hedge.task)
+
+        while True:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            succeeded = [task for task in done if task.exception() is None]
+            if not succeeded:
+                if pending:
+                    logger.warning(f"[HEDGE {label}] One request failed ({type(done.pop().exception()).__name__}), waiting for the other")
+                    continue
+                raise done.pop().exception()
+            winner = attempts[succeeded[0]]
+            if winner.started_at:
+                tracker.record(winner.elapsed, question_count)
+            outcome = None
+            if hedge is not None:
+                outcome = "hedge" if winner is hedge else "primary"
+                budget.won += outcome == "hedge"
+                logger.info(f"[HEDGE {label}] {outcome} request won after {winner.elapsed:.1f}s — cancelling the other")
+            return winner.task.result(), outcome
+    finally:
+        # The loser (or both, if we were cancelled) stops here; its HTTP request is aborted
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,169 @@
+"""
+NEET Test Generator - Background Job Executor
+Runs generation slots concurrently on a long-lived event loop in a background
+thread, outside the Streamlit script run. The UI submits every queued slot
+at once and polls the jobs for progress.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+
+import client_registry
+from cancellation import CancellationToken, GenerationCancelled
+from test_generator import MAX_CONCURRENCY_CAP, agenerate_neet_test_from_pdf
+
+logger = logging.getLogger(__name__)
+
+
+class SlotJob:
+    """Progress and outcome of one slot.
+
+    Written only by the executor thread; the UI reads it on every poll.
+    `questions` fills up as questions stream in, `output` holds whatever
+    on_complete(result) returned (e.g. the Excel export). `cancel_token`
+    is handed to the generator, so cancelling it aborts the open requests.
+    """
+
+    def __init__(self, job_id: str, label: str, kwargs: dict, on_complete=None):
+        self.job_id = job_id
+        self.label = label
+        self.kwargs = kwargs
+        self.on_complete = on_complete
+        self.status = "queued"   # queued | running | done | error | cancelled
+        self.questions = []
+        self.result = None
+        self.output = None
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_token = CancellationToken()
+        self._future = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "error", "cancelled")
+
+    @property
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+
+class JobBatch:
+    """The slots submitted together by one click of Generate."""
+
+    def __init__(self, jobs: list):
+        self.jobs = {job.job_id: job for job in jobs}
+        self.submitted_at = time.time()
+
+    @property
+    def done(self) -> bool:
+        return all(job.finished for job in self.jobs.values())
+
+    @property
+    def finished_count(self) -> int:
+        return sum(1 for job in self.jobs.values() if job.finished)
+
+    @property
+    def elapsed(self) -> float:
+        finished = [job.finished_at for job in self.jobs.values() if job.finished_at]
+        end = max(finished) if self.done and finished else time.time()
+        return end - self.submitted_at
+
+
+class JobExecutor:
+    """A background event loop running SlotJobs under one concurrency budget.
+
+    All jobs share one semaphore of `max_concurrency` API calls (on top of the
+    process-wide rate limiter) and one pooled client per API key, so a
+    batch takes about as long as its slowest slot instead of the sum.
+    """
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY_CAP):
+        self.max_concurrency = max_concurrency
+        self._loop = asyncio.new_event_loop()
+        self._semaphore = None
+        self._thread = threading.Thread(target=self._run_loop, name="neet-job-executor", daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def submit(self, jobs: list, api_key: str = None) -> JobBatch:
+        """Start every job in `jobs` concurrently. Returns immediately."""
+        batch = JobBatch(jobs)
+        for job in jobs:
+            job._future = asyncio.run_coroutine_threadsafe(self._run_job(job, api_key), self._loop)
+        logger.info(f"[EXECUTOR] Submitted {len(jobs)} job(s) (max {self.max_concurrency} API calls in flight)")
+        return batch
+
+    def cancel(self, batch: JobBatch):
+        """Cancel every job of `batch` that has not finished yet.
+
+        Running jobs are stopped through their cancel_token, which aborts
+        their in-flight API requests right away.
+        """
+        for job in batch.jobs.values():
+            if job._future is None or job.finished:
+                continue
+            job.cancel_token.cancel("Stopped by user")
+            if job.status == "queued":
+                job._future.cancel()
+                # Never started, so _run_job will not get to record it
+                job.status = "cancelled"
+                job.finished_at = time.time()
+
+    async def _run_job(self, job: SlotJob, api_key: str):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            result = await agenerate_neet_test_from_pdf(
+                **job.kwargs,
+                api_key=api_key,
+                client=client_registry.get_async_client(api_key),
+                semaphore=self._semaphore,
+                stream=True,
+                on_question=job.questions.append,
+                cancel_token=job.cancel_token,
+            )
+            if not result or "parse_error" in result:
+                job.error = result.get("parse_error", "No result returned") if result else "No result returned"
+                job.status = "error"
+            else:
+                if job.on_complete:
+                    job.output = await asyncio.to_thread(job.on_complete, result)
+                job.result = result
+                job.status = "done"
+        except GenerationCancelled:
+            job.status = "cancelled"
+            logger.info(f"[EXECUTOR] Cancelled {job.label} after {job.elapsed:.1f}s")
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            logger.info(f"[EXECUTOR] Cancelled {job.label}")
+            raise
+        except Exception as e:
+            logger.exception(f"[EXECUTOR] {job.label} failed after {job.elapsed:.1f}s: {type(e).__name__}: {e}")
+            job.error = str(e)
+            job.status = "error"
+        finally:
+            job.finished_at = time.time()
+        logger.info(f"[EXECUTOR] {job.label} {job.status} in {job.elapsed:.1f}s")
+
+
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_executor() -> JobExecutor:
+    """Return the process-wide executor, starting its thread on first use."""
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = JobExecutor()
+        return _EXECUTOR
@@ -0,0 +1,300 @@
+"""
+NEET Test Generator - Persistent Job Queue
+SQLite-backed queue shared by the Streamlit app (enqueue + poll) and
+worker.py (claim + run). PDFs, results and Excel files live on disk next
+to the database, so jobs survive browser refreshes and app restarts.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from result_cache import sha256_hex
+
+logger = logging.getLogger(__name__)
+
+
+JOBS_DIR = os.getenv("NEET_JOBS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".jobs"))
+
+# A running job whose worker has not sent a heartbeat for this long is re-queued
+STALE_JOB_SECONDS = 120
+# Times a job is started before a crashing worker gives up on it
+MAX_ATTEMPTS = 3
+# Finished jobs (row, PDF, result and Excel files) are deleted after this long
+JOB_RETENTION_SECONDS = 7 * 24 * 3600   # 1 week
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    batch_id TEXT NOT NULL,
+    slot_id TEXT,
+    label TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    params TEXT NOT NULL,
+    pdf_path TEXT NOT NULL,
+    result_path TEXT,
+    excel_path TEXT,
+    excel_filename TEXT,
+    error TEXT,
+    questions_received INTEGER NOT NULL DEFAULT 0,
+    question_count INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id);
+"""
+
+FINISHED_STATUSES = ("done", "error", "cancelled")
+
+
+class JobQueue:
+    """Jobs table plus the files it points to.
+
+    Every method opens a short-lived connection, so one JobQueue can be used
+    from any thread and by several processes at once (SQLite WAL mode).
+    """
+
+    def __init__(self, jobs_dir: str = JOBS_DIR):
+        self.jobs_dir = jobs_dir
+        self.db_path = os.path.join(jobs_dir, "jobs.sqlite")
+        for sub in ("pdfs", "results"):
+            os.makedirs(os.path.join(jobs_dir, sub), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # Autocommit mode; claim() opens its own IMMEDIATE transaction
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _write_file(path: str, data: bytes):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    # ── App side ──
+
+    def enqueue(self, batch_id: str, pdf_bytes: bytes, params: dict, label: str = "", slot_id: str = None) -> str:
+        """Queue one generation job. `params` are keyword arguments for the generator."""
+        pdf_path = os.path.join(self.jobs_dir, "pdfs", f"{sha256_hex(pdf_bytes)}.pdf")
+        try:
+            os.utime(pdf_path)  # a reused PDF counts as new for purge_finished()
+        except FileNotFoundError:
+            self._write_file(pdf_path, pdf_bytes)
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, batch_id, slot_id, label, params, pdf_path, question_count, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, batch_id, slot_id, label, json.dumps(params), pdf_path,
+                 int(params.get("question_count", 0)), time.time()),
+            )
+        logger.info(f"[QUEUE] Enqueued {label or job_id} in batch {batch_id}")
+        return job_id
+
+    def get_batch(self, batch_id: str) -> list:
+        """All jobs of a batch, oldest first, as dicts."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM jobs WHERE batch_id = ? ORDER BY created_at", (batch_id,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def request_cancel(self, batch_id: str):
+        """Cancel a batch: queued jobs stop at once, running ones when the worker notices."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE batch_id = ? AND status = 'queued'",
+                (now, batch_id),
+            )
+            conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE batch_id = ? AND status = 'running'",
+                (batch_id,),
+            )
+
+    def load_result(self, job: dict):
+        if not job.get("result_path"):
+            return None
+        with open(job["result_path"], encoding="utf-8") as f:
+            return json.load(f)
+
+    def load_excel(self, job: dict):
+        if not job.get("excel_path"):
+            return None
+        with open(job["excel_path"], "rb") as f:
+            return f.read()
+
+    # ── Worker side ──
+
+    def claim(self, worker_id: str):
+        """Atomically take the oldest queued job. Returns the job dict or None."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker_id = ?, started_at = ?, heartbeat_at = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (worker_id, now, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        return job
+
+    def heartbeat(self, job_id: str, questions: list) -> bool:
+        """Record progress and the questions streamed in so far.
+
+        Returns True if the app asked for this job to be cancelled.
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT questions_received, cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return False
+            received = len(questions)
+            if received != row["questions_received"]:
+                self._write_file(self._partial_path(job_id), json.dumps(questions[:received], ensure_ascii=False).encode("utf-8"))
+            conn.execute(
+                "UPDATE jobs SET heartbeat_at = ?, questions_received = ? WHERE id = ?",
+                (time.time(), received, job_id),
+            )
+        return bool(row["cancel_requested"])
+
+    def _partial_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, "results", f"{job_id}.partial.json")
+
+    def load_partial(self, job: dict) -> list:
+        """Questions a running job has streamed in so far (for the live preview)."""
+        if not job.get("questions_received"):
+            return []
+        try:
+            with open(self._partial_path(job["id"]), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def complete(self, job_id: str, result: dict, excel_bytes: bytes, excel_filename: str):
+        result_path = os.path.join(self.jobs_dir, "results", f"{job_id}.json")
+        excel_path = os.path.join(self.jobs_dir, "results", f"{job_id}.xlsx")
+        self._write_file(result_path, json.dumps(result, ensure_ascii=False).encode("utf-8"))
+        self._write_file(excel_path, excel_bytes)
+        with contextlib.suppress(OSError):
+            os.remove(self._partial_path(job_id))
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', result_path = ?, excel_path = ?, excel_filename = ?, "
+                "questions_received = ?, finished_at = ? WHERE id = ?",
+                (result_path, excel_path, excel_filename, len(result.get("questions", [])), time.time(), job_id),
+            )
+
+    def finish(self, job_id: str, status: str, error: str = None):
+        """Mark a job 'error' or 'cancelled'."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, error, time.time(), job_id),
+            )
+
+    def release(self, job_id: str):
+        """Hand a running job back to the queue (worker shutting down)."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = CASE WHEN cancel_requested THEN 'cancelled' ELSE 'queued' END, "
+                "worker_id = NULL, attempts = attempts - 1, finished_at = CASE WHEN cancel_requested THEN ? END "
+                "WHERE id = ? AND status = 'running'",
+                (time.time(), job_id),
+            )
+
+    def requeue_stale(self, max_age: float = STALE_JOB_SECONDS) -> int:
+        """Put running jobs whose worker stopped heartbeating back in the queue.
+
+        Chunks that already finished are in the chunk cache, so a re-run only
+        pays for the missing ones. After MAX_ATTEMPTS the job is failed instead.
+        """
+        now = time.time()
+        cutoff = now - max_age
+        stale = "status = 'running' AND heartbeat_at < ?"
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE {stale} AND cancel_requested = 1",
+                (now, cutoff),
+            )
+            conn.execute(
+                f"UPDATE jobs SET status = 'error', error = 'Worker stopped while running this job', finished_at = ? "
+                f"WHERE {stale} AND attempts >= ?",
+                (now, cutoff, MAX_ATTEMPTS),
+            )
+            cur = conn.execute(
+                f"UPDATE jobs SET status = 'queued', worker_id = NULL WHERE {stale}",
+                (cutoff,),
+            )
+        if cur.rowcount:
+            logger.warning(f"[QUEUE] Re-queued {cur.rowcount} job(s) abandoned by a stopped worker")
+        return cur.rowcount
+
+    def purge_finished(self, max_age: float = JOB_RETENTION_SECONDS) -> int:
+        """Delete finished jobs older than max_age with their files.
+
+        A PDF is removed once no remaining job uses it and it has not been
+        enqueued again within max_age.
+        """
+        cutoff = time.time() - max_age
+        placeholders = ", ".join("?" * len(FINISHED_STATUSES))
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT id, result_path, excel_path FROM jobs WHERE status IN ({placeholders}) AND finished_at < ?",
+                (*FINISHED_STATUSES, cutoff),
+            ).fetchall()
+            for row in rows:
+                for path in (row["result_path"], row["excel_path"], self._partial_path(row["id"])):
+                    if path:
+                        with contextlib.suppress(OSError):
+                            os.remove(path)
+                conn.execute("DELETE FROM jobs WHERE id = ?", (row["id"],))
+            in_use = {r["pdf_path"] for r in conn.execute("SELECT DISTINCT pdf_path FROM jobs")}
+
+        pdf_dir = os.path.join(self.jobs_dir, "pdfs")
+        for name in os.listdir(pdf_dir):
+            path = os.path.join(pdf_dir, name)
+            with contextlib.suppress(OSError):
+                if path not in in_use and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+        if rows:
+            logger.info(f"[QUEUE] Purged {len(rows)} finished job(s) older than {max_age / 86400:.0f} day(s)")
+        return len(rows)
+
+
+_QUEUE = None
+_QUEUE_LOCK = threading.Lock()
+
+
+def get_queue() -> JobQueue:
+    """Return the process-wide JobQueue for JOBS_DIR."""
+    global _QUEUE
+    with _QUEUE_LOCK:
+        if _QUEUE is None:
+            _QUEUE = JobQueue()
+        return _QUEUE
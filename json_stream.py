@@ -0,0 +1,199 @@
+"""
+NEET Test Generator - Streaming JSON Helpers
+Incremental scanner that pulls complete question objects out of a model
+response while it is still streaming, a one-pass repair for truncated
+responses, and the LaTeX escape fix shared with the full-response parser.
+"""
+
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+
+def fix_latex_json(text: str) -> str:
+    """Fix LaTeX backslash commands that break JSON parsing.
+
+    LLMs often write $E^\\circ$ instead of $E^\\\\circ$ in JSON strings.
+    \\c is not a valid JSON escape, causing json.loads() to fail.
+    This finds single backslashes NOT followed by valid JSON escape
+    characters and doubles them so JSON parsing succeeds.
+    """
+    # Valid JSON escape chars after backslash: \ " / n r t b f u
+    # Anything else (like \c in \circ, \D in \Delta) is invalid
+    return re.sub(r'(?<!\\)\\(?![\\"/nrtbfu])', r'\\\\', text)
+
+
+# Structural tokens for the repair scan: an escape pair, a quote or a bracket
+_STRUCTURE_RE = re.compile(r'\\.|["{}\[\]]', re.DOTALL)
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def repair_truncated_json(text: str):
+    """Recover the complete questions from a truncated JSON response.
+
+    One scan over the structural characters tracks string state and the
+    bracket stack, recording where each element of the "questions" array
+    closed and which brackets were still open at that point. The prefix
+    ending at the last complete question is then completed with the
+    matching closers, so a half-written question is never returned. If
+    the array itself was closed, the prefix runs to the last closed value
+    instead. If a prefix still fails to parse (e.g. a malformed question),
+    earlier question boundaries are tried, skipping straight to the first
+    one before the reported error position: every longer prefix contains
+    the same error. Returns the parsed dict (with at least one question)
+    or None. checks/check_json_repair.py replays truncated responses
+    against the original rfind/suffix loop.
+    """
+    stack = []
+    in_string = False
+    string_start = 0
+    last_string = None
+    questions_depth = None
+    questions_closed = False
+    last_close = None
+    question_cuts = []
+
+    for match in _STRUCTURE_RE.finditer(text):
+        token = match.group()
+        pos = match.start()
+        if in_string:
+            if token == '"':
+                in_string = False
+                last_string = (string_start, pos)
+            continue
+        if token == '"':
+            in_string = True
+            string_start = pos + 1
+        elif token in "{[":
+            if token == "[" and len(stack) == 1 and last_string and text[last_string[0]:last_string[1]] == "questions":
+                questions_depth = 2
+            stack.append(token)
+        elif token in "}]":
+            if not stack:
+                continue
+            stack.pop()
+            last_close = (pos + 1, "".join(_CLOSERS[c] for c in reversed(stack)))
+            if token == "}" and questions_depth and len(stack) == questions_depth:
+                question_cuts.append(last_close)
+            elif token == "]" and questions_depth and len(stack) == questions_depth - 1:
+                questions_depth = None
+                questions_closed = True
+
+    candidates = [last_close] if questions_closed else []
+    candidates += question_cuts[::-1]
+
+    error_pos = len(text)
+    for end, closers in candidates:
+        if end > error_pos:
+            continue
+        try:
+            result = json.loads(text[:end] + closers)
+        except json.JSONDecodeError as e:
+            if e.pos < end:
+                error_pos = e.pos
+            continue
+        if isinstance(result, dict) and result.get("questions"):
+            logger.info(f"[JSON FIX] Repaired! Recovered {len(result['questions'])} question(s) with suffix: '{closers}'")
+            return result
+    return None
+
+
+class QuestionStreamParser:
+    """Emit each object of the top-level "questions" array as soon as it closes.
+
+    Feed response text in arbitrary pieces with feed(); every call returns
+    the question dicts completed by that piece. The scanner keeps string /
+    escape state and a bracket stack, so each character is looked at once
+    no matter how the text is split. Text before the root object (code
+    fences, stray prose) is skipped.
+    """
+
+    def __init__(self):
+        self.questions = []
+        self._text = []          # received pieces, joined lazily
+        self._length = 0         # total characters received
+        self._buffer = ""        # text of the question currently being built
+        self._stack = []         # open containers: '{' or '['
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None    # last complete string seen (candidate object key)
+        self._questions_depth = None  # stack depth inside the "questions" array
+        self._capturing = False
+
+    def feed(self, piece: str) -> list:
+        """Scan the next piece of response text. Returns newly completed questions."""
+        completed = []
+        self._text.append(piece)
+        base = self._length
+        self._length += len(piece)
+        capture_from = 0 if self._capturing else None
+
+        for i, ch in enumerate(piece):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_string = (self._string_start, base + i)
+                continue
+
+            if ch == '"':
+                if self._stack:
+                    self._in_string = True
+                    self._string_start = base + i + 1
+            elif ch in '{[':
+                if ch == '[' and len(self._stack) == 1 and self._key_is("questions"):
+                    self._questions_depth = 2
+                self._stack.append(ch)
+                if ch == '{' and self._questions_depth and len(self._stack) == self._questions_depth + 1:
+                    self._capturing = True
+                    capture_from = i
+            elif ch in '}]':
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                if self._capturing and len(self._stack) == self._questions_depth:
+                    self._buffer += piece[capture_from:i + 1]
+                    self._capturing = False
+                    capture_from = None
+                    question = self._parse_question(self._buffer)
+                    self._buffer = ""
+                    if question is not None:
+                        self.questions.append(question)
+                        completed.append(question)
+                elif ch == ']' and self._questions_depth and len(self._stack) == self._questions_depth - 1:
+                    self._questions_depth = None
+
+        if self._capturing and capture_from is not None:
+            self._buffer += piece[capture_from:]
+        return completed
+
+    @property
+    def text(self) -> str:
+        """Everything received so far."""
+        if len(self._text) > 1:
+            self._text = ["".join(self._text)]
+        return self._text[0] if self._text else ""
+
+    def _key_is(self, name: str) -> bool:
+        if self._last_string is None:
+            return False
+        start, end = self._last_string
+        return end - start == len(name) and self.text[start:end] == name
+
+    @staticmethod
+    def _parse_question(item_text: str):
+        try:
+            question = json.loads(item_text)
+        except json.JSONDecodeError:
+            try:
+                question = json.loads(fix_latex_json(item_text))
+            except json.JSONDecodeError:
+                logger.warning(f"[STREAM] Skipping unparseable question object ({len(item_text)} chars)")
+                return None
+        return question if isinstance(question, dict) else None
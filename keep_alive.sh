@@ -9,6 +9,13 @@ while true; do
         streamlit run app.py --server.port 8501 --server.address 0.0.0.0 --server.headless true --server.enableCORS false --server.enableXsrfProtection false > /tmp/streamlit.log 2>&1 &
     fi
 
+    # Check and restart the generation worker
+    if ! pgrep -f "python3 worker.py" > /dev/null; then
+        echo "[$(date)] Starting worker..."
+        cd /home/ubuntu/apps/test-generator-from-paragraph
+        python3 worker.py >> /tmp/worker.log 2>&1 &
+    fi
+
     # Check and restart ngrok
     if ! pgrep -f "ngrok http" > /dev/null; then
         echo "[$(date)] Starting ngrok..."
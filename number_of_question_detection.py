@@ -1,7 +1,8 @@
 from __future__ import annotations
-from openai import OpenAI
 import os
 
+import client_registry
+
 def generate_question_distribution(
     image_urls: list[str],
     system_prompt: str,
@@ -24,7 +25,7 @@ def generate_question_distribution(
     Returns:
         The API response object
     """
-    client = OpenAI(api_key=api_key) if api_key else OpenAI()
+    client = client_registry.get_client(api_key)
     
     response = client.responses.create(
         model=model,
@@ -0,0 +1,178 @@
+"""
+NEET Test Generator - PDF Helpers
+Parses an uploaded PDF once and serves page counts, page-range slices and
+per-page text from the cached reader, so chunking never re-parses the
+whole upload.
+"""
+
+import functools
+import hashlib
+import io
+import logging
+import re
+import threading
+
+from pypdf import PdfReader, PdfWriter
+
+logger = logging.getLogger(__name__)
+
+
+# Text-layer mode: a page goes to the model as extracted text unless it looks
+# like a figure or table page, which is kept as a PDF page.
+MIN_TEXT_CHARS = 300               # less text than this: scanned page or full-page figure
+FIGURE_PAGE_MAX_TEXT_CHARS = 1500  # a page with a figure and less text than this is mostly figure
+MIN_FIGURE_PIXELS = 150 * 150      # smaller images are icons / bullets, not figures
+TABLE_LINE_RATIO = 0.4             # share of number-heavy lines above which a page is a table
+
+
+class ParsedPdf:
+    """An uploaded PDF parsed once, shared by the app and the generator.
+
+    Caches the PdfReader, the page count and every page-range slice
+    already built.
+    """
+
+    def __init__(self, pdf_bytes: bytes):
+        self.pdf_bytes = pdf_bytes
+        self.reader = PdfReader(io.BytesIO(pdf_bytes))
+        self.page_count = len(self.reader.pages)
+        self._slices = {}
+        self._page_texts = {}
+        self._figure_counts = {}
+        self._content_lengths = {}
+        # PdfReader reads from one shared stream, so slicing must not interleave
+        self._lock = threading.Lock()
+
+    @functools.cached_property
+    def sha256(self) -> str:
+        """SHA-256 of the PDF bytes, used as its content address."""
+        return hashlib.sha256(self.pdf_bytes).hexdigest()
+
+    @property
+    def size_mb(self) -> float:
+        return len(self.pdf_bytes) / (1024 * 1024)
+
+    def _slice_pages(self, pages) -> bytes:
+        writer = PdfWriter()
+        for i in pages:
+            writer.add_page(self.reader.pages[i])
+        output = io.BytesIO()
+        writer.write(output)
+        return output.getvalue()
+
+    def slice(self, start_page: int, end_page: int) -> bytes:
+        """Return pages start_page to end_page (0-indexed, inclusive) as new PDF bytes.
+
+        Slices are memoized, and a range covering the whole document returns
+        the original bytes untouched.
+        """
+        end_page = min(end_page, self.page_count - 1)
+        if start_page <= 0 and end_page >= self.page_count - 1:
+            return self.pdf_bytes
+
+        key = (start_page, end_page)
+        with self._lock:
+            if key not in self._slices:
+                self._slices[key] = self._slice_pages(range(start_page, end_page + 1))
+                logger.info(f"[PDF] Sliced pages {start_page+1}-{end_page+1}: {len(self._slices[key]) / (1024 * 1024):.1f}MB")
+            return self._slices[key]
+
+    def subset(self, pages: list) -> bytes:
+        """Return the given pages (0-indexed, in order) as new PDF bytes, memoized."""
+        pages = tuple(pages)
+        if pages == tuple(range(pages[0], pages[-1] + 1)):
+            return self.slice(pages[0], pages[-1])
+        with self._lock:
+            if pages not in self._slices:
+                self._slices[pages] = self._slice_pages(pages)
+                logger.info(f"[PDF] Extracted pages {[i + 1 for i in pages]}: {len(self._slices[pages]) / (1024 * 1024):.1f}MB")
+            return self._slices[pages]
+
+    # ── Text layer ──
+
+    def page_text(self, index: int) -> str:
+        """Extracted text of one page (0-indexed), memoized. Empty if extraction fails."""
+        with self._lock:
+            if index not in self._page_texts:
+                try:
+                    text = self.reader.pages[index].extract_text() or ""
+                except Exception as e:
+                    logger.warning(f"[PDF] Text extraction failed on page {index + 1}: {type(e).__name__}: {e}")
+                    text = ""
+                self._page_texts[index] = text.strip()
+            return self._page_texts[index]
+
+    def figure_count(self, index: int) -> int:
+        """Number of figure-sized images drawn on one page (0-indexed), memoized."""
+        with self._lock:
+            if index not in self._figure_counts:
+                try:
+                    resources = self.reader.pages[index].get("/Resources")
+                    self._figure_counts[index] = _count_figures(resources.get_object() if resources else None)
+                except Exception as e:
+                    logger.warning(f"[PDF] Could not inspect images on page {index + 1}: {type(e).__name__}: {e}")
+                    self._figure_counts[index] = 0
+            return self._figure_counts[index]
+
+    def content_length(self, index: int) -> int:
+        """Decoded size in bytes of one page's content stream(s), memoized.
+
+        A cheap stand-in for how much a page draws: no text extraction, just
+        the raw drawing operators (text pages are long, blank pages tiny).
+        """
+        with self._lock:
+            if index not in self._content_lengths:
+                try:
+                    contents = self.reader.pages[index].get("/Contents")
+                    contents = contents.get_object() if contents is not None else None
+                    streams = contents if isinstance(contents, list) else [contents] if contents is not None else []
+                    self._content_lengths[index] = sum(len(stream.get_object().get_data()) for stream in streams)
+                except Exception as e:
+                    logger.warning(f"[PDF] Could not read content stream on page {index + 1}: {type(e).__name__}: {e}")
+                    self._content_lengths[index] = 0
+            return self._content_lengths[index]
+
+    def is_visual_page(self, index: int) -> bool:
+        """True if a page is mostly figures or tables and should be sent as a PDF page."""
+        text = self.page_text(index)
+        if len(text) < MIN_TEXT_CHARS:
+            return True
+        if len(text) < FIGURE_PAGE_MAX_TEXT_CHARS and self.figure_count(index):
+            return True
+        return _looks_like_table(text)
+
+    def split_pages(self, start_page: int, end_page: int):
+        """Split pages start_page to end_page (0-indexed, inclusive) into (text_pages, visual_pages)."""
+        text_pages, visual_pages = [], []
+        for i in range(start_page, min(end_page, self.page_count - 1) + 1):
+            (visual_pages if self.is_visual_page(i) else text_pages).append(i)
+        return text_pages, visual_pages
+
+
+def _count_figures(resources, depth: int = 0) -> int:
+    """Count figure-sized image XObjects in a resource dictionary (and its form XObjects)."""
+    if not resources or "/XObject" not in resources:
+        return 0
+    count = 0
+    for xobject in resources["/XObject"].get_object().values():
+        xobject = xobject.get_object()
+        subtype = xobject.get("/Subtype")
+        if subtype == "/Image":
+            if xobject.get("/Width", 0) * xobject.get("/Height", 0) >= MIN_FIGURE_PIXELS:
+                count += 1
+        elif subtype == "/Form" and depth < 2:
+            form_resources = xobject.get("/Resources")
+            count += _count_figures(form_resources.get_object() if form_resources else None, depth + 1)
+    return count
+
+
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+
+def _looks_like_table(text: str) -> bool:
+    """Heuristic: a page is a table if many of its lines are short and number-heavy."""
+    lines = [line for line in text.splitlines() if line.strip()]
+    if len(lines) < 8:
+        return False
+    numeric = sum(1 for line in lines if len(line) < 80 and len(_NUMBER_RE.findall(line)) >= 2)
+    return numeric / len(lines) > TABLE_LINE_RATIO
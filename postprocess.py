@@ -0,0 +1,431 @@
+"""
+NEET Test Generator - Question Post-Processing
+The fixes applied to every generated question (LaTeX wrapping, numbered
+statement and MTC table layout, MTC option repairs) as one pipeline of
+stages. Stages are picked once per question type, all patterns are
+compiled at import, and every stage keeps call/time counters.
+
+Per-question stages run as each question arrives from a stream or chunk
+(process); batch stages such as answer position balancing need the whole
+test and run once at the end (finish).
+"""
+
+import itertools
+import logging
+import random
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+MTC_TYPES = frozenset({"MATCH_THE_COLUMN"})
+# AR options are fixed (a=both true R explains, b=both true R doesn't explain, etc.)
+AR_TYPES = frozenset({"ASSERTION_REASON", "ASSERTION-REASON", "AR"})
+ROMAN_NUMERALS = ("I", "II", "III", "IV")
+OPTION_KEYS = ("a", "b", "c", "d")
+
+
+# ============================================================
+# PATTERNS
+# ============================================================
+
+# Sequences like Fe^{2+}, H_2O, M^{2+}/M, SO_4^{2-} that aren't wrapped in $...$
+_UNWRAPPED_LATEX_RE = re.compile(
+    r'(?<!\$)([A-Za-z][A-Za-z0-9]*(?:[_^]\{[^}]+\}|[_^][0-9])[A-Za-z0-9_^{}+\-]*(?:/[A-Za-z][A-Za-z0-9_^{}+\-]*)*)(?!\}|\$)'
+)
+
+# "(1) ... (2) ... (3) ..." — common in Hard MCQs
+_PAREN_STATEMENT_RE = re.compile(r'(?<!\n)\s+(\(\d+\)\s)')
+# "1. ... 2. ..." — only after a sentence end (. : ?), not mid-sentence numbers like 'E° = 1.51'
+_DOT_STATEMENT_RE = re.compile(r'(?<=[.:?])\s+(\d+\.\s)')
+
+# MTC rows "A. [text] | I. [text]", the header before "A.", and the closing instruction
+_MTC_PAIR_RE = re.compile(r'([A-D])\.\s*(.*?)\s*\|\s*(IV|III|II|I)\.\s*(.*?)(?=\s+[A-D]\.\s|Choose|$)')
+_MTC_HEADER_RE = re.compile(r'^(.*?)(?=\s*A\.)')
+_MTC_LIST_HEADER_RE = re.compile(r'\s*List\s+I\s*\|\s*List\s+II\s*')
+_MTC_FOOTER_RE = re.compile(r'(Choose the correct.*?)$', re.IGNORECASE)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_SEQUENTIAL_MTC_RE = re.compile(
+    r'A\s*[-–—]\s*I\s*,\s*B\s*[-–—]\s*II\s*,\s*C\s*[-–—]\s*III\s*,\s*D\s*[-–—]\s*IV',
+    re.IGNORECASE
+)
+# Per numeral: "A-I" style references in options, and "I." List II labels in the table
+_NUMERAL_AFTER_DASH_RE = {n: re.compile(rf'([-–—]\s*){re.escape(n)}(?!\w)') for n in ROMAN_NUMERALS}
+_NUMERAL_LABEL_RE = {n: re.compile(rf'(?<!\w){re.escape(n)}\.') for n in ROMAN_NUMERALS}
+
+
+def _normalize_option(opt_str: str) -> str:
+    """Normalize option string for comparison (strip spaces, uppercase)."""
+    return _WHITESPACE_RE.sub('', opt_str.strip().upper())
+
+
+# All 24 'A-IV, B-I, C-III, D-II' option strings, with their normalized form
+_MTC_PERMUTATION_OPTIONS = tuple(
+    (opt, _normalize_option(opt))
+    for opt in (', '.join(f'{letter}-{numeral}' for letter, numeral in zip("ABCD", perm))
+                for perm in itertools.permutations(ROMAN_NUMERALS))
+)
+
+
+# ============================================================
+# TEXT FIXES
+# ============================================================
+
+def fix_unwrapped_latex(text: str) -> str:
+    """Wrap common unwrapped LaTeX patterns in $...$ delimiters.
+
+    The model sometimes outputs M^{2+} or H_2O without $...$.
+    This catches those patterns and wraps them so they render properly.
+    """
+    if not text:
+        return text
+
+    # Skip if no LaTeX-like characters present
+    if '^' not in text and '_' not in text and '\\' not in text:
+        return text
+
+    # A match is inside a $...$ block already if an odd number of $ precede it.
+    # Matches arrive in order, so the $ count is carried forward from the
+    # previous match instead of recounted from the start: one pass in total.
+    scanned = [0, 0]   # position counted up to, $ signs before it
+
+    def wrap_match(m):
+        start = m.start()
+        scanned[1] += text.count('$', scanned[0], start)
+        scanned[0] = start
+        if scanned[1] % 2 == 1:
+            return m.group(0)
+        return f'${m.group(0)}$'
+
+    text = _UNWRAPPED_LATEX_RE.sub(wrap_match, text)
+
+    # Fix double $$ from adjacent wrapping
+    return text.replace('$$', '$ $')
+
+
+def format_numbered_statements(text: str) -> str:
+    """Insert line breaks before numbered statements when they're on one line.
+
+    Handles both '1. ...' and '(1) ...' formats used in NEET questions.
+    """
+    text = _PAREN_STATEMENT_RE.sub(r'\n\1', text)
+    return _DOT_STATEMENT_RE.sub(r'\n\1', text)
+
+
+def format_mtc_question(text: str) -> str:
+    """Parse MTC question text and reconstruct as a clean pipe table."""
+    # Normalize: replace literal \n with actual newlines, then flatten to one line
+    text = text.replace('\\n\\n', ' ').replace('\\n', ' ')
+    flat = ' '.join(text.split())
+
+    pairs = _MTC_PAIR_RE.findall(flat)
+    if not pairs:
+        return text  # Can't parse — return as-is
+
+    header_match = _MTC_HEADER_RE.match(flat)
+    header = header_match.group(1).strip() if header_match else "Match List I with List II"
+    # "List I | List II" goes back in as the table header
+    header = _MTC_LIST_HEADER_RE.sub('', header).strip()
+    if not header:
+        header = "Match List I with List II"
+
+    footer_match = _MTC_FOOTER_RE.search(flat)
+    footer = footer_match.group(1).strip() if footer_match else "Choose the correct answer from the options given below:"
+
+    lines = [header, "", "List I | List II"]
+    for letter, list1, roman, list2 in pairs:
+        lines.append(f"{letter}. {list1.strip()} | {roman}. {list2.strip()}")
+    lines.append("")
+    lines.append(footer)
+    return '\n'.join(lines)
+
+
+def _apply_numeral_swap(text: str, swap_map: dict) -> str:
+    """Swap roman numerals in a string using a mapping like {'I': 'III', 'III': 'I'}."""
+    # Replace each roman numeral with a placeholder first to avoid double-swaps
+    placeholders = {}
+    result = text
+    for old, new in swap_map.items():
+        placeholder = f"__ROMAN_{old}__"
+        placeholders[placeholder] = new
+        result = _NUMERAL_AFTER_DASH_RE[old].sub(rf'\1{placeholder}', result)
+    for old in swap_map:
+        result = _NUMERAL_LABEL_RE[old].sub(f'__ROMAN_{old}__.', result)
+    for placeholder, new in placeholders.items():
+        result = result.replace(placeholder, new)
+    return result
+
+
+# ============================================================
+# STAGES
+# ============================================================
+
+def latex_stage(q: dict):
+    """Wrap unwrapped LaTeX (e.g. M^{2+} → $M^{2+}$) in the question text and options."""
+    if isinstance(q.get('question_text'), str):
+        q['question_text'] = fix_unwrapped_latex(q['question_text'])
+    options = q.get('options')
+    if isinstance(options, dict):
+        for key, value in options.items():
+            if isinstance(value, str):
+                options[key] = fix_unwrapped_latex(value)
+
+
+def numbered_statements_stage(q: dict):
+    if isinstance(q.get('question_text'), str):
+        q['question_text'] = format_numbered_statements(q['question_text'])
+
+
+def mtc_table_stage(q: dict):
+    if isinstance(q.get('question_text'), str):
+        q['question_text'] = format_mtc_question(q['question_text'])
+
+
+def mtc_duplicate_options_stage(q: dict):
+    """Make all 4 MTC options unique, replacing duplicates with unused permutations."""
+    options = q.get('options', {})
+    if not options or len(options) < 4:
+        return
+
+    normalized = [_normalize_option(options.get(k, '')) for k in OPTION_KEYS]
+    seen = set()
+    duplicates = []
+    for i, norm in enumerate(normalized):
+        if norm in seen:
+            duplicates.append(i)
+        else:
+            seen.add(norm)
+    if not duplicates:
+        return
+
+    logger.warning(f"[MTC-FIX] Q{q.get('question_id', '?')}: Found {len(duplicates)} duplicate option(s), generating replacements")
+    used_norms = {norm for i, norm in enumerate(normalized) if i not in duplicates}
+    available = [p for p in _MTC_PERMUTATION_OPTIONS if p[1] not in used_norms]
+    random.shuffle(available)
+
+    for dup_idx in duplicates:
+        if available:
+            new_opt, new_norm = available.pop()
+            used_norms.add(new_norm)
+            available = [p for p in available if p[1] not in used_norms]
+            options[OPTION_KEYS[dup_idx]] = new_opt
+            logger.info(f"[MTC-FIX] Q{q.get('question_id', '?')}: Replaced option ({dup_idx+1}) with {new_opt}")
+
+
+def mtc_sequential_mapping_stage(q: dict):
+    """Shuffle List II numerals when the correct MTC option is A-I, B-II, C-III, D-IV.
+
+    The swap is applied to the question text table, all options and the explanation.
+    """
+    options = q.get('options', {})
+    correct_key = q.get('correct_answer', '').lower().strip()
+    if correct_key not in options:
+        return
+
+    correct_option_text = options[correct_key]
+    if not _SEQUENTIAL_MTC_RE.search(correct_option_text):
+        return
+
+    logger.warning(f"[MTC-SHUFFLE] Q{q.get('question_id', '?')}: Sequential correct answer detected ({correct_option_text}), shuffling List II")
+
+    # A random non-sequential permutation of the roman numerals
+    while True:
+        shuffled = list(ROMAN_NUMERALS)
+        random.shuffle(shuffled)
+        if shuffled != list(ROMAN_NUMERALS):
+            break
+    swap_map = {old: new for old, new in zip(ROMAN_NUMERALS, shuffled) if old != new}
+
+    for key in OPTION_KEYS:
+        if key in options:
+            options[key] = _apply_numeral_swap(options[key], swap_map)
+    if 'question_text' in q:
+        q['question_text'] = _apply_numeral_swap(q['question_text'], swap_map)
+    explanation = q.get('explanation', {})
+    if isinstance(explanation, dict):
+        for key in explanation:
+            if isinstance(explanation[key], str):
+                explanation[key] = _apply_numeral_swap(explanation[key], swap_map)
+    elif isinstance(explanation, str):
+        q['explanation'] = _apply_numeral_swap(explanation, swap_map)
+
+    logger.info(f"[MTC-SHUFFLE] Q{q.get('question_id', '?')}: Shuffled List II: {dict(zip(ROMAN_NUMERALS, shuffled))}. New correct: {options[correct_key]}")
+
+
+def randomize_answer_positions(questions: list) -> list:
+    """Distribute correct answers roughly equally across A, B, C, D (batch stage).
+
+    MCQ and MTC options can be freely swapped; AR questions have a fixed
+    option structure and are left alone.
+    """
+    shufflable_indices = [i for i, q in enumerate(questions) if question_type_of(q) not in AR_TYPES]
+    if len(shufflable_indices) < 2:
+        return questions
+
+    # Near-equal target counts; a random letter order decides which get the extra question
+    n = len(shufflable_indices)
+    base, remainder = divmod(n, 4)
+    letters = ["a", "b", "c", "d"]
+    random.shuffle(letters)
+    target_counts = {l: base + (1 if i < remainder else 0) for i, l in enumerate(letters)}
+
+    # Shuffle the indices so the reassignment is random, not always Q1→A, Q2→B...
+    indices_shuffled = list(shufflable_indices)
+    random.shuffle(indices_shuffled)
+    assignments = []
+    pos = 0
+    for letter in OPTION_KEYS:
+        for _ in range(target_counts[letter]):
+            assignments.append((indices_shuffled[pos], letter))
+            pos += 1
+
+    swaps_done = 0
+    for q_idx, target_letter in assignments:
+        q = questions[q_idx]
+        current_answer = q.get("correct_answer", "").lower().strip()
+        if current_answer == target_letter:
+            continue
+
+        options = q.get("options", {})
+        explanation = q.get("explanation", {})
+        if current_answer in options and target_letter in options:
+            options[current_answer], options[target_letter] = options[target_letter], options[current_answer]
+            if isinstance(explanation, dict) and current_answer in explanation and target_letter in explanation:
+                explanation[current_answer], explanation[target_letter] = explanation[target_letter], explanation[current_answer]
+            q["correct_answer"] = target_letter
+            swaps_done += 1
+
+    final_dist = {"a": 0, "b": 0, "c": 0, "d": 0}
+    for i in shufflable_indices:
+        ans = questions[i].get("correct_answer", "").lower().strip()
+        if ans in final_dist:
+            final_dist[ans] += 1
+    logger.info(f"[RANDOMIZE] {swaps_done} swaps applied. Final distribution: {final_dist}")
+    return questions
+
+
+# ============================================================
+# PIPELINE
+# ============================================================
+
+def question_type_of(q: dict) -> str:
+    """The question's type, normalized for dispatch ('MCQ', 'MATCH_THE_COLUMN', ...)."""
+    return (q.get("question_type") or "").upper()
+
+
+class StageTimings:
+    """Calls and total seconds per stage. Thread-safe."""
+
+    def __init__(self):
+        self._stats = {}   # stage name -> [calls, seconds]
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float, calls: int = 1):
+        with self._lock:
+            stats = self._stats.setdefault(name, [0, 0.0])
+            stats[0] += calls
+            stats[1] += seconds
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                name: {"calls": calls, "seconds": round(seconds, 4),
+                       "avg_ms": round(seconds * 1000 / calls, 3) if calls else 0.0}
+                for name, (calls, seconds) in self._stats.items()
+            }
+
+
+class _Stage:
+    __slots__ = ("name", "fn", "question_types", "exclude_types", "batch")
+
+    def __init__(self, name, fn, question_types, exclude_types, batch):
+        self.name = name
+        self.fn = fn
+        self.question_types = frozenset(question_types) if question_types is not None else None
+        self.exclude_types = frozenset(exclude_types)
+        self.batch = batch
+
+    def applies_to(self, qtype: str) -> bool:
+        if qtype in self.exclude_types:
+            return False
+        return self.question_types is None or qtype in self.question_types
+
+
+class PostProcessPipeline:
+    """Ordered post-processing stages, dispatched once per question by its type.
+
+    Per-question stages are fn(q) and edit the question in place; batch
+    stages are fn(questions) -> questions. Timings accumulate on the
+    pipeline (process-wide) and on an optional per-generation StageTimings.
+    """
+
+    def __init__(self):
+        self._stages = []
+        self._dispatch = {}   # question type -> per-question stages that apply to it
+        self.timings = StageTimings()
+
+    def add_stage(self, name: str, fn, question_types=None, exclude_types=(), batch: bool = False):
+        """Append a stage. question_types / exclude_types restrict per-question stages by type."""
+        self._stages.append(_Stage(name, fn, question_types, exclude_types, batch))
+        self._dispatch = {}
+
+    @property
+    def stage_names(self) -> list:
+        return [stage.name for stage in self._stages]
+
+    def _stages_for(self, qtype: str) -> list:
+        stages = self._dispatch.get(qtype)
+        if stages is None:
+            stages = [s for s in self._stages if not s.batch and s.applies_to(qtype)]
+            self._dispatch[qtype] = stages
+        return stages
+
+    def _timed(self, stage, arg, timings):
+        start = time.perf_counter()
+        result = stage.fn(arg)
+        elapsed = time.perf_counter() - start
+        self.timings.add(stage.name, elapsed)
+        if timings is not None:
+            timings.add(stage.name, elapsed)
+        return result
+
+    def process(self, q: dict, timings: StageTimings = None) -> dict:
+        """Run the per-question stages on one question (in place), e.g. as it streams in."""
+        for stage in self._stages_for(question_type_of(q)):
+            self._timed(stage, q, timings)
+        return q
+
+    def finish(self, questions: list, timings: StageTimings = None) -> list:
+        """Run the batch stages once the whole test is in."""
+        for stage in self._stages:
+            if stage.batch:
+                questions = self._timed(stage, questions, timings)
+        return questions
+
+    def process_batch(self, questions: list, timings: StageTimings = None) -> list:
+        """Per-question stages on every question, then the batch stages."""
+        for q in questions:
+            self.process(q, timings)
+        return self.finish(questions, timings)
+
+
+def _default_pipeline() -> PostProcessPipeline:
+    pipeline = PostProcessPipeline()
+    pipeline.add_stage("latex", latex_stage)
+    pipeline.add_stage("numbered_statements", numbered_statements_stage, exclude_types=MTC_TYPES)
+    pipeline.add_stage("mtc_table", mtc_table_stage, question_types=MTC_TYPES)
+    pipeline.add_stage("mtc_duplicate_options", mtc_duplicate_options_stage, question_types=MTC_TYPES)
+    pipeline.add_stage("mtc_sequential_mapping", mtc_sequential_mapping_stage, question_types=MTC_TYPES)
+    pipeline.add_stage("answer_positions", randomize_answer_positions, batch=True)
+    return pipeline
+
+
+_PIPELINE = _default_pipeline()
+
+
+def get_pipeline() -> PostProcessPipeline:
+    """Return the process-wide post-processing pipeline."""
+    return _PIPELINE
@@ -0,0 +1,113 @@
+"""
+NEET Test Generator - Prompt Builder
+Pre-parses each subject's BASE_TEMPLATE once and memoizes the rendered
+prompts, shared by prompts_biology, prompts_chemistry and prompts_config.
+"""
+
+import functools
+import string
+
+
+# Fields that change between calls for the same question type + difficulty
+# (chunks of one slot ask for different counts). get_prompt_parts() replaces
+# them with these references in the static prefix and states them once in the
+# variable suffix.
+VARIABLE_FIELD_REFERENCES = {
+    "subject": "[Subject from GENERATION PARAMETERS at the end]",
+    "question_count": "[Question Count from GENERATION PARAMETERS at the end]",
+}
+# An unquoted JSON value in the output-schema example ("requested_questions":
+# {question_count}) gets this instead, so the example stays valid JSON
+VARIABLE_FIELD_JSON_VALUES = {
+    "question_count": 0,
+}
+
+VARIABLE_SUFFIX_TEMPLATE = """GENERATION PARAMETERS
+- Subject: {subject}
+- Question Count: {question_count}
+
+Generate {question_count} questions now."""
+
+PROMPT_CACHE_SIZE = 256
+
+
+class CompiledTemplate:
+    """A str.format template split into literal text and fields once.
+
+    render() produces exactly what template.format(**values) would, without
+    re-parsing the (very large) template on every call.
+    """
+
+    def __init__(self, template: str):
+        self.parts = []
+        for literal, field, spec, conversion in string.Formatter().parse(template):
+            self.parts.append((literal, field, spec, conversion))
+
+    def render(self, values: dict, json_values: dict = None) -> str:
+        """Fill in the fields. A field in `json_values` that directly follows a
+        JSON key ('"key": {field}') takes its value from there instead."""
+        out = []
+        for literal, field, spec, conversion in self.parts:
+            out.append(literal)
+            if field is None:
+                continue
+            if json_values and field in json_values and literal.rstrip().endswith('":'):
+                value = json_values[field]
+            else:
+                value = values[field]
+            if conversion == "r":
+                value = repr(value)
+            elif conversion == "s":
+                value = str(value)
+            elif conversion == "a":
+                value = ascii(value)
+            out.append(format(value, spec or ""))
+        return "".join(out)
+
+
+class PromptBuilder:
+    """Memoized prompt construction for one subject's template + PROMPTS_CONFIG."""
+
+    def __init__(self, base_template: str, prompts_config: dict, cache_size: int = PROMPT_CACHE_SIZE):
+        self.template = CompiledTemplate(base_template)
+        self.prompts_config = prompts_config
+        self.get_prompt = functools.lru_cache(maxsize=cache_size)(self._build_prompt)
+        self.get_prompt_parts = functools.lru_cache(maxsize=cache_size)(self._build_prompt_parts)
+        self._static_prefix = functools.lru_cache(maxsize=cache_size)(self._build_static_prefix)
+
+    def _config(self, question_type: str, difficulty: str) -> dict:
+        key = (question_type.lower(), difficulty.lower())
+        if key not in self.prompts_config:
+            raise ValueError(f"Invalid combination: {question_type} + {difficulty}")
+        return self.prompts_config[key]
+
+    def _values(self, question_type: str, difficulty: str, subject, question_count) -> dict:
+        config = self._config(question_type, difficulty)
+        return {
+            "subject": subject,
+            "question_count": question_count,
+            "difficulty": difficulty,
+            "question_type": question_type,
+            "question_type_rules": config["rules"],
+            "output_schema": config["output_schema"],
+        }
+
+    def _build_prompt(self, question_type: str, difficulty: str, subject: str, question_count: int) -> str:
+        return self.template.render(self._values(question_type, difficulty, subject, question_count))
+
+    def _build_static_prefix(self, question_type: str, difficulty: str) -> str:
+        values = self._values(question_type, difficulty, None, None)
+        values.update(VARIABLE_FIELD_REFERENCES)
+        return self.template.render(values, VARIABLE_FIELD_JSON_VALUES)
+
+    def _build_prompt_parts(self, question_type: str, difficulty: str, subject: str, question_count: int) -> tuple:
+        """Return (static_prefix, variable_suffix).
+
+        The prefix depends only on question type + difficulty and is the same
+        string object for every call, so it is byte-identical across chunks and
+        slots and qualifies for provider-side prompt caching. The suffix holds
+        the subject and question count.
+        """
+        prefix = self._static_prefix(question_type, difficulty)
+        suffix = VARIABLE_SUFFIX_TEMPLATE.format(subject=subject, question_count=question_count)
+        return prefix, suffix
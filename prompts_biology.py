@@ -4,6 +4,9 @@ Contains 9 specialized prompts for each question type + difficulty combination
 Tailored for Biology subjects (Botany, Zoology, Cell Biology, Genetics, etc.)
 """
 
+import prompt_builder
+
+
 # Base template with common instructions for Biology
 BASE_TEMPLATE = """You are a NEET Test Generator AI specializing in BIOLOGY. Your ONLY role is to create exam questions strictly and solely from the EXACT text visible in the provided image.
 
@@ -1978,6 +1981,9 @@ PROMPTS_CONFIG = {
 }
 
 
+_PROMPT_BUILDER = prompt_builder.PromptBuilder(BASE_TEMPLATE, PROMPTS_CONFIG)
+
+
 def get_prompt(question_type: str, difficulty: str, subject: str, question_count: int) -> str:
     """
     Get the formatted prompt for a specific question type and difficulty.
@@ -1989,25 +1995,19 @@ def get_prompt(question_type: str, difficulty: str, subject: str, question_count
         question_count: Number of questions to generate
 
     Returns:
-        Formatted prompt string
+        Formatted prompt string (memoized; see prompt_builder)
     """
-    key = (question_type.lower(), difficulty.lower())
-
-    if key not in PROMPTS_CONFIG:
-        raise ValueError(f"Invalid combination: {question_type} + {difficulty}")
+    return _PROMPT_BUILDER.get_prompt(question_type, difficulty, subject, question_count)
 
-    config = PROMPTS_CONFIG[key]
 
-    prompt = BASE_TEMPLATE.format(
-        subject=subject,
-        question_count=question_count,
-        difficulty=difficulty,
-        question_type=question_type,
-        question_type_rules=config["rules"],
-        output_schema=config["output_schema"]
-    )
+def get_prompt_parts(question_type: str, difficulty: str, subject: str, question_count: int) -> tuple:
+    """
+    Get the prompt split into (static_prefix, variable_suffix).
 
-    return prompt
+    The prefix depends only on question type + difficulty and is identical
+    across calls; subject and question count live in the short suffix.
+    """
+    return _PROMPT_BUILDER.get_prompt_parts(question_type, difficulty, subject, question_count)
 
 
 def get_all_prompt_keys() -> list:
@@ -1,3 +1,5 @@
+import prompt_builder
+
 BASE_TEMPLATE = """You are a NEET Test Generator AI specializing in CHEMISTRY. Your ONLY role is to create exam questions strictly and solely from the EXACT content visible in the provided PDF. The content will primarily be Inorganic Chemistry but may also include Organic or Physical Chemistry topics.
 
 You are receiving a TEXTBOOK PDF directly. Read ALL pages thoroughly before generating questions.
@@ -3197,6 +3199,9 @@ PROMPTS_CONFIG = {
 }
 
 
+_PROMPT_BUILDER = prompt_builder.PromptBuilder(BASE_TEMPLATE, PROMPTS_CONFIG)
+
+
 def get_prompt(question_type: str, difficulty: str, subject: str, question_count: int) -> str:
     """
     Get the formatted prompt for a specific question type and difficulty.
@@ -3208,25 +3213,19 @@ def get_prompt(question_type: str, difficulty: str, subject: str, question_count
         question_count: Number of questions to generate
 
     Returns:
-        Formatted prompt string
+        Formatted prompt string (memoized; see prompt_builder)
     """
-    key = (question_type.lower(), difficulty.lower())
+    return _PROMPT_BUILDER.get_prompt(question_type, difficulty, subject, question_count)
 
-    if key not in PROMPTS_CONFIG:
-        raise ValueError(f"Invalid combination: {question_type} + {difficulty}")
 
-    config = PROMPTS_CONFIG[key]
-
-    prompt = BASE_TEMPLATE.format(
-        subject=subject,
-        question_count=question_count,
-        difficulty=difficulty,
-        question_type=question_type,
-        question_type_rules=config["rules"],
-        output_schema=config["output_schema"]
-    )
+def get_prompt_parts(question_type: str, difficulty: str, subject: str, question_count: int) -> tuple:
+    """
+    Get the prompt split into (static_prefix, variable_suffix).
 
-    return prompt
+    The prefix depends only on question type + difficulty and is identical
+    across calls; subject and question count live in the short suffix.
+    """
+    return _PROMPT_BUILDER.get_prompt_parts(question_type, difficulty, subject, question_count)
 
 
 def get_all_prompt_keys() -> list:
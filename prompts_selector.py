@@ -86,6 +86,17 @@ def get_prompt(question_type: str, difficulty: str, subject: str, question_count
     return module.get_prompt(question_type, difficulty, subject, question_count)
 
 
+def get_prompt_parts(question_type: str, difficulty: str, subject: str, question_count: int) -> tuple:
+    """
+    Get the prompt for a subject split into (static_prefix, variable_suffix).
+
+    The prefix is byte-identical for every call with the same question type
+    and difficulty, so it can be served from the provider's prompt cache.
+    """
+    module = get_prompt_module(subject)
+    return module.get_prompt_parts(question_type, difficulty, subject, question_count)
+
+
 def get_supported_subjects() -> list:
     """Get list of all supported subjects."""
     return list(SUBJECT_MODULES.keys())
@@ -0,0 +1,196 @@
+"""
+NEET Test Generator - Shared API Rate Limiter
+Process-wide token-bucket limiter (requests/min + tokens/min) per model,
+kept in sync with the x-ratelimit-* headers OpenAI returns.
+"""
+
+import asyncio
+import logging
+import random
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# Starting limits per model until the API reports the real ones in headers
+DEFAULT_LIMITS = {
+    "gpt-5-mini": {"rpm": 500, "tpm": 500_000},
+}
+FALLBACK_LIMITS = {"rpm": 500, "tpm": 200_000}
+
+# Backoff used when a rate-limit error carries no retry-after header
+BACKOFF_SECONDS = [2, 4, 8]
+
+
+def _parse_duration(value) -> float:
+    """Parse an OpenAI reset duration like '1s', '6m0s', '20ms' or '0.5' into seconds."""
+    if value is None:
+        return 0.0
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total = 0.0
+    for amount, unit in re.findall(r'([\d.]+)(ms|h|m|s)', value):
+        amount = float(amount)
+        total += {"ms": amount / 1000, "s": amount, "m": amount * 60, "h": amount * 3600}[unit]
+    return total
+
+
+def _header_int(headers, name):
+    """Read an integer header, returning None if missing or malformed."""
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class _TokenBucket:
+    """A bucket of `capacity` units that refills completely every 60 seconds."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.level = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        rate = self.capacity / 60.0
+        self.level = min(self.capacity, self.level + (now - self.updated) * rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available (0 if available now)."""
+        self._refill(now)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / (self.capacity / 60.0)
+
+    def take(self, amount: float):
+        self.level -= amount
+
+    def give_back(self, amount: float, now: float):
+        self._refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+    def sync(self, limit, remaining, now: float):
+        """Adopt the server's view of the limit and remaining budget."""
+        self._refill(now)
+        if limit:
+            self.capacity = limit
+        if remaining is not None:
+            self.level = min(self.level, remaining)
+
+
+class ModelRateLimiter:
+    """Shared RPM/TPM budget for one model.
+
+    Thread-safe: one instance is shared by every Streamlit session and every
+    event loop in the process. Callers `await acquire(cost)` before a request,
+    then report headers / actual usage back so the budget stays accurate.
+    """
+
+    def __init__(self, model: str, rpm: int, tpm: int):
+        self.model = model
+        self._requests = _TokenBucket(rpm)
+        self._tokens = _TokenBucket(tpm)
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _cap_cost(self, cost: int) -> int:
+        # A single call can never need more than the whole bucket
+        return max(1, min(int(cost), self._tokens.capacity))
+
+    def _try_acquire(self, cost: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            wait = max(
+                self._blocked_until - now,
+                self._requests.wait_time(1, now),
+                self._tokens.wait_time(cost, now),
+            )
+            if wait <= 0:
+                self._requests.take(1)
+                self._tokens.take(cost)
+            return wait
+
+    async def acquire(self, cost: int):
+        """Wait until one request costing `cost` tokens fits in the budget."""
+        cost = self._cap_cost(cost)
+        waited = 0.0
+        while True:
+            wait = self._try_acquire(cost)
+            if wait <= 0:
+                break
+            wait = min(wait, 5.0) + random.uniform(0, 0.25)
+            waited += wait
+            await asyncio.sleep(wait)
+        if waited >= 1:
+            logger.info(f"[RATE LIMIT] {self.model}: waited {waited:.1f}s for budget ({cost:,} tokens)")
+
+    def settle(self, estimated_cost: int, actual_tokens: int):
+        """Return the unused part of an estimate once the real usage is known."""
+        unused = self._cap_cost(estimated_cost) - (actual_tokens or 0)
+        if unused > 0:
+            with self._lock:
+                self._tokens.give_back(unused, time.monotonic())
+
+    def update_from_headers(self, headers):
+        """Sync limits and remaining budget from x-ratelimit-* response headers."""
+        if not headers:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._requests.sync(
+                _header_int(headers, "x-ratelimit-limit-requests"),
+                _header_int(headers, "x-ratelimit-remaining-requests"),
+                now,
+            )
+            self._tokens.sync(
+                _header_int(headers, "x-ratelimit-limit-tokens"),
+                _header_int(headers, "x-ratelimit-remaining-tokens"),
+                now,
+            )
+
+    def penalize(self, headers, attempt: int) -> float:
+        """Block the whole model after a rate-limit error. Returns the wait in seconds.
+
+        Honours retry-after / retry-after-ms / x-ratelimit-reset-* headers when
+        present, otherwise falls back to BACKOFF_SECONDS. Every caller sharing
+        this limiter waits out the same window instead of retrying on its own.
+        """
+        wait = 0.0
+        if headers:
+            self.update_from_headers(headers)
+            if headers.get("retry-after-ms") is not None:
+                wait = _parse_duration(headers.get("retry-after-ms")) / 1000
+            elif headers.get("retry-after") is not None:
+                wait = _parse_duration(headers.get("retry-after"))
+            else:
+                wait = max(
+                    _parse_duration(headers.get("x-ratelimit-reset-requests")),
+                    _parse_duration(headers.get("x-ratelimit-reset-tokens")),
+                )
+        if wait <= 0:
+            wait = BACKOFF_SECONDS[min(attempt, len(BACKOFF_SECONDS) - 1)]
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + wait)
+        return wait
+
+
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_limiter(model: str) -> ModelRateLimiter:
+    """Return the process-wide limiter for `model`, creating it on first use."""
+    with _LIMITERS_LOCK:
+        if model not in _LIMITERS:
+            limits = DEFAULT_LIMITS.get(model, FALLBACK_LIMITS)
+            _LIMITERS[model] = ModelRateLimiter(model, limits["rpm"], limits["tpm"])
+        return _LIMITERS[model]
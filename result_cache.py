@@ -0,0 +1,118 @@
+"""
+NEET Test Generator - On-Disk Result Cache
+Content-addressed JSON cache for generation results, keyed by hashes of the
+PDF bytes, the prompt and the generation settings. Entries expire after a
+TTL and the least recently used ones are evicted beyond a size cap.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+CACHE_DIR = os.getenv("NEET_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600   # 1 week
+DEFAULT_MAX_ENTRIES = 500
+
+
+def sha256_hex(data) -> str:
+    """SHA-256 hex digest of bytes or str."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_key(**parts) -> str:
+    """Build a cache key from JSON-serializable parts (order-independent)."""
+    return sha256_hex(json.dumps(parts, sort_keys=True, default=str))
+
+
+class ResultCache:
+    """A directory of JSON entries named by key.
+
+    Reads refresh the entry's mtime, which is what LRU eviction sorts on.
+    Writes go through a temp file + os.replace so concurrent processes never
+    see a half-written entry.
+    """
+
+    def __init__(self, namespace: str, cache_dir: str = CACHE_DIR,
+                 ttl_seconds: int = DEFAULT_TTL_SECONDS, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.directory = os.path.join(cache_dir, namespace)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str):
+        """Return the cached value for `key`, or None if missing or expired."""
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get("created_at", 0) > self.ttl_seconds:
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry.get("value")
+
+    def put(self, key: str, value):
+        """Store `value` (JSON-serializable) under `key`, then enforce TTL/size limits."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"created_at": time.time(), "value": value}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"[CACHE] Failed to write {self.directory} entry: {e}")
+            self._remove(tmp_path)
+            return
+        self._evict()
+
+    def delete(self, key: str):
+        """Drop the entry for `key` if present."""
+        self._remove(self._path(key))
+
+    def _evict(self):
+        entries = []
+        now = time.time()
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue
+            # mtime is refreshed on reads, so this only drops entries idle for a full TTL;
+            # get() still enforces the TTL from created_at
+            if now - mtime > self.ttl_seconds:
+                self._remove(path)
+            else:
+                entries.append((mtime, path))
+        if len(entries) > self.max_entries:
+            entries.sort()
+            for _, path in entries[:len(entries) - self.max_entries]:
+                self._remove(path)
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -5,6 +5,7 @@ cd /home/ubuntu/apps/test-generator-from-paragraph
 
 # Kill any existing instances first
 pkill -f "streamlit run app.py" 2>/dev/null
+pkill -f "python3 worker.py" 2>/dev/null
 pkill ngrok 2>/dev/null
 sleep 2
 
@@ -18,6 +19,9 @@ streamlit run app.py \
   --server.baseUrlPath "" \
   --browser.serverAddress "0.0.0.0" &
 
+# Start the generation worker (runs queued jobs; survives Streamlit restarts)
+python3 worker.py > /tmp/worker.log 2>&1 &
+
 echo "Streamlit started, waiting for it to be ready..."
 sleep 5
 
@@ -39,5 +43,6 @@ echo "Local URL: http://localhost:8501"
 echo ""
 echo "To stop services:"
 echo "  pkill -f 'streamlit run app.py'"
+echo "  pkill -f 'python3 worker.py'"
 echo "  pkill ngrok"
 echo ""
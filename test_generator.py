@@ -3,439 +3,172 @@ NEET Test Generator - OpenAI API Wrapper
 Generates exam questions from textbook PDFs using gpt-5-mini
 """
 
+import asyncio
 import base64
-import io
-import itertools
+import contextlib
 import json
 import logging
-import math
-import random
-import re
 import time
-from concurrent.futures import ThreadPoolExecutor
-
-from openai import OpenAI
-from pypdf import PdfReader, PdfWriter
+import types
 
+from openai import AsyncOpenAI
 import prompts_chemistry
+import client_registry
+import file_store
+import hedging
+import postprocess
+import rate_limiter
+import result_cache
+import token_budget
+from cancellation import CancellationToken
+from chunk_planner import ESTIMATED_TOKENS_PER_PDF_PAGE, plan_chunks
+from json_stream import QuestionStreamParser, fix_latex_json, repair_truncated_json
+from pdf_utils import ParsedPdf
 
 logger = logging.getLogger(__name__)
 
 
 # ============================================================
-# JSON / TEXT UTILITIES
+# PROMPT MODULE SELECTOR
 # ============================================================
 
-def _fix_latex_json(text: str) -> str:
-    """Fix LaTeX backslash commands that break JSON parsing.
-
-    LLMs often write $E^\circ$ instead of $E^\\circ$ in JSON strings.
-    \\c is not a valid JSON escape, causing json.loads() to fail.
-    This finds single backslashes NOT followed by valid JSON escape
-    characters and doubles them so JSON parsing succeeds.
-    """
-    # Valid JSON escape chars after backslash: \ " / n r t b f u
-    # Anything else (like \c in \circ, \D in \Delta) is invalid
-    return re.sub(r'(?<!\\)\\(?![\\"/nrtbfu])', r'\\\\', text)
+def _get_prompt_module(subject: str):
+    """Return the correct prompts module based on the subject."""
+    return prompts_chemistry
 
 
 # ============================================================
-# POST-PROCESSING FUNCTIONS (unchanged from OpenAI version)
+# OPENAI API HELPERS
 # ============================================================
 
-def _fix_unwrapped_latex(text: str) -> str:
-    """Wrap common unwrapped LaTeX patterns in $...$ delimiters.
-
-    The model sometimes outputs M^{2+} or H_2O without $...$.
-    This catches those patterns and wraps them so they render properly.
-    """
-    if not text:
-        return text
-
-    # Skip if no LaTeX-like characters present
-    if '^' not in text and '_' not in text and '\\' not in text:
-        return text
-
-    # Pattern: word^{...} or word_{...} not already inside $...$
-    # Match sequences like Fe^{2+}, H_2O, M^{2+}/M that aren't wrapped
-    def wrap_match(m):
-        # Check if already inside $...$
-        start = m.start()
-        # Count $ signs before this match
-        before = text[:start]
-        dollar_count = before.count('$')
-        if dollar_count % 2 == 1:
-            # Inside a $...$ block already
-            return m.group(0)
-        return f'${m.group(0)}$'
-
-    # Match: sequences containing ^{...} or _{...} with surrounding chemical context
-    # e.g., Fe^{2+}, H_2O, M^{2+}/M, SO_4^{2-}
-    text = re.sub(
-        r'(?<!\$)([A-Za-z][A-Za-z0-9]*(?:[_^]\{[^}]+\}|[_^][0-9])[A-Za-z0-9_^{}+\-]*(?:/[A-Za-z][A-Za-z0-9_^{}+\-]*)*)(?!\}|\$)',
-        wrap_match,
-        text
-    )
-
-    # Fix double $$ from adjacent wrapping
-    text = text.replace('$$', '$ $')
-
-    return text
+# Upper bound on API requests in flight at once. Within it, requests are
+# admitted by the shared per-model rate limiter (RPM/TPM budget).
+MAX_CONCURRENCY_CAP = 32
 
+# Per-request deadline: time to first token plus max_completion_tokens at the
+# slowest output rate we still consider healthy (reasoning tokens included)
+REQUEST_TIMEOUT_BASE_SECONDS = 120
+MIN_OUTPUT_TOKENS_PER_SECOND = 25
 
-def _fix_chemical_formatting(questions: list) -> list:
-    """Post-process questions to clean up structural formatting.
-
-    Preserves LaTeX $...$ notation for frontend rendering.
-    Wraps unwrapped LaTeX patterns (like M^{2+}) in $...$ delimiters.
-    Handles numbered statement line breaks and MTC table formatting.
-    """
-
-    def _format_numbered_statements(text: str) -> str:
-        """Insert line breaks before numbered statements when they're on one line.
-        Handles both '1. ...' and '(1) ...' formats used in NEET questions.
-        Avoids breaking mid-sentence numbers like '5d = 9.' or 'E° = 1.51'."""
-        # Format 1: "(1) ... (2) ... (3) ..." — common in Hard MCQs
-        text = re.sub(r'(?<!\n)\s+(\(\d+\)\s)', r'\n\1', text)
-        # Format 2: "1. ... 2. ..." — only match if preceded by sentence end (. or :) or start
-        text = re.sub(r'(?<=[.:?])\s+(\d+\.\s)', r'\n\1', text)
-        return text
-
-    def _format_mtc_question(text: str) -> str:
-        """Parse MTC question text and reconstruct as a clean pipe table."""
-        # Normalize: replace literal \n with actual newlines, then flatten to one line
-        text = text.replace('\\n\\n', ' ').replace('\\n', ' ')
-        flat = ' '.join(text.split())
-
-        # Extract pairs: "A. [text] | I. [text]", "B. [text] | II. [text]", etc.
-        pair_pattern = r'([A-D])\.\s*(.*?)\s*\|\s*(IV|III|II|I)\.\s*(.*?)(?=\s+[A-D]\.\s|Choose|$)'
-        pairs = re.findall(pair_pattern, flat)
-
-        if not pairs:
-            return text  # Can't parse — return as-is
-
-        # Extract header (everything before "A.")
-        header_match = re.match(r'^(.*?)(?=\s*A\.)', flat)
-        header = header_match.group(1).strip() if header_match else "Match List I with List II"
-        # Clean header: remove "List I | List II" from it (we'll add it as table header)
-        header = re.sub(r'\s*List\s+I\s*\|\s*List\s+II\s*', '', header).strip()
-        if not header:
-            header = "Match List I with List II"
-
-        # Extract footer
-        footer_match = re.search(r'(Choose the correct.*?)$', flat, re.IGNORECASE)
-        footer = footer_match.group(1).strip() if footer_match else "Choose the correct answer from the options given below:"
-
-        # Reconstruct as clean table
-        lines = [header, "", "List I | List II"]
-        for letter, list1, roman, list2 in pairs:
-            lines.append(f"{letter}. {list1.strip()} | {roman}. {list2.strip()}")
-        lines.append("")
-        lines.append(footer)
-
-        return '\n'.join(lines)
-
-    for q in questions:
-        if 'question_text' in q and isinstance(q['question_text'], str):
-            # Fix unwrapped LaTeX (e.g., M^{2+} → $M^{2+}$)
-            q['question_text'] = _fix_unwrapped_latex(q['question_text'])
-            q_type = q.get('question_type', '').upper()
-            if q_type == 'MATCH_THE_COLUMN':
-                q['question_text'] = _format_mtc_question(q['question_text'])
-            else:
-                q['question_text'] = _format_numbered_statements(q['question_text'])
-
-        if 'options' in q and isinstance(q['options'], dict):
-            for key in q['options']:
-                if isinstance(q['options'][key], str):
-                    q['options'][key] = _fix_unwrapped_latex(q['options'][key])
-
-    return questions
-
-
-def _fix_duplicate_mtc_options(questions: list) -> list:
-    """Post-process MTC questions to ensure all 4 options are unique.
-
-    If two or more options have the same matching combination,
-    replace the duplicate(s) with new valid permutations.
-    """
-    roman = ['I', 'II', 'III', 'IV']
-    letters = ['A', 'B', 'C', 'D']
-
-    def _normalize(opt_str: str) -> str:
-        """Normalize option string for comparison (strip spaces, uppercase)."""
-        return re.sub(r'\s+', '', opt_str.strip().upper())
 
-    def _make_option_str(perm: list) -> str:
-        """Create option string like 'A-IV, B-I, C-III, D-II' from a permutation of roman numerals."""
-        return ', '.join(f'{letters[i]}-{perm[i]}' for i in range(4))
-
-    for q in questions:
-        q_type = q.get('question_type', '').upper()
-        if q_type != 'MATCH_THE_COLUMN':
-            continue
-
-        options = q.get('options', {})
-        if not options or len(options) < 4:
-            continue
-
-        # Get current option values
-        opt_keys = ['a', 'b', 'c', 'd']
-        opt_values = [options.get(k, '') for k in opt_keys]
-        normalized = [_normalize(v) for v in opt_values]
-
-        # Check for duplicates
-        seen = {}
-        duplicates = []
-        for i, norm in enumerate(normalized):
-            if norm in seen:
-                duplicates.append(i)
-            else:
-                seen[norm] = i
-
-        if not duplicates:
-            continue
-
-        logger.warning(f"[MTC-FIX] Q{q.get('question_id', '?')}: Found {len(duplicates)} duplicate option(s), generating replacements")
-
-        # Generate all 24 permutations of roman numerals
-        all_perms = [list(p) for p in itertools.permutations(roman)]
-
-        # Remove permutations that match any existing non-duplicate option
-        used_norms = set()
-        for i, norm in enumerate(normalized):
-            if i not in duplicates:
-                used_norms.add(norm)
-
-        available = [p for p in all_perms if _normalize(_make_option_str(p)) not in used_norms]
-        random.shuffle(available)
-
-        # Replace each duplicate with a new unique permutation
-        for dup_idx in duplicates:
-            if available:
-                new_perm = available.pop()
-                new_opt = _make_option_str(new_perm)
-                used_norms.add(_normalize(new_opt))
-                # Filter out any that now match
-                available = [p for p in available if _normalize(_make_option_str(p)) not in used_norms]
-                options[opt_keys[dup_idx]] = new_opt
-                logger.info(f"[MTC-FIX] Q{q.get('question_id', '?')}: Replaced option ({dup_idx+1}) with {new_opt}")
-
-    return questions
-
-
-def _fix_sequential_mtc_mapping(questions: list) -> list:
-    """Post-process MTC questions to fix sequential correct answers (A-I, B-II, C-III, D-IV).
-
-    When the correct option has a sequential mapping, we shuffle the List II roman
-    numeral assignments throughout the question text AND all options.
-    """
-    roman_numerals = ['I', 'II', 'III', 'IV']
-    sequential_pattern = re.compile(
-        r'A\s*[-–—]\s*I\s*,\s*B\s*[-–—]\s*II\s*,\s*C\s*[-–—]\s*III\s*,\s*D\s*[-–—]\s*IV',
-        re.IGNORECASE
-    )
-
-    def _apply_numeral_swap(text: str, swap_map: dict) -> str:
-        """Swap roman numerals in an option string using a mapping like {'I': 'III', 'III': 'I'}."""
-        # Replace each roman numeral with a placeholder first to avoid double-swaps
-        placeholders = {}
-        result = text
-        for old, new in swap_map.items():
-            placeholder = f"__ROMAN_{old}__"
-            placeholders[placeholder] = new
-            # Match the roman numeral that follows a dash (part of A-I pattern)
-            result = re.sub(rf'([-–—]\s*){re.escape(old)}(?!\w)', rf'\1{placeholder}', result)
-        # Also handle standalone roman numerals after pipe/dot in question text table
-        for old, new in swap_map.items():
-            placeholder = f"__ROMAN_{old}__"
-            # Match "I." or "II." etc at start of List II items
-            result = re.sub(rf'(?<!\w){re.escape(old)}\.', f'{placeholder}.', result)
-        # Replace placeholders with final values
-        for placeholder, new in placeholders.items():
-            result = result.replace(placeholder, new)
-        return result
-
-    for q in questions:
-        q_type = q.get('question_type', '').upper()
-        if q_type != 'MATCH_THE_COLUMN':
-            continue
-
-        options = q.get('options', {})
-        correct_key = q.get('correct_answer', '').lower().strip()
-        if correct_key not in options:
-            continue
-
-        correct_option_text = options[correct_key]
-
-        # Check if the correct option is sequential (A-I, B-II, C-III, D-IV)
-        if not sequential_pattern.search(correct_option_text):
-            continue
-
-        logger.warning(f"[MTC-SHUFFLE] Q{q.get('question_id', '?')}: Sequential correct answer detected ({correct_option_text}), shuffling List II")
-
-        # Generate a random non-sequential permutation of roman numerals
-        while True:
-            shuffled = list(roman_numerals)
-            random.shuffle(shuffled)
-            # Ensure it's not sequential (I, II, III, IV)
-            if shuffled != roman_numerals:
-                break
+def _estimate_input_tokens(text_chars: int, pdf_pages: int) -> int:
+    """Rough input-token estimate: ~4 chars per token plus a fixed cost per PDF page."""
+    return text_chars // 4 + pdf_pages * ESTIMATED_TOKENS_PER_PDF_PAGE
 
-        # Build swap map: old numeral → new numeral
-        swap_map = {}
-        for i, old in enumerate(roman_numerals):
-            if old != shuffled[i]:
-                swap_map[old] = shuffled[i]
 
-        if not swap_map:
-            continue
+def _request_timeout(max_completion_tokens: int) -> float:
+    """Seconds a single request may take before it is abandoned (and retried)."""
+    return REQUEST_TIMEOUT_BASE_SECONDS + max_completion_tokens / MIN_OUTPUT_TOKENS_PER_SECOND
 
-        # Apply swap to all 4 options
-        for key in ['a', 'b', 'c', 'd']:
-            if key in options:
-                options[key] = _apply_numeral_swap(options[key], swap_map)
-
-        # Apply swap to question text (List II labels in the table)
-        if 'question_text' in q:
-            q['question_text'] = _apply_numeral_swap(q['question_text'], swap_map)
-
-        # Apply swap to explanation if it references roman numerals
-        explanation = q.get('explanation', {})
-        if isinstance(explanation, dict):
-            for key in explanation:
-                if isinstance(explanation[key], str):
-                    explanation[key] = _apply_numeral_swap(explanation[key], swap_map)
-        elif isinstance(explanation, str):
-            q['explanation'] = _apply_numeral_swap(explanation, swap_map)
-
-        logger.info(f"[MTC-SHUFFLE] Q{q.get('question_id', '?')}: Shuffled List II: {dict(zip(roman_numerals, shuffled))}. New correct: {options[correct_key]}")
-
-    return questions
-
-
-def _randomize_answer_positions(questions: list) -> list:
-    """
-    Post-process questions to ensure correct answers are distributed
-    roughly equally across A, B, C, D. Applies to MCQ and MTC questions.
-    AR questions have fixed option structure (a/b/c/d = specific answer types) and cannot be shuffled.
-    """
-    # Separate shufflable questions from AR (fixed structure)
-    shufflable_indices = []
-    for i, q in enumerate(questions):
-        qtype = q.get("question_type", "").upper()
-        # AR options are fixed (a=both true R explains, b=both true R doesn't explain, etc.)
-        # MCQ and MTC options can be freely swapped
-        if qtype not in ("ASSERTION_REASON", "ASSERTION-REASON", "AR"):
-            shufflable_indices.append(i)
-
-    if len(shufflable_indices) < 2:
-        return questions
-
-    # Build target distribution: near-equal across A, B, C, D
-    n = len(shufflable_indices)
-    base = n // 4
-    remainder = n % 4
-    letters = ["a", "b", "c", "d"]
-    random.shuffle(letters)  # randomize which letters get the extra question
-    target_counts = {}
-    for i, l in enumerate(letters):
-        target_counts[l] = base + (1 if i < remainder else 0)
-
-    # Assign each question a target letter
-    # Shuffle the indices so the reassignment is random, not always Q1→A, Q2→B...
-    indices_shuffled = list(shufflable_indices)
-    random.shuffle(indices_shuffled)
-
-    assignments = []  # (question_index, target_letter)
-    pos = 0
-    for letter in ["a", "b", "c", "d"]:
-        for _ in range(target_counts[letter]):
-            assignments.append((indices_shuffled[pos], letter))
-            pos += 1
-
-    # Apply swaps where needed
-    swaps_done = 0
-    for q_idx, target_letter in assignments:
-        q = questions[q_idx]
-        current_answer = q.get("correct_answer", "").lower().strip()
-
-        if current_answer == target_letter:
-            continue  # already correct letter
-
-        options = q.get("options", {})
-        explanation = q.get("explanation", {})
-
-        if current_answer in options and target_letter in options:
-            # Swap the option content
-            options[current_answer], options[target_letter] = options[target_letter], options[current_answer]
-            # Swap the explanation content
-            if isinstance(explanation, dict) and current_answer in explanation and target_letter in explanation:
-                explanation[current_answer], explanation[target_letter] = explanation[target_letter], explanation[current_answer]
-            # Update correct answer
-            q["correct_answer"] = target_letter
-            swaps_done += 1
-
-    # Log final distribution
-    final_dist = {"a": 0, "b": 0, "c": 0, "d": 0}
-    for i in shufflable_indices:
-        ans = questions[i].get("correct_answer", "").lower().strip()
-        if ans in final_dist:
-            final_dist[ans] += 1
-    logger.info(f"[RANDOMIZE] {swaps_done} swaps applied. Final distribution: {final_dist}")
-
-    return questions
-
-
-# ============================================================
-# PROMPT MODULE SELECTOR
-# ============================================================
-
-def _get_prompt_module(subject: str):
-    """Return the correct prompts module based on the subject."""
-    return prompts_chemistry
 
+async def _api_call_with_retry(client, model, messages, max_completion_tokens, temperature,
+                               estimated_input_tokens=0, max_retries=3, stream=False, timeout=None):
+    """Make an OpenAI API call with retry logic for rate limits and connection errors.
 
-# ============================================================
-# OPENAI API HELPERS
-# ============================================================
+    Every attempt is admitted by the process-wide rate limiter for `model`,
+    costed at estimated_input_tokens + max_completion_tokens. Rate-limit
+    errors pause the whole model for the server's retry-after window;
+    other retryable errors back off 2s, 4s, 8s. A failed attempt returns
+    its reservation to the limiter.
 
-def _api_call_with_retry(client, model, messages, max_completion_tokens, temperature, max_retries=3):
-    """Make an OpenAI API call with retry logic for rate limits and connection errors.
+    With stream=True, returns the open AsyncStream; the caller reads it and
+    settles the limiter once the final usage chunk arrives.
 
-    Uses escalating backoff: 2s, 4s, 8s.
+    `timeout` (default: _request_timeout(max_completion_tokens)) bounds each
+    attempt; a timed-out attempt is retried like a connection error.
     """
+    if timeout is None:
+        timeout = _request_timeout(max_completion_tokens)
+    limiter = rate_limiter.get_limiter(model)
+    estimated_cost = estimated_input_tokens + max_completion_tokens
     wait_times = [2, 4, 8]
     for attempt in range(max_retries + 1):
+        await limiter.acquire(estimated_cost)
         try:
-            return client.chat.completions.create(
+            stream_kwargs = {"stream": True, "stream_options": {"include_usage": True}} if stream else {}
+            raw = await client.chat.completions.with_raw_response.create(
                 model=model,
                 messages=messages,
                 max_completion_tokens=max_completion_tokens,
                 temperature=temperature,
+                timeout=timeout,
+                **stream_kwargs,
             )
+            limiter.update_from_headers(raw.headers)
+            response = raw.parse()
+            if stream:
+                return response
+            limiter.settle(estimated_cost, _extract_token_usage(response).get("total_tokens", 0))
+            return response
+        except asyncio.CancelledError:
+            # Aborted (e.g. a losing hedge): the prompt counts, the unused completion budget goes back
+            limiter.settle(estimated_cost, estimated_input_tokens)
+            raise
         except Exception as e:
+            # The request was rejected or failed: give back its whole reservation, retried or not
+            limiter.settle(estimated_cost, 0)
             err_name = type(e).__name__
             err_str = str(e).lower()
+            is_rate_limit = "ratelimit" in err_name.lower() or "rate limit" in err_str or "429" in err_str
             is_retryable = (
-                "ratelimit" in err_name.lower()
+                is_rate_limit
                 or "rate" in err_str
-                or "429" in err_str
                 or "connection" in err_name.lower()
+                or "timeout" in err_name.lower()
                 or "timeout" in err_str
                 or "unavailable" in err_str
                 or "503" in err_str
                 or "overloaded" in err_str
             )
             if attempt < max_retries and is_retryable:
-                wait = wait_times[min(attempt, len(wait_times) - 1)]
-                logger.warning(f"[RETRY] Attempt {attempt + 1} failed ({err_name}), retrying in {wait}s...")
-                time.sleep(wait)
+                if is_rate_limit:
+                    headers = getattr(getattr(e, "response", None), "headers", None)
+                    wait = limiter.penalize(headers, attempt)
+                else:
+                    wait = wait_times[min(attempt, len(wait_times) - 1)]
+                logger.warning(f"[RETRY] Attempt {attempt + 1} failed ({err_name}), retrying in {wait:.1f}s...")
+                await asyncio.sleep(wait)
             else:
                 raise
     return None
 
 
+async def _read_stream(stream, on_text=None):
+    """Consume a chat completion stream. Returns a response-like object.
+
+    on_text(piece) is called for every content delta as it arrives. The
+    returned object has .choices[0].message.content and .usage like a
+    non-streamed response, so the rest of the pipeline treats both alike.
+    """
+    pieces = []
+    usage = None
+    finish_reason = None
+    try:
+        async for event in stream:
+            if getattr(event, "usage", None):
+                usage = event.usage
+            if not event.choices:
+                continue
+            choice = event.choices[0]
+            if choice.finish_reason:
+                finish_reason = choice.finish_reason
+            delta = choice.delta.content if choice.delta else None
+            if delta:
+                pieces.append(delta)
+                if on_text:
+                    on_text(delta)
+    except asyncio.CancelledError:
+        # Close the HTTP response now (e.g. a losing hedge) instead of at garbage collection
+        with contextlib.suppress(Exception):
+            await stream.close()
+        raise
+    message = types.SimpleNamespace(content="".join(pieces))
+    return types.SimpleNamespace(
+        choices=[types.SimpleNamespace(message=message, finish_reason=finish_reason)],
+        usage=usage,
+    )
+
+
 def _extract_token_usage(response) -> dict:
     """Extract token usage from an OpenAI API response."""
     tokens = {}
@@ -445,6 +178,7 @@ def _extract_token_usage(response) -> dict:
             "input_tokens": getattr(u, 'prompt_tokens', 0) or 0,
             "output_tokens": getattr(u, 'completion_tokens', 0) or 0,
             "total_tokens": getattr(u, 'total_tokens', 0) or 0,
+            "cached_input_tokens": getattr(getattr(u, 'prompt_tokens_details', None), 'cached_tokens', 0) or 0,
         }
     return tokens
 
@@ -477,8 +211,9 @@ def _parse_json_response(result_text: str) -> dict:
         pass
 
     # Try fixing LaTeX backslashes
+    repair_text = fix_latex_json(clean_text)
     try:
-        result = json.loads(_fix_latex_json(clean_text))
+        result = json.loads(repair_text)
         logger.info("JSON parse succeeded after fixing LaTeX backslashes")
         return result
     except json.JSONDecodeError:
@@ -487,24 +222,9 @@ def _parse_json_response(result_text: str) -> dict:
     # If JSON was truncated (hit max_completion_tokens or model stopped mid-output), try to repair
     logger.info("[JSON FIX] Response appears truncated or malformed, attempting repair")
 
-    repair_text = _fix_latex_json(clean_text)
-
-    # Try progressively shorter cuts — find each "}" and try to close
-    pos = len(repair_text)
-    while pos > 0:
-        pos = repair_text.rfind("}", 0, pos)
-        if pos == -1:
-            break
-        truncated = repair_text[:pos + 1]
-        for suffix in ["", "}", "]}", "]}}", "]}}}",  "]}]}"]:
-            try:
-                result = json.loads(truncated + suffix)
-                # Verify it has questions
-                if "questions" in result and len(result["questions"]) > 0:
-                    logger.info(f"[JSON FIX] Repaired! Recovered {len(result['questions'])} question(s) with suffix: '{suffix}'")
-                    return result
-            except json.JSONDecodeError:
-                continue
+    result = repair_truncated_json(repair_text)
+    if result is not None:
+        return result
 
     return {
         "raw_response": result_text[:500],
@@ -518,8 +238,9 @@ def _parse_json_response(result_text: str) -> dict:
 
 # GPT-5 mini pricing (per million tokens) — in USD
 GPT5_MINI_PRICING = {
-    "input_per_million": 0.25,   # $0.25 per 1M input tokens
-    "output_per_million": 2.00,  # $2.00 per 1M output tokens
+    "input_per_million": 0.25,          # $0.25 per 1M input tokens
+    "cached_input_per_million": 0.025,  # $0.025 per 1M input tokens served from the prompt cache
+    "output_per_million": 2.00,         # $2.00 per 1M output tokens
 }
 
 # USD to INR conversion rate
@@ -530,16 +251,24 @@ def calculate_cost(token_usage: dict) -> dict:
     """Calculate estimated cost from token usage in INR.
 
     Args:
-        token_usage: dict with 'input_tokens' and 'output_tokens'
+        token_usage: dict with 'input_tokens' and 'output_tokens', optionally
+            'cached_input_tokens' (the part of the input billed at the cached rate)
 
     Returns:
-        dict with input_cost, output_cost, total_cost (in INR)
+        dict with input_cost, output_cost, total_cost and cache_savings (in INR)
     """
     input_tokens = token_usage.get("input_tokens", 0)
+    cached_tokens = min(token_usage.get("cached_input_tokens", 0), input_tokens)
     output_tokens = token_usage.get("output_tokens", 0)
 
-    input_cost_usd = (input_tokens / 1_000_000) * GPT5_MINI_PRICING["input_per_million"]
+    input_cost_usd = (
+        ((input_tokens - cached_tokens) / 1_000_000) * GPT5_MINI_PRICING["input_per_million"]
+        + (cached_tokens / 1_000_000) * GPT5_MINI_PRICING["cached_input_per_million"]
+    )
     output_cost_usd = (output_tokens / 1_000_000) * GPT5_MINI_PRICING["output_per_million"]
+    savings_usd = (cached_tokens / 1_000_000) * (
+        GPT5_MINI_PRICING["input_per_million"] - GPT5_MINI_PRICING["cached_input_per_million"]
+    )
 
     input_cost = input_cost_usd * USD_TO_INR
     output_cost = output_cost_usd * USD_TO_INR
@@ -549,108 +278,250 @@ def calculate_cost(token_usage: dict) -> dict:
         "input_cost": round(input_cost, 4),
         "output_cost": round(output_cost, 4),
         "total_cost": round(total_cost, 4),
+        "cache_savings": round(savings_usd * USD_TO_INR, 4),
         "input_rate": f"₹{GPT5_MINI_PRICING['input_per_million'] * USD_TO_INR:.1f}/1M tokens",
+        "cached_input_rate": f"₹{GPT5_MINI_PRICING['cached_input_per_million'] * USD_TO_INR:.2f}/1M tokens",
         "output_rate": f"₹{GPT5_MINI_PRICING['output_per_million'] * USD_TO_INR:.1f}/1M tokens",
     }
 
 
 # ============================================================
-# PDF SPLITTING HELPERS
+# PDF CONTENT HELPERS
 # ============================================================
 
-def _get_pdf_page_count(pdf_bytes: bytes) -> int:
-    """Return total number of pages in a PDF."""
-    reader = PdfReader(io.BytesIO(pdf_bytes))
-    return len(reader.pages)
+def _inline_pdf_part(pdf_bytes: bytes) -> dict:
+    """Message content part carrying the PDF itself, base64-encoded."""
+    pdf_base64 = base64.b64encode(pdf_bytes).decode("utf-8")
+    return {
+        "type": "file",
+        "file": {
+            "filename": "textbook.pdf",
+            "file_data": f"data:application/pdf;base64,{pdf_base64}",
+        },
+    }
+
 
+async def _pdf_content_part(client, pdf_bytes: bytes, upload_files: bool) -> dict:
+    """Message content part for the PDF: an uploaded file_id, or inline base64.
 
-def _split_pdf_pages(pdf_bytes: bytes, start_page: int, end_page: int) -> bytes:
-    """Extract pages start_page to end_page (0-indexed, inclusive) and return as new PDF bytes."""
-    reader = PdfReader(io.BytesIO(pdf_bytes))
-    writer = PdfWriter()
-    for i in range(start_page, min(end_page + 1, len(reader.pages))):
-        writer.add_page(reader.pages[i])
-    output = io.BytesIO()
-    writer.write(output)
-    return output.getvalue()
+    Uploads go through file_store, so the same bytes are uploaded once and
+    shared by every request (and slot) until the upload expires. A failed
+    upload falls back to inlining.
+    """
+    if upload_files:
+        try:
+            file_id = await file_store.get_file_store().get_file_id(client, pdf_bytes)
+            return {"type": "file", "file": {"file_id": file_id}}
+        except Exception as e:
+            logger.warning(f"[FILES] Upload failed ({type(e).__name__}: {e}), sending the PDF inline")
+    return _inline_pdf_part(pdf_bytes)
 
 
-def _build_chunks(total_pages: int, question_count: int, chunk_size: int = 15, overlap: int = 1):
-    """Split pages into chunks with context overlap and distribute questions proportionally.
+def _build_page_content(parsed_pdf: ParsedPdf, start_page: int, end_page: int, content_mode: str):
+    """Return (pdf_bytes, page_text, pdf_page_count) to send for pages start_page to end_page.
 
-    Returns list of (core_start, core_end, pdf_start, pdf_end, num_questions) tuples (0-indexed).
-    - core_start/core_end: pages to generate questions from
-    - pdf_start/pdf_end: pages to send to API (includes overlap for context)
+    In "file" mode that is the PDF slice itself. In "text" mode the extracted
+    text of each page is sent instead, and only the figure/table-heavy pages
+    stay as a (smaller) PDF, or None if there are none.
     """
-    chunks = []
-    for start in range(0, total_pages, chunk_size):
-        end = min(start + chunk_size - 1, total_pages - 1)
-        chunk_pages = end - start + 1
-        chunk_q = max(1, round(question_count * chunk_pages / total_pages))
-        # Add overlap pages for context (not for question generation)
-        pdf_start = max(0, start - overlap) if start > 0 else 0
-        pdf_end = min(total_pages - 1, end + overlap) if end < total_pages - 1 else end
-        chunks.append([start, end, pdf_start, pdf_end, chunk_q])
-
-    # Adjust so total questions match exactly
-    allocated = sum(c[4] for c in chunks)
-    diff = question_count - allocated
-    if diff != 0:
-        largest_idx = max(range(len(chunks)), key=lambda i: chunks[i][4])
-        chunks[largest_idx][4] += diff
-
-    return [(c[0], c[1], c[2], c[3], c[4]) for c in chunks]
-
-
-def _generate_single_chunk(client, model, pdf_bytes, formatted_prompt, user_instruction,
-                           question_count, max_completion_tokens, temperature, chunk_label=""):
-    """Run a single API call for one PDF chunk. Returns (questions_list, token_usage, generation_time)."""
-    pdf_base64 = base64.b64encode(pdf_bytes).decode("utf-8")
+    if content_mode == "file":
+        return parsed_pdf.slice(start_page, end_page), "", end_page - start_page + 1
+
+    text_pages, visual_pages = parsed_pdf.split_pages(start_page, end_page)
+    sections = []
+    if visual_pages:
+        sections.append(
+            f"The attached PDF contains ONLY the figure/table pages {', '.join(str(i + 1) for i in visual_pages)} "
+            "of the chapter, in that order. The remaining pages are given below as extracted text."
+        )
+    for i in text_pages:
+        sections.append(f"--- Page {i + 1} ---\n{parsed_pdf.page_text(i)}")
+    page_text = "TEXTBOOK PAGES (extracted text):\n\n" + "\n\n".join(sections) if text_pages else ""
+    pdf_bytes = parsed_pdf.subset(visual_pages) if visual_pages else None
+    logger.info(f"[TEXT MODE] Pages {start_page+1}-{end_page+1}: {len(text_pages)} as text ({len(page_text):,} chars), "
+                f"{len(visual_pages)} as PDF {[i + 1 for i in visual_pages]}")
+    return pdf_bytes, page_text, len(visual_pages)
+
+
+async def _generate_single_chunk(client, model, pdf_bytes, formatted_prompt, user_instruction,
+                                 question_count, max_completion_tokens, temperature, chunk_label="",
+                                 semaphore=None, page_count=0, stream=False, on_question=None,
+                                 upload_files=False, page_text="", on_started=None, cancel_token=None,
+                                 postprocess_timings=None):
+    """Run a single API call for one PDF chunk. Returns (result_dict, token_usage, generation_time).
+
+    result_dict is the parsed response ("questions", or "parse_error" if the
+    output could not be parsed) plus the API's "finish_reason". Each question
+    goes through the per-question post-processing stages (stage timings are
+    added to `postprocess_timings`) and is passed to on_question(q) as soon as it is
+    available: while the response streams in when stream=True, otherwise
+    after parsing. If a semaphore is given, the API call waits for a free
+    slot in it first. With upload_files=True the PDF is referenced by an
+    uploaded file_id instead of being base64-inlined into the request.
+
+    In text mode `page_text` carries the extracted pages and `pdf_bytes`
+    only the figure/table pages (or None when every page went as text).
+    on_started() is called once the semaphore admits the call.
+
+    The request (including the wait for the semaphore and reading the
+    stream) runs under cancel_token, if given: cancelling the token aborts
+    the open HTTP request and raises GenerationCancelled. The whole call is
+    bounded by _request_timeout(max_completion_tokens).
+    """
+    def _guarded(coro):
+        return cancel_token.guard(coro) if cancel_token else coro
+
+    def _messages(pdf_part):
+        content = [pdf_part] if pdf_part else []
+        if page_text:
+            content.append({"type": "text", "text": page_text})
+        content.append({"type": "text", "text": user_instruction})
+        return [
+            {"role": "system", "content": formatted_prompt},
+            {"role": "user", "content": content},
+        ]
 
-    messages = [
-        {"role": "system", "content": formatted_prompt},
-        {
-            "role": "user",
-            "content": [
-                {
-                    "type": "file",
-                    "file": {
-                        "filename": "textbook.pdf",
-                        "file_data": f"data:application/pdf;base64,{pdf_base64}",
-                    },
-                },
-                {"type": "text", "text": user_instruction},
-            ],
-        },
-    ]
+    pdf_part = await _guarded(_pdf_content_part(client, pdf_bytes, upload_files)) if pdf_bytes else None
 
-    pdf_size_mb = len(pdf_bytes) / (1024 * 1024)
-    logger.info(f"[CHUNK {chunk_label}] PDF: {pdf_size_mb:.1f}MB | Questions: {question_count} | max_tokens: {max_completion_tokens}")
+    pdf_size_mb = len(pdf_bytes) / (1024 * 1024) if pdf_bytes else 0.0
+    text_note = f" + {len(page_text):,} chars of page text" if page_text else ""
+    logger.info(f"[CHUNK {chunk_label}] PDF: {pdf_size_mb:.1f}MB ({page_count} pages){text_note} | Questions: {question_count} | max_tokens: {max_completion_tokens}{' | streaming' if stream else ''}")
 
-    gen_start = time.time()
-    response = _api_call_with_retry(client, model, messages, max_completion_tokens, temperature)
-    generation_time = round(time.time() - gen_start, 1)
+    def _emit(q):
+        postprocess.get_pipeline().process(q, postprocess_timings)
+        if on_question:
+            on_question(q)
+
+    parser = QuestionStreamParser() if stream else None
+
+    def _on_text(piece):
+        for q in parser.feed(piece):
+            _emit(q)
+
+    estimated_input_tokens = _estimate_input_tokens(len(formatted_prompt) + len(user_instruction) + len(page_text), page_count)
+    timeout = _request_timeout(max_completion_tokens)
+
+    def _release_reservation():
+        # A stream abandoned before its usage chunk: keep the prompt's cost, return the rest
+        rate_limiter.get_limiter(model).settle(estimated_input_tokens + max_completion_tokens, estimated_input_tokens)
+
+    async def _call():
+        async with semaphore or contextlib.nullcontext():
+            if on_started:
+                on_started()
+            gen_start = time.time()
+            try:
+                response = await _api_call_with_retry(
+                    client, model, _messages(pdf_part), max_completion_tokens, temperature,
+                    estimated_input_tokens=estimated_input_tokens, stream=stream, timeout=timeout,
+                )
+            except Exception as e:
+                if not pdf_part or "file_id" not in pdf_part["file"] or "file" not in str(e).lower():
+                    raise
+                # The upload was deleted or expired early: drop it and send the bytes inline
+                logger.warning(f"[CHUNK {chunk_label}] Uploaded file rejected ({type(e).__name__}), retrying with the PDF inline")
+                await file_store.get_file_store().forget(client, pdf_bytes)
+                response = await _api_call_with_retry(
+                    client, model, _messages(_inline_pdf_part(pdf_bytes)), max_completion_tokens, temperature,
+                    estimated_input_tokens=estimated_input_tokens, stream=stream, timeout=timeout,
+                )
+            if stream and response is not None:
+                # The SDK timeout only bounds the gaps between events; this bounds the whole stream
+                remaining = max(1.0, timeout - (time.time() - gen_start))
+                try:
+                    response = await asyncio.wait_for(_read_stream(response, _on_text), remaining)
+                except asyncio.TimeoutError:
+                    _release_reservation()
+                    raise TimeoutError(f"Stream did not finish within {timeout:.0f}s") from None
+                except BaseException:
+                    # Cancelled (e.g. a losing hedge) or the stream broke off before its usage chunk
+                    _release_reservation()
+                    raise
+            return response, round(time.time() - gen_start, 1)
+
+    response, generation_time = await _guarded(_call())
 
     if response is None:
         logger.error(f"[CHUNK {chunk_label}] API call failed")
-        return [], {}, generation_time
+        return {"parse_error": "All API attempts failed", "raw_response": ""}, {}, generation_time
 
     token_usage = _extract_token_usage(response)
+    if stream:
+        rate_limiter.get_limiter(model).settle(
+            estimated_input_tokens + max_completion_tokens, token_usage.get("total_tokens", 0)
+        )
     result_text = response.choices[0].message.content or ""
     logger.info(f"[CHUNK {chunk_label}] Response: {len(result_text)} chars in {generation_time}s")
 
-    result = _parse_json_response(result_text)
-    questions = result.get("questions", [])
-    logger.info(f"[CHUNK {chunk_label}] Parsed {len(questions)} questions")
+    if parser and parser.questions:
+        result = {"questions": parser.questions}
+    else:
+        if len(result_text) > 200:
+            logger.info(f"[CHUNK {chunk_label}] Ends with: ...{result_text[-200:]!r}")
+        result = _parse_json_response(result_text)
+        for q in result.get("questions", []):
+            _emit(q)
+    result["finish_reason"] = response.choices[0].finish_reason
+    logger.info(f"[CHUNK {chunk_label}] Parsed {len(result.get('questions', []))} questions (finish_reason: {result['finish_reason']})")
+
+    return result, token_usage, generation_time
 
-    return questions, token_usage, generation_time
+
+def _sum_token_usage(*usages) -> dict:
+    """Add up token_usage dicts from several API calls."""
+    keys = ("input_tokens", "output_tokens", "total_tokens", "cached_input_tokens")
+    return {key: sum(usage.get(key, 0) for usage in usages if usage) for key in keys}
+
+
+def _top_up_instruction(questions: list, instruction: str) -> str:
+    """Instruction for a follow-up request: the usual one, plus the concepts already covered."""
+    if not questions:
+        return instruction
+    concepts = []
+    for q in questions:
+        concepts.extend((q.get("source_info") or {}).get("key_concepts") or [])
+    covered = "; ".join(dict.fromkeys(str(c) for c in concepts))
+    stems = "\n".join(f"- {str(q.get('question_text', ''))[:120]}" for q in questions)
+    return (
+        f"CONTINUATION: {len(questions)} questions were already generated from these pages. "
+        "Do NOT repeat or rephrase any of them — test different concepts only.\n"
+        f"Concepts already covered: {covered or 'see the questions below'}\n"
+        f"Questions already generated:\n{stems}\n\n"
+        f"{instruction}"
+    )
 
 
 # ============================================================
 # MAIN ENTRY POINT
 # ============================================================
 
-def generate_neet_test_from_pdf(
+# Bump to invalidate cached results when generation logic changes
+RESULT_CACHE_VERSION = 4
+
+# Put the static prompt prefix first and the per-call parameters last, so
+# OpenAI's automatic prompt caching can reuse the prefix across calls
+CACHE_FRIENDLY_PROMPT = True
+
+# Upload each PDF / chunk once via the Files API instead of base64-inlining it per request.
+# Off by default: uploaded files are stored by OpenAI (until expires_after, see
+# file_store) rather than only passed through with the request. Opt in per call
+# with upload_files=True (app sidebar checkbox, batch_cli --upload-files).
+UPLOAD_PDF_FILES = False
+
+# How the textbook reaches the model: "file" sends the PDF pages; "text" sends
+# the extracted text layer and keeps only figure/table-heavy pages as PDF
+CONTENT_MODES = ("file", "text")
+DEFAULT_CONTENT_MODE = "file"
+
+_result_cache = result_cache.ResultCache("results")
+_chunk_cache = result_cache.ResultCache("chunks", max_entries=2000)
+
+# Follow-up requests allowed per call for questions missing from a short or
+# truncated response (each asks only for what is still missing)
+MAX_TOP_UP_ROUNDS = 2
+
+
+async def agenerate_neet_test_from_pdf(
     pdf_bytes: bytes,
     subject: str = "biology",
     difficulty: str = "hard",
@@ -660,15 +531,70 @@ def generate_neet_test_from_pdf(
     temperature: float = 1.0,
     max_completion_tokens: int = 90000,
     api_key: str = None,
+    client: AsyncOpenAI = None,
+    semaphore: asyncio.Semaphore = None,
+    max_concurrency: int = MAX_CONCURRENCY_CAP,
+    parsed_pdf: ParsedPdf = None,
+    force_regenerate: bool = False,
+    stream: bool = False,
+    on_question=None,
+    cache_friendly_prompt: bool = CACHE_FRIENDLY_PROMPT,
+    upload_files: bool = UPLOAD_PDF_FILES,
+    content_mode: str = DEFAULT_CONTENT_MODE,
+    cancel_token: CancellationToken = None,
 ) -> dict:
     """
-    Generate NEET test questions from a PDF.
+    Generate NEET test questions from a PDF (asyncio version).
 
-    For large PDFs (>20 pages), splits into parallel chunks for faster generation.
+    For large PDFs (>20 pages), splits into chunks that run concurrently
+    (boundaries and question shares planned by chunk_planner.plan_chunks).
     For small PDFs (≤20 pages), uses a single API call.
+
+    API calls are admitted by the process-wide rate limiter for `model`, so
+    concurrency follows the RPM/TPM budget. `semaphore` is an extra hard
+    cap; pass the same semaphore (and client) to several calls to run
+    multiple slots together. If none is given, one allowing
+    `max_concurrency` calls is created.
+
+    Pass `parsed_pdf` (built once per upload) to reuse its reader and page
+    slices instead of parsing `pdf_bytes` again.
+
+    Results are cached on disk by PDF hash, prompt hash and settings, so an
+    identical request returns without an API call. `force_regenerate=True`
+    skips the lookup (the fresh result still replaces the cached one).
+
+    With stream=True the model output is streamed and each question is
+    post-processed and passed to on_question(q) as soon as its JSON object
+    is complete, instead of after the whole completion. Question ids seen by
+    on_question are chunk-local; the returned result is renumbered.
+
+    With cache_friendly_prompt=True the system prompt is the static prefix
+    from get_prompt_parts(), identical for every call with the same question
+    type + difficulty, and the subject / question count go at the end of the
+    user message. Consecutive calls then share a long prefix that OpenAI
+    serves from its prompt cache at the discounted input rate.
+
+    With upload_files=True (off by default, see UPLOAD_PDF_FILES) each PDF /
+    chunk is uploaded once through the Files API and referenced by file_id,
+    so slots sharing a PDF do not re-send its bytes (see file_store). The
+    uploads then stay on OpenAI's side for up to 24 hours.
+
+    With content_mode="text" text-heavy pages are sent as their extracted
+    text layer and only figure/table pages as PDF (see
+    ParsedPdf.is_visual_page), which costs far fewer input tokens on
+    text-heavy chapters. The mode is recorded in test_metadata next to the
+    input tokens and generation time, so the two modes can be compared.
+
+    Cancelling `cancel_token` (from any thread) aborts every open request
+    within moments and raises GenerationCancelled; finished chunks stay
+    cached. Each request is also bounded by _request_timeout().
     """
-    # Initialize OpenAI client
-    client = OpenAI(api_key=api_key)
+    if content_mode not in CONTENT_MODES:
+        raise ValueError(f"Unknown content_mode {content_mode!r} (expected one of {CONTENT_MODES})")
+    if client is None:
+        client = client_registry.get_async_client(api_key)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(max_concurrency)
 
     # Get the prompt from the correct module based on subject
     effective_type = question_type if question_type != "combination" else "mcq"
@@ -677,35 +603,120 @@ def generate_neet_test_from_pdf(
     if (effective_type, difficulty) not in prompt_module.PROMPTS_CONFIG:
         raise ValueError(f"No prompt configured for ({effective_type}, {difficulty}) in {prompt_module.__name__}")
 
-    logger.info(f"[PROMPT] Using {prompt_module.__name__} prompt for ({effective_type}, {difficulty})")
+    logger.info(f"[PROMPT] Using {prompt_module.__name__} prompt for ({effective_type}, {difficulty}){' | cache-friendly layout' if cache_friendly_prompt else ''}")
+
+    def _build_prompt(count: int, instruction: str):
+        """Return (system_prompt, user_instruction) for a call asking for `count` questions."""
+        if cache_friendly_prompt:
+            static_prefix, variable_suffix = prompt_module.get_prompt_parts(effective_type, difficulty, subject, count)
+            return static_prefix, f"{instruction}\n{variable_suffix}"
+        return prompt_module.get_prompt(effective_type, difficulty, subject, count), instruction
+
+    estimator = token_budget.get_estimator()
+    # Post-processing stage timings for this generation (chunks and top-ups included)
+    postprocess_timings = postprocess.StageTimings()
+
+    def _predict_budget(count: int) -> dict:
+        return estimator.predict(subject, question_type, difficulty, model, count, max_completion_tokens)
+
+    def _record_output(questions_returned: int, usage: dict):
+        estimator.record(subject, question_type, difficulty, model, questions_returned, usage.get("output_tokens", 0))
+
+    async def _top_up(result: dict, usage: dict, requested: int, instruction_for, content, label: str) -> dict:
+        """Request the questions a short or truncated response is missing, up to MAX_TOP_UP_ROUNDS times.
+
+        instruction_for(n) builds the normal instruction for n questions;
+        `content` is the (pdf_bytes, page_text, pdf_page_count) sent the first
+        time. Returns {"questions", "token_usage", "rounds", "max_completion_tokens", "generation_time"}.
+        """
+        questions = list(result.get("questions", []))
+        finish_reason = result.get("finish_reason")
+        outcome = {"questions": questions, "token_usage": usage, "rounds": 0,
+                   "max_completion_tokens": 0, "generation_time": 0.0}
+        while outcome["rounds"] < MAX_TOP_UP_ROUNDS:
+            missing = requested - len(questions)
+            if missing <= 0 or (not questions and finish_reason != "length"):
+                break
+            outcome["rounds"] += 1
+            cause = "output hit the token cap" if finish_reason == "length" else "short response"
+            logger.warning(f"[TOP-UP {label}] {len(questions)}/{requested} questions ({cause}) — requesting the missing {missing}")
+            prompt, instruction = _build_prompt(missing, _top_up_instruction(questions, instruction_for(missing)))
+            budget = await asyncio.to_thread(_predict_budget, missing)
+            extra, extra_usage, extra_time = await _generate_single_chunk(
+                client, model, content[0], prompt, instruction,
+                missing, budget["max_completion_tokens"], temperature, f"{label} top-up {outcome['rounds']}", semaphore,
+                page_count=content[2], stream=stream, on_question=on_question,
+                upload_files=upload_files, page_text=content[1], cancel_token=cancel_token,
+                postprocess_timings=postprocess_timings,
+            )
+            new_questions = extra.get("questions", [])[:missing]
+            await asyncio.to_thread(_record_output, len(new_questions), extra_usage)
+            questions.extend(new_questions)
+            outcome["token_usage"] = _sum_token_usage(outcome["token_usage"], extra_usage)
+            outcome["max_completion_tokens"] += budget["max_completion_tokens"]
+            outcome["generation_time"] = round(outcome["generation_time"] + extra_time, 1)
+            finish_reason = extra.get("finish_reason")
+            if not new_questions:
+                break
+        if outcome["rounds"]:
+            logger.info(f"[TOP-UP {label}] {len(questions)}/{requested} questions after {outcome['rounds']} follow-up request(s)")
+        return outcome
 
     # Check if parallel processing should be used (large PDF > 20 pages)
-    total_pages = _get_pdf_page_count(pdf_bytes)
+    if parsed_pdf is None:
+        parsed_pdf = await asyncio.to_thread(ParsedPdf, pdf_bytes)
+    pdf_bytes = parsed_pdf.pdf_bytes
+    total_pages = parsed_pdf.page_count
     use_parallel = total_pages > 20
 
+    cache_key = result_cache.make_key(
+        version=RESULT_CACHE_VERSION,
+        pdf_sha256=parsed_pdf.sha256,
+        prompt_sha256=result_cache.sha256_hex(prompt_module.get_prompt(effective_type, difficulty, subject, question_count)),
+        cache_friendly_prompt=cache_friendly_prompt,
+        content_mode=content_mode,
+        subject=subject,
+        difficulty=difficulty,
+        question_type=question_type,
+        question_count=question_count,
+        model=model,
+        temperature=temperature,
+        max_completion_tokens=max_completion_tokens,
+    )
+    if not force_regenerate:
+        cached = await asyncio.to_thread(_result_cache.get, cache_key)
+        if cached:
+            cached["test_metadata"]["from_cache"] = True
+            logger.info(f"[CACHE] Hit — returning {len(cached['questions'])} cached questions (key {cache_key[:12]})")
+            return cached
+
+    if cancel_token:
+        cancel_token.raise_if_cancelled()
+
     pdf_size_mb = len(pdf_bytes) / (1024 * 1024)
-    logger.info(f"[GENERATE] PDF size: {pdf_size_mb:.1f}MB | Pages: {total_pages} | Model: {model}")
+    logger.info(f"[GENERATE] PDF size: {pdf_size_mb:.1f}MB | Pages: {total_pages} | Model: {model} | Content: {content_mode}")
     logger.info(f"[SETTINGS] subject={subject}, difficulty={difficulty}, type={question_type}, count={question_count}")
 
     if use_parallel:
         # ── PARALLEL GENERATION (large PDF) ──
-        chunks = _build_chunks(total_pages, question_count, chunk_size=15, overlap=1)
+        chunks = await asyncio.to_thread(plan_chunks, parsed_pdf, question_count, content_mode)
         logger.info(f"[PARALLEL] Splitting into {len(chunks)} chunks: {[(f'core p{c[0]+1}-{c[1]+1}', f'pdf p{c[2]+1}-{c[3]+1}', f'{c[4]}q') for c in chunks]}")
         logger.info("=" * 80)
 
         gen_start = time.time()
         all_questions = []
-        total_token_usage = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+        total_token_usage = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0, "cached_input_tokens": 0}
+        predicted_tokens = 0   # sum of max_completion_tokens over the calls made this run
+        top_up_rounds = 0
 
-        def _run_chunk(chunk_info):
+        async def _run_chunk(chunk_info):
             core_start, core_end, pdf_start, pdf_end, chunk_q = chunk_info
             chunk_label = f"p{core_start+1}-{core_end+1}"
 
             # Split PDF — includes overlap pages for context
-            chunk_pdf = _split_pdf_pages(pdf_bytes, pdf_start, pdf_end)
-
-            # Get prompt for this chunk's question count
-            chunk_prompt = prompt_module.get_prompt(effective_type, difficulty, subject, chunk_q)
+            chunk_pdf, chunk_text, chunk_pdf_pages = await asyncio.to_thread(
+                _build_page_content, parsed_pdf, pdf_start, pdf_end, content_mode
+            )
 
             # Build context page info for instruction
             context_pages = []
@@ -721,45 +732,144 @@ def generate_neet_test_from_pdf(
                 )
 
             # Build instruction for this chunk
-            chunk_instruction = (
-                f"YOU MUST generate EXACTLY {chunk_q} {difficulty} {effective_type.replace('_', ' ')} questions. "
-                f"Do NOT stop before reaching {chunk_q} questions. Do not stop early.\n\n"
-                f"Each question MUST test a COMPLETELY DIFFERENT concept — "
-                "no two questions can cover the same topic, fact, or principle even if rephrased.\n\n"
-                "ACCURACY IS #1 PRIORITY — every correct_answer MUST match the PDF. If unsure, skip that question and replace it with another.\n\n"
-                f"CORE PAGES (generate questions ONLY from these): pages {core_start+1}-{core_end+1}.\n"
-                f"{context_note}\n"
-                "RULES:\n"
-                "- Each question tests a DIFFERENT concept from a DIFFERENT core page/section.\n"
-                "- Spread across ALL core pages.\n"
-                "- Every question has EXACTLY ONE correct answer. The other 3 must be clearly wrong.\n"
-                "- NO ambiguous questions where 2 options could be correct.\n"
+            def _chunk_instruction(count):
+                return (
+                    f"YOU MUST generate EXACTLY {count} {difficulty} {effective_type.replace('_', ' ')} questions. "
+                    f"Do NOT stop before reaching {count} questions. Do not stop early.\n\n"
+                    f"Each question MUST test a COMPLETELY DIFFERENT concept — "
+                    "no two questions can cover the same topic, fact, or principle even if rephrased.\n\n"
+                    "ACCURACY IS #1 PRIORITY — every correct_answer MUST match the PDF. If unsure, skip that question and replace it with another.\n\n"
+                    f"CORE PAGES (generate questions ONLY from these): pages {core_start+1}-{core_end+1}.\n"
+                    f"{context_note}\n"
+                    "RULES:\n"
+                    "- Each question tests a DIFFERENT concept from a DIFFERENT core page/section.\n"
+                    "- Spread across ALL core pages.\n"
+                    "- Every question has EXACTLY ONE correct answer. The other 3 must be clearly wrong.\n"
+                    "- NO ambiguous questions where 2 options could be correct.\n"
+                )
+            chunk_prompt, chunk_instruction = _build_prompt(chunk_q, _chunk_instruction(chunk_q))
+
+            chunk_budget = await asyncio.to_thread(_predict_budget, chunk_q)
+            chunk_max_tokens = chunk_budget["max_completion_tokens"]
+
+            # Successful chunks are cached so a retry after a partial failure
+            # only re-issues the chunks that are missing
+            chunk_key = result_cache.make_key(
+                version=RESULT_CACHE_VERSION,
+                core_pages=[core_start, core_end],
+                pdf_pages=[pdf_start, pdf_end],
+                pdf_sha256=parsed_pdf.sha256,
+                content_mode=content_mode,
+                prompt_sha256=result_cache.sha256_hex(chunk_prompt + chunk_instruction),
+                chunk_q=chunk_q,
+                model=model,
+                temperature=temperature,
+                max_completion_tokens=max_completion_tokens,
             )
+            if not force_regenerate:
+                cached = await asyncio.to_thread(_chunk_cache.get, chunk_key)
+                if cached:
+                    logger.info(f"[CHUNK {chunk_label}] Cache hit — {len(cached['questions'])} questions")
+                    if on_question:
+                        for q in cached["questions"]:
+                            on_question(q)
+                    return {"questions": cached["questions"], "token_usage": cached["token_usage"],
+                            "generation_time": 0.0, "from_cache": True}
+
+            # Questions go out live while only the first request runs. Once a
+            # hedge fires both requests buffer, and only the winner's remaining
+            # questions are forwarded after run_hedged returns
+            attempts = []
+            forwarded = [0]
+
+            def _attempt(on_started):
+                received = []
+                attempts.append(received)
+
+                def _forward(q):
+                    received.append(q)
+                    if on_question and len(attempts) == 1:
+                        forwarded[0] += 1
+                        on_question(q)
+
+                return _generate_single_chunk(
+                    client, model, chunk_pdf, chunk_prompt, chunk_instruction,
+                    chunk_q, chunk_max_tokens, temperature, chunk_label, semaphore,
+                    page_count=chunk_pdf_pages, stream=stream, on_question=_forward,
+                    upload_files=upload_files, page_text=chunk_text, on_started=on_started,
+                    cancel_token=cancel_token, postprocess_timings=postprocess_timings,
+                )
 
-            # Calculate tokens for this chunk (varies by question type)
-            if question_type == "match_the_column":
-                tpq = 3500
-            elif question_type == "assertion_reason":
-                tpq = 2500 if difficulty == "hard" else 2000
-            else:
-                tpq = 2500 if difficulty == "hard" else 1500
-            chunk_max_tokens = max(4096, chunk_q * tpq + 1000)
-            chunk_max_tokens = min(max_completion_tokens, chunk_max_tokens)
-
-            return _generate_single_chunk(
-                client, model, chunk_pdf, chunk_prompt, chunk_instruction,
-                chunk_q, chunk_max_tokens, temperature, chunk_label
+            (chunk_result, chunk_tokens, chunk_time), hedge_outcome = await hedging.run_hedged(
+                _attempt, model, chunk_q, hedge_budget, chunk_label
             )
-
-        # Run all chunks in parallel (cap at 3 workers to avoid OpenAI rate limits)
-        with ThreadPoolExecutor(max_workers=min(3, len(chunks))) as executor:
-            results = list(executor.map(_run_chunk, chunks))
-
-        # Merge results from all chunks
-        for questions, token_usage, _ in results:
-            all_questions.extend(questions)
+            if on_question and hedge_outcome:
+                winner = attempts[1] if hedge_outcome == "hedge" else attempts[0]
+                for q in winner[forwarded[0]:]:
+                    on_question(q)
+            await asyncio.to_thread(_record_output, len(chunk_result.get("questions", [])), chunk_tokens)
+            top_up = await _top_up(
+                chunk_result, chunk_tokens, chunk_q, _chunk_instruction,
+                (chunk_pdf, chunk_text, chunk_pdf_pages), chunk_label,
+            )
+            questions = top_up["questions"]
+            if questions:
+                await asyncio.to_thread(_chunk_cache.put, chunk_key, {
+                    "questions": questions,
+                    "token_usage": top_up["token_usage"],
+                })
+            return {
+                "questions": questions,
+                "token_usage": top_up["token_usage"],
+                "generation_time": round(chunk_time + top_up["generation_time"], 1),
+                "from_cache": False,
+                "hedge": hedge_outcome,
+                "max_completion_tokens": chunk_max_tokens + top_up["max_completion_tokens"],
+                "top_ups": top_up["rounds"],
+            }
+
+        # Straggling chunks may fire one duplicate request each, within this budget
+        hedge_budget = hedging.HedgeBudget(len(chunks))
+
+        # Run all chunks concurrently (admitted by the shared rate-limit budget).
+        # Exceptions are collected so successful chunks still get cached.
+        results = await asyncio.gather(*(_run_chunk(c) for c in chunks), return_exceptions=True)
+
+        if cancel_token and cancel_token.cancelled:
+            logger.info(f"[PARALLEL] Cancelled — {sum(1 for r in results if not isinstance(r, BaseException))} finished chunk(s) kept in the cache")
+            cancel_token.raise_if_cancelled()
+
+        chunk_labels = [f"p{c[0]+1}-{c[1]+1}" for c in chunks]
+        failed = [(label, r) for label, r in zip(chunk_labels, results) if isinstance(r, BaseException)]
+        if failed:
+            succeeded = len(chunks) - len(failed)
+            logger.error(f"[PARALLEL] {len(failed)}/{len(chunks)} chunks failed: {[label for label, _ in failed]} — {succeeded} successful chunk(s) cached for retry")
+            label, first_error = failed[0]
+            raise RuntimeError(
+                f"{len(failed)} of {len(chunks)} chunks failed (first: {label}: {type(first_error).__name__}: {first_error}). "
+                f"{succeeded} successful chunk(s) are cached — retrying will only regenerate the failed ones."
+            ) from first_error
+
+        # Merge results from all chunks (cached chunks cost nothing this run)
+        chunk_reports = []
+        for label, chunk in zip(chunk_labels, results):
+            all_questions.extend(chunk["questions"])
+            chunk_reports.append({
+                "pages": label,
+                "questions": len(chunk["questions"]),
+                "generation_time": chunk["generation_time"],
+                "from_cache": chunk["from_cache"],
+                "hedge": chunk.get("hedge"),
+                "top_ups": chunk.get("top_ups", 0),
+                "max_completion_tokens": chunk.get("max_completion_tokens"),
+                "output_tokens": chunk["token_usage"].get("output_tokens", 0),
+            })
+            if chunk["from_cache"]:
+                continue
+            predicted_tokens += chunk["max_completion_tokens"]
+            top_up_rounds += chunk["top_ups"]
             for key in total_token_usage:
-                total_token_usage[key] += token_usage.get(key, 0)
+                total_token_usage[key] += chunk["token_usage"].get(key, 0)
 
         generation_time = round(time.time() - gen_start, 1)
 
@@ -770,84 +880,80 @@ def generate_neet_test_from_pdf(
         total = len(all_questions)
         logger.info("=" * 80)
         logger.info(f"[PARALLEL DONE] Generated {total} questions in {generation_time}s across {len(chunks)} chunks")
-        logger.info(f"[TOKENS] Input: {total_token_usage['input_tokens']:,}, Output: {total_token_usage['output_tokens']:,}, Total: {total_token_usage['total_tokens']:,}")
+        cached_labels = [c["pages"] for c in chunk_reports if c["from_cache"]]
+        if cached_labels:
+            logger.info(f"[CACHE] {len(cached_labels)}/{len(chunks)} chunks served from cache: {cached_labels}")
+        if hedge_budget.fired:
+            logger.info(f"[HEDGE] {hedge_budget.fired} hedge(s) fired, {hedge_budget.won} won (limit {hedge_budget.limit})")
+        logger.info(f"[TOKENS] Input: {total_token_usage['input_tokens']:,} ({total_token_usage['cached_input_tokens']:,} cached), Output: {total_token_usage['output_tokens']:,}, Total: {total_token_usage['total_tokens']:,}")
         logger.info("=" * 80)
 
         # Build result
         result = {
             "questions": all_questions,
-            "test_metadata": {}
+            "test_metadata": {
+                "chunks": chunk_reports,
+                "cached_chunks": len(cached_labels),
+                "hedges": hedge_budget.as_dict(),
+            }
         }
         token_usage = total_token_usage
 
     else:
         # ── SINGLE API CALL (small PDF ≤ 20 pages) ──
-        formatted_prompt = prompt_module.get_prompt(effective_type, difficulty, subject, question_count)
-
-        user_instruction = (
-            f"YOU MUST generate EXACTLY {question_count} {difficulty} {effective_type.replace('_', ' ')} questions. "
-            f"Do NOT stop before reaching {question_count} questions. Do not stop early.\n\n"
-            f"Each question MUST test a COMPLETELY DIFFERENT concept — "
-            "no two questions can cover the same topic, fact, or principle even if rephrased.\n\n"
-            "ACCURACY IS #1 PRIORITY — every correct_answer MUST match the PDF. If unsure, skip that question and replace it with another.\n\n"
-            "RULES:\n"
-            "- Each question tests a DIFFERENT concept from a DIFFERENT page/section.\n"
-            "- Spread across ALL pages — first third, middle third, last third.\n"
-            "- Every question has EXACTLY ONE correct answer. The other 3 must be clearly wrong.\n"
-            "- NO ambiguous questions where 2 options could be correct.\n"
-        )
-
-        # Dynamic max_completion_tokens
-        if question_type == "match_the_column":
-            tokens_per_q = 3500
-        elif question_type == "assertion_reason":
-            tokens_per_q = 2500 if difficulty == "hard" else 2000
-        else:
-            tokens_per_q = 2500 if difficulty == "hard" else 1500
-        dynamic_max_completion_tokens = max(4096, question_count * tokens_per_q + 1000)
-        effective_max_completion_tokens = min(max_completion_tokens, dynamic_max_completion_tokens)
+        def _user_instruction(count):
+            return (
+                f"YOU MUST generate EXACTLY {count} {difficulty} {effective_type.replace('_', ' ')} questions. "
+                f"Do NOT stop before reaching {count} questions. Do not stop early.\n\n"
+                f"Each question MUST test a COMPLETELY DIFFERENT concept — "
+                "no two questions can cover the same topic, fact, or principle even if rephrased.\n\n"
+                "ACCURACY IS #1 PRIORITY — every correct_answer MUST match the PDF. If unsure, skip that question and replace it with another.\n\n"
+                "RULES:\n"
+                "- Each question tests a DIFFERENT concept from a DIFFERENT page/section.\n"
+                "- Spread across ALL pages — first third, middle third, last third.\n"
+                "- Every question has EXACTLY ONE correct answer. The other 3 must be clearly wrong.\n"
+                "- NO ambiguous questions where 2 options could be correct.\n"
+            )
+        formatted_prompt, user_instruction = _build_prompt(question_count, _user_instruction(question_count))
 
-        # Encode PDF as base64
-        pdf_base64 = base64.b64encode(pdf_bytes).decode("utf-8")
+        budget = await asyncio.to_thread(_predict_budget, question_count)
+        effective_max_completion_tokens = budget["max_completion_tokens"]
+        predicted_tokens = effective_max_completion_tokens
 
-        messages = [
-            {"role": "system", "content": formatted_prompt},
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "file",
-                        "file": {
-                            "filename": "textbook.pdf",
-                            "file_data": f"data:application/pdf;base64,{pdf_base64}",
-                        },
-                    },
-                    {"type": "text", "text": user_instruction},
-                ],
-            },
-        ]
-
-        logger.info(f"[GENERATE] max_completion_tokens: {effective_max_completion_tokens}")
+        logger.info(f"[GENERATE] max_completion_tokens: {effective_max_completion_tokens} ({budget['source']} budget, {budget['tokens_per_question']}/question)")
         logger.info("=" * 80)
 
-        gen_start = time.time()
-        response = _api_call_with_retry(client, model, messages, effective_max_completion_tokens, temperature)
-        generation_time = round(time.time() - gen_start, 1)
-
-        if response is None:
-            logger.error("[GENERATE] All API attempts failed")
-            return {"parse_error": "All API attempts failed", "raw_response": ""}
-
-        token_usage = _extract_token_usage(response)
+        content_pdf, content_text, content_pdf_pages = await asyncio.to_thread(
+            _build_page_content, parsed_pdf, 0, total_pages - 1, content_mode
+        )
+        result, token_usage, generation_time = await _generate_single_chunk(
+            client, model, content_pdf, formatted_prompt, user_instruction,
+            question_count, effective_max_completion_tokens, temperature, "full", semaphore,
+            page_count=content_pdf_pages, stream=stream, on_question=on_question,
+            upload_files=upload_files, page_text=content_text, cancel_token=cancel_token,
+            postprocess_timings=postprocess_timings,
+        )
         if token_usage:
-            logger.info(f"[TOKENS] Input: {token_usage['input_tokens']:,}, Output: {token_usage['output_tokens']:,}, Total: {token_usage['total_tokens']:,}")
-
-        result_text = response.choices[0].message.content or ""
-        logger.info(f"[RESPONSE] Length: {len(result_text)} chars")
-        if len(result_text) > 200:
-            logger.info(f"[RESPONSE] Ends with: ...{result_text[-200:]!r}")
+            logger.info(f"[TOKENS] Input: {token_usage['input_tokens']:,} ({token_usage['cached_input_tokens']:,} cached), Output: {token_usage['output_tokens']:,}, Total: {token_usage['total_tokens']:,}")
+        await asyncio.to_thread(_record_output, len(result.get("questions", [])), token_usage)
 
-        result = _parse_json_response(result_text)
+        top_up = await _top_up(
+            result, token_usage, question_count, _user_instruction,
+            (content_pdf, content_text, content_pdf_pages), "full",
+        )
+        top_up_rounds = top_up["rounds"]
+        result.pop("finish_reason", None)
+        if top_up_rounds:
+            token_usage = top_up["token_usage"]
+            predicted_tokens += top_up["max_completion_tokens"]
+            generation_time = round(generation_time + top_up["generation_time"], 1)
+            if top_up["questions"]:
+                # Keep the rest of the response (test_metadata etc.); a parse error the top-up recovered from goes
+                result["questions"] = top_up["questions"]
+                result.pop("parse_error", None)
+                result.pop("raw_response", None)
+                for i, q in enumerate(result["questions"], 1):
+                    q["question_id"] = i
 
         if "parse_error" in result:
             logger.error(f"[GENERATE] PARSE ERROR: {result.get('parse_error')}")
@@ -870,10 +976,9 @@ def generate_neet_test_from_pdf(
                 logger.info(f"  Q{q.get('question_id', '?')} ({q.get('question_type', 'unknown')}): {q['question_text'][:100]}...")
                 logger.info(f"    Source: {page} | Concepts: {concepts if concepts else 'N/A'}")
 
-        result["questions"] = _fix_chemical_formatting(result["questions"])
-        result["questions"] = _fix_duplicate_mtc_options(result["questions"])
-        result["questions"] = _fix_sequential_mtc_mapping(result["questions"])
-        result["questions"] = _randomize_answer_positions(result["questions"])
+        # Per-question stages already ran as each question arrived; only the
+        # batch stages (answer position balancing) are left
+        result["questions"] = postprocess.get_pipeline().finish(result["questions"], postprocess_timings)
 
         if "test_metadata" not in result:
             result["test_metadata"] = {}
@@ -885,17 +990,104 @@ def generate_neet_test_from_pdf(
         result["test_metadata"]["topic"] = effective_type.replace("_", " ").title()
         result["test_metadata"]["generation_time"] = generation_time
         result["test_metadata"]["page_count"] = total_pages
+        result["test_metadata"]["content_mode"] = content_mode
         result["test_metadata"]["parallel_chunks"] = len(chunks) if use_parallel else 1
+        result["test_metadata"]["top_up_requests"] = top_up_rounds
+        result["test_metadata"]["postprocess_timings"] = postprocess_timings.as_dict()
+        actual_output = token_usage.get("output_tokens", 0)
+        result["test_metadata"]["token_budget"] = {
+            "predicted_max_completion_tokens": predicted_tokens,
+            "actual_output_tokens": actual_output,
+            "actual_tokens_per_question": round(actual_output / len(result["questions"])) if result["questions"] else 0,
+            "utilization": round(actual_output / predicted_tokens, 3) if predicted_tokens else 0,
+        }
         cost = calculate_cost(token_usage) if token_usage else {}
         result["test_metadata"]["token_usage"] = {
             "generation": token_usage,
             "total_input": token_usage.get("input_tokens", 0),
+            "total_cached_input": token_usage.get("cached_input_tokens", 0),
             "total_output": token_usage.get("output_tokens", 0),
             "grand_total": token_usage.get("total_tokens", 0),
             "cost": cost,
         }
         if cost:
-            logger.info(f"[COST] Input: ₹{cost['input_cost']:.4f} | Output: ₹{cost['output_cost']:.4f} | Total: ₹{cost['total_cost']:.4f}")
+            logger.info(f"[COST] Input: ₹{cost['input_cost']:.4f} | Output: ₹{cost['output_cost']:.4f} | Total: ₹{cost['total_cost']:.4f} | Prompt cache saved: ₹{cost['cache_savings']:.4f}")
         logger.info(f"[TOKENS SUMMARY] Generation: {token_usage.get('total_tokens', 'N/A')} | Time: {generation_time}s")
 
+        if result["questions"]:
+            await asyncio.to_thread(_result_cache.put, cache_key, {
+                "questions": result["questions"],
+                "test_metadata": result["test_metadata"],
+            })
+
     return result
+
+
+def generate_neet_test_from_pdf(
+    pdf_bytes: bytes,
+    subject: str = "biology",
+    difficulty: str = "hard",
+    question_count: int = 5,
+    question_type: str = "mcq",
+    model: str = "gpt-5-mini",
+    temperature: float = 1.0,
+    max_completion_tokens: int = 90000,
+    api_key: str = None,
+    max_concurrency: int = MAX_CONCURRENCY_CAP,
+    parsed_pdf: ParsedPdf = None,
+    force_regenerate: bool = False,
+    stream: bool = False,
+    on_question=None,
+    cache_friendly_prompt: bool = CACHE_FRIENDLY_PROMPT,
+    upload_files: bool = UPLOAD_PDF_FILES,
+    content_mode: str = DEFAULT_CONTENT_MODE,
+    cancel_token: CancellationToken = None,
+) -> dict:
+    """
+    Generate NEET test questions from a PDF.
+
+    Blocking wrapper around agenerate_neet_test_from_pdf() for callers that
+    are not running an event loop (e.g. the Streamlit script thread).
+    """
+    return client_registry.run_closing_clients(agenerate_neet_test_from_pdf(
+        pdf_bytes,
+        subject=subject,
+        difficulty=difficulty,
+        question_count=question_count,
+        question_type=question_type,
+        model=model,
+        temperature=temperature,
+        max_completion_tokens=max_completion_tokens,
+        api_key=api_key,
+        max_concurrency=max_concurrency,
+        parsed_pdf=parsed_pdf,
+        force_regenerate=force_regenerate,
+        stream=stream,
+        on_question=on_question,
+        cache_friendly_prompt=cache_friendly_prompt,
+        upload_files=upload_files,
+        content_mode=content_mode,
+        cancel_token=cancel_token,
+    ))
+
+
+async def agenerate_neet_tests(jobs: list, api_key: str = None,
+                               max_concurrency: int = MAX_CONCURRENCY_CAP) -> list:
+    """Generate several tests (slots) concurrently under one shared semaphore.
+
+    Args:
+        jobs: list of keyword-argument dicts for agenerate_neet_test_from_pdf()
+        api_key: OpenAI API key shared by all jobs
+        max_concurrency: hard cap on API calls in flight across ALL jobs
+            (the shared rate-limit budget usually admits fewer)
+
+    Returns:
+        list of results in the same order as `jobs`. A job that raised has
+        its exception in place of the result dict.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    client = client_registry.get_async_client(api_key)
+    return await asyncio.gather(
+        *(agenerate_neet_test_from_pdf(**job, client=client, semaphore=semaphore) for job in jobs),
+        return_exceptions=True,
+    )
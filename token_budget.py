@@ -0,0 +1,134 @@
+"""
+NEET Test Generator - Output Token Budgets
+Predicts max_completion_tokens for a request from the output tokens per
+question actually used by past requests with the same subject, question
+type, difficulty and model (p95 plus headroom). Stats are kept on disk in
+the result cache directory, so the estimate improves across runs and is
+shared by every process (app, worker, batch CLI). Until a combination has
+enough samples, the old fixed per-question budgets apply.
+"""
+
+import contextlib
+import logging
+import math
+import os
+import threading
+
+import result_cache
+
+try:
+    import fcntl
+except ImportError:   # Windows: no cross-process lock, concurrent records may drop a sample
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+# Samples (one per API call) needed before the learned budget replaces the default
+MIN_SAMPLES = 5
+# Most recent samples kept per combination
+MAX_SAMPLES = 200
+BUDGET_PERCENTILE = 0.95
+# Multiplier on the percentile, for variance the history has not shown yet
+HEADROOM = 1.15
+# Fixed part of every budget (JSON wrapper, reasoning warm-up)
+BASE_TOKENS = 1000
+MIN_BUDGET_TOKENS = 4096
+STATS_TTL_SECONDS = 90 * 24 * 3600
+
+
+def default_tokens_per_question(question_type: str, difficulty: str) -> int:
+    """The fixed per-question budgets used before any stats exist."""
+    if question_type == "match_the_column":
+        return 3500
+    if question_type == "assertion_reason":
+        return 2500 if difficulty == "hard" else 2000
+    return 2500 if difficulty == "hard" else 1500
+
+
+def _percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class TokenBudgetEstimator:
+    """Output tokens per question per (subject, question type, difficulty, model)."""
+
+    def __init__(self):
+        self._stats = result_cache.ResultCache("token_stats", ttl_seconds=STATS_TTL_SECONDS)
+        self._samples = {}   # stats key -> list of tokens per question, loaded lazily
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(subject, question_type, difficulty, model) -> str:
+        return result_cache.make_key(subject=subject, question_type=question_type, difficulty=difficulty, model=model)
+
+    def _load(self, key: str) -> list:
+        if key not in self._samples:
+            entry = self._stats.get(key)
+            self._samples[key] = list(entry["samples"]) if entry else []
+        return self._samples[key]
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        """Hold the stats directory's lock file, so processes merge their samples in turn."""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self._stats.directory, exist_ok=True)
+        with open(os.path.join(self._stats.directory, ".lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def predict(self, subject: str, question_type: str, difficulty: str, model: str,
+                question_count: int, max_completion_tokens: int) -> dict:
+        """Budget for one request of `question_count` questions, capped at max_completion_tokens.
+
+        Returns {"max_completion_tokens", "tokens_per_question", "source", "samples"};
+        source is "learned" (p95 of past calls) or "default".
+        """
+        key = self._key(subject, question_type, difficulty, model)
+        with self._lock:
+            samples = list(self._load(key))
+        if len(samples) >= MIN_SAMPLES:
+            tokens_per_q = math.ceil(_percentile(samples, BUDGET_PERCENTILE) * HEADROOM)
+            source = "learned"
+        else:
+            tokens_per_q = default_tokens_per_question(question_type, difficulty)
+            source = "default"
+        budget = min(max_completion_tokens, max(MIN_BUDGET_TOKENS, question_count * tokens_per_q + BASE_TOKENS))
+        return {
+            "max_completion_tokens": budget,
+            "tokens_per_question": tokens_per_q,
+            "source": source,
+            "samples": len(samples),
+        }
+
+    def record(self, subject: str, question_type: str, difficulty: str, model: str,
+               questions_returned: int, output_tokens: int):
+        """Add the output tokens per question one API call actually used."""
+        if not questions_returned or not output_tokens:
+            return
+        key = self._key(subject, question_type, difficulty, model)
+        with self._lock, self._file_lock():
+            # Re-read under the lock: another process may have recorded since we loaded
+            entry = self._stats.get(key)
+            samples = list(entry["samples"]) if entry else []
+            samples.append(round(output_tokens / questions_returned))
+            del samples[:-MAX_SAMPLES]
+            self._samples[key] = samples
+            self._stats.put(key, {
+                "subject": subject, "question_type": question_type,
+                "difficulty": difficulty, "model": model,
+                "samples": samples,
+            })
+
+
+_ESTIMATOR = TokenBudgetEstimator()
+
+
+def get_estimator() -> TokenBudgetEstimator:
+    return _ESTIMATOR
@@ -0,0 +1,137 @@
+"""
+NEET Test Generator - Queue Worker
+Runs generation jobs from the persistent job queue (job_queue.py) in its own
+process, so a browser refresh or a Streamlit restart never loses a job.
+Results and Excel files are written next to the queue database.
+
+Usage:
+    python worker.py [--max-jobs 8]
+"""
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    stream=sys.stderr
+)
+logger = logging.getLogger(__name__)
+
+from excel_export import generate_excel_for_result, make_excel_filename
+from job_executor import SlotJob, get_executor
+from job_queue import get_queue
+from pdf_utils import ParsedPdf
+
+
+POLL_INTERVAL_SECONDS = 1.0
+REQUEUE_CHECK_SECONDS = 30
+PURGE_CHECK_SECONDS = 3600   # how often finished jobs past JOB_RETENTION_SECONDS are deleted
+DEFAULT_MAX_JOBS = 8   # jobs running at once; API calls are further capped by the executor
+
+
+def _export_result(result: dict) -> dict:
+    """Build the Excel download for a finished job (runs in the executor thread)."""
+    meta = result.get("test_metadata", {})
+    return {
+        "excel_bytes": generate_excel_for_result(result),
+        "excel_filename": make_excel_filename(meta),
+    }
+
+
+def run_worker(max_jobs: int = DEFAULT_MAX_JOBS, api_key: str = None):
+    """Claim queued jobs, run them on the background executor and record the outcome."""
+    queue = get_queue()
+    executor = get_executor()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    active = {}        # queue job id -> (SlotJob, JobBatch)
+    parsed_pdfs = {}   # pdf path -> ParsedPdf shared by the active jobs
+    last_requeue = last_purge = 0.0
+    logger.info(f"[WORKER] {worker_id} polling {queue.db_path} (max {max_jobs} jobs)")
+
+    try:
+        while True:
+            now = time.time()
+            if now - last_requeue > REQUEUE_CHECK_SECONDS:
+                queue.requeue_stale()
+                last_requeue = now
+            if now - last_purge > PURGE_CHECK_SECONDS:
+                queue.purge_finished()
+                last_purge = now
+
+            while len(active) < max_jobs:
+                job = queue.claim(worker_id)
+                if job is None:
+                    break
+                pdf_path = job["pdf_path"]
+                if pdf_path not in parsed_pdfs:
+                    try:
+                        with open(pdf_path, "rb") as f:
+                            parsed_pdfs[pdf_path] = ParsedPdf(f.read())
+                    except Exception as e:
+                        logger.error(f"[WORKER] Cannot read PDF for {job['label']}: {e}")
+                        queue.finish(job["id"], "error", f"Could not read PDF: {e}")
+                        continue
+                parsed_pdf = parsed_pdfs[pdf_path]
+                slot_job = SlotJob(
+                    job_id=job["id"],
+                    label=job["label"],
+                    kwargs={**job["params"], "pdf_bytes": parsed_pdf.pdf_bytes, "parsed_pdf": parsed_pdf},
+                    on_complete=_export_result,
+                )
+                active[job["id"]] = (slot_job, executor.submit([slot_job], api_key=api_key))
+                logger.info(f"[WORKER] Started {job['label']} (attempt {job['attempts'] + 1})")
+
+            for job_id, (slot_job, batch) in list(active.items()):
+                if slot_job.status == "done":
+                    queue.complete(job_id, slot_job.result, **slot_job.output)
+                elif slot_job.finished:
+                    queue.finish(job_id, slot_job.status, slot_job.error)
+                else:
+                    if queue.heartbeat(job_id, slot_job.questions):
+                        logger.info(f"[WORKER] Cancel requested for {slot_job.label}")
+                        executor.cancel(batch)
+                    continue
+                del active[job_id]
+
+            in_use = {slot_job.kwargs["parsed_pdf"] for slot_job, _ in active.values()}
+            for pdf_path in [p for p, pdf in parsed_pdfs.items() if pdf not in in_use]:
+                del parsed_pdfs[pdf_path]
+
+            time.sleep(POLL_INTERVAL_SECONDS)
+    except KeyboardInterrupt:
+        logger.info(f"[WORKER] Stopping — returning {len(active)} running job(s) to the queue")
+        for job_id, (slot_job, batch) in active.items():
+            executor.cancel(batch)
+            queue.release(job_id)
+
+
+def _stop_on_sigterm(signum, frame):
+    # pkill / keep_alive.sh restarts send SIGTERM: shut down like Ctrl+C so jobs go back to the queue
+    raise KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run NEET test generation jobs from the job queue.")
+    parser.add_argument("--max-jobs", type=int, default=DEFAULT_MAX_JOBS,
+                        help=f"jobs to run at once (default {DEFAULT_MAX_JOBS})")
+    args = parser.parse_args()
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        sys.exit("OPENAI_API_KEY is not set (add it to .env)")
+    signal.signal(signal.SIGTERM, _stop_on_sigterm)
+    run_worker(max_jobs=args.max_jobs, api_key=api_key)
+
+
+if __name__ == "__main__":
+    main()